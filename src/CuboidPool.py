@@ -0,0 +1,136 @@
+import bpy
+import numpy as np
+
+import transformer_tracer as tracer
+
+"""
+Reuses cuboid objects within a scope, e.g. one cut request, instead of creating, linking and
+freeing an object for every division and temp cut
+Released cuboids are hidden but stay linked to the scene, acquiring one rewrites its vertices in bulk
+Booleans apply to the cuboid's own mesh, so a reused cuboid gets a copy of a pristine box mesh and
+its old mesh is freed with the pool
+Cuboids to outlive the scope, like the chosen cuts, must be kept
+"""
+class CuboidPool(object):
+
+    # Pools entered and not exited yet, the last one serves new cuboids
+    active_pools = []
+
+    # Faces of the 8 vertices from blender_ops_helper.generate_cuboid_verts
+    faces = [(0,1,3,2),(4,6,7,5),(0,4,5,1),(1,5,7,3),(4,0,2,6),(6,2,3,7)]
+
+    template = None
+    cuboids = None
+    free_cuboids = None
+    stale_meshes = None
+
+    def __init__(self):
+        self.template = None
+        self.cuboids = {}
+        self.free_cuboids = []
+        self.stale_meshes = []
+        return
+
+    def __enter__(self):
+        CuboidPool.active_pools.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        CuboidPool.active_pools.remove(self)
+        self.free()
+        return False
+
+    """
+    Get the pool serving new cuboids, None outside of any scope
+    """
+    @staticmethod
+    def get_active():
+        if len(CuboidPool.active_pools) == 0:
+            return None
+        return CuboidPool.active_pools[-1]
+
+    """
+    Get a mesh of a box with the 8 vertices verts, copied from the template so from_pydata runs once per pool
+    """
+    def get_box_mesh(self, verts, name):
+        if self.template == None:
+            self.template = bpy.data.meshes.new("cuboid_template")
+            self.template.from_pydata(verts, [], CuboidPool.faces)
+            self.template.update(calc_edges=True)
+        mesh = self.template.copy()
+        mesh.name = name
+        mesh.vertices.foreach_set("co", np.asarray(verts, dtype=np.float32).ravel())
+        mesh.update()
+        return mesh
+
+    """
+    Get a cuboid object with the 8 vertices verts, reusing a released one if there is any
+    """
+    def acquire(self, verts, name):
+        mesh = self.get_box_mesh(verts, name)
+        if len(self.free_cuboids) == 0:
+            cuboid = bpy.data.objects.new(name, mesh)
+            bpy.context.scene.objects.link(cuboid)
+            tracer.count_object_created()
+            self.cuboids[cuboid.as_pointer()] = cuboid
+            return cuboid
+        cuboid = self.free_cuboids.pop()
+        self.stale_meshes.append(cuboid.data)
+        cuboid.data = mesh
+        cuboid.name = name
+        cuboid.hide = False
+        cuboid.hide_render = False
+        for key in list(cuboid.keys()):
+            del cuboid[key]
+        return cuboid
+
+    """
+    Check if obj is a cuboid of this pool, in use or not
+    """
+    def owns(self, obj):
+        return obj.as_pointer() in self.cuboids
+
+    """
+    Give a cuboid back for reuse, it is hidden until acquired again
+    """
+    def release(self, obj):
+        obj.select = False
+        obj.hide = True
+        obj.hide_render = True
+        self.free_cuboids.append(obj)
+
+    """
+    Let a cuboid outlive the scope, the pool forgets it
+    """
+    def keep(self, obj):
+        self.cuboids.pop(obj.as_pointer(), None)
+
+    """
+    Remove every cuboid the pool still owns, then the stale meshes and the template
+    """
+    @tracer.traced
+    def free(self):
+        scene_objects = bpy.context.scene.objects
+        objects = list(self.cuboids.values())
+        meshes = list(self.stale_meshes)
+        for obj in objects:
+            meshes.append(obj.data)
+            if obj.name in scene_objects:
+                scene_objects.unlink(obj)
+        if self.template != None:
+            meshes.append(self.template)
+        if hasattr(bpy.data, "batch_remove"):
+            bpy.data.batch_remove(objects)
+        else:
+            for obj in objects:
+                bpy.data.objects.remove(obj)
+        meshes = [mesh for mesh in meshes if mesh.users == 0]
+        if hasattr(bpy.data, "batch_remove"):
+            bpy.data.batch_remove(meshes)
+        else:
+            for mesh in meshes:
+                bpy.data.meshes.remove(mesh)
+        self.template = None
+        self.cuboids = {}
+        self.free_cuboids = []
+        self.stale_meshes = []
@@ -0,0 +1,124 @@
+import math
+
+import arithmetic_helper as arith
+import blender_ops_helper as bops
+
+"""
+Index of the cut objects one cut request creates, so picking and cleanup never scan the scene
+A cut is keyed by its division id, e.g. "3_2_1", and holds one object or a [pos, neg] pair
+State of a cut is "temp" (dropped at tier end), "potential" (kept if its volume fits) or "accepted"
+"""
+class CutRegistry(object):
+
+    cuts = None
+    states = None
+    pds = None
+    ids_by_state = None
+    ids_by_tier = None
+    ids_by_name = None
+
+    def __init__(self):
+        self.cuts = {}
+        self.states = {}
+        self.pds = {}
+        self.ids_by_state = {"temp":set(),"potential":set(),"accepted":set()}
+        self.ids_by_tier = {}
+        self.ids_by_name = {}
+        return
+
+    """
+    Register the objects of a cut under div_id, pd is the one verify_cut found
+    """
+    def add_cut(self, div_id, cuts, state, pd):
+        self.cuts[div_id] = cuts
+        self.states[div_id] = state
+        self.pds[div_id] = pd
+        self.ids_by_state[state].add(div_id)
+        tier = div_id.count("_") + 1
+        if tier not in self.ids_by_tier:
+            self.ids_by_tier[tier] = set()
+        self.ids_by_tier[tier].add(div_id)
+        for cut in cuts:
+            self.ids_by_name[cut.name] = div_id
+
+    def get_cuts(self, div_id):
+        return self.cuts[div_id]
+
+    def get_pd(self, div_id):
+        return self.pds[div_id]
+
+    def get_tier_ids(self, tier):
+        return self.ids_by_tier.get(tier, set())
+
+    """
+    Get the id of the cut an object belongs to, either object of a pos/neg pair will do
+    Return None if the name is unknown
+    """
+    def get_id_by_name(self, name):
+        return self.ids_by_name.get(name)
+
+    """
+    Get ids of the cuts that can be picked, sorted so picks do not depend on set order
+    """
+    def get_candidate_ids(self):
+        return sorted(self.ids_by_state["potential"] | self.ids_by_state["accepted"])
+
+    """
+    Get ids of the cuts that can be picked ranked by pd, best first
+    """
+    def get_ranked_ids(self):
+        candidate_ids = self.get_candidate_ids()
+        return [candidate_ids[i] for i in arith.rank_candidates([self.pds[div_id] for div_id in candidate_ids])]
+
+    """
+    Get id of the cut with the smallest pd, None if there is no cut
+    """
+    def get_best_id(self):
+        ranked_ids = self.get_ranked_ids()
+        if len(ranked_ids) == 0:
+            return None
+        return ranked_ids[0]
+
+    def get_ids_in_range(self, pick_range):
+        return [div_id for div_id in self.get_candidate_ids() if math.floor(self.pds[div_id]*100) in pick_range]
+
+    """
+    Forget a cut, its objects are left in the scene
+    """
+    def release_cut(self, div_id):
+        self.ids_by_state[self.states[div_id]].discard(div_id)
+        self.ids_by_tier[div_id.count("_") + 1].discard(div_id)
+        for cut in self.cuts[div_id]:
+            self.ids_by_name.pop(cut.name, None)
+        del self.cuts[div_id]
+        del self.states[div_id]
+        del self.pds[div_id]
+
+    """
+    Delete the objects and meshes of cuts and forget them
+    """
+    def remove_cuts(self, div_ids):
+        objects = []
+        for div_id in list(div_ids):
+            objects.extend(self.cuts[div_id])
+            self.release_cut(div_id)
+        bops.remove_objects(objects)
+
+    """
+    Remove temporary cuts and potential cuts without an acceptable volume, done at the end of every tier
+    """
+    def remove_tier_leftovers(self):
+        leftovers = set(self.ids_by_state["temp"])
+        for div_id in self.ids_by_state["potential"]:
+            if self.pds[div_id] == -1:
+                leftovers.add(div_id)
+        self.remove_cuts(leftovers)
+
+    """
+    Remove every cut except the one with div_id
+    """
+    def remove_all_except(self, div_id):
+        self.remove_cuts([other_id for other_id in self.cuts if other_id != div_id])
+
+    def remove_all(self):
+        self.remove_cuts(list(self.cuts))
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+"""
+On-disk cache of cutting results, one json file per cut request
+Entries are addressed by a hash of the mesh arrays, the cut request and the config values the search
+depends on, so a changed model or setting never hits a stale entry
+The least recently used entries are evicted once the files take more than max_bytes
+"""
+class CuttingCache(object):
+
+    # Bumped whenever the entry layout or the search changes, entries of older versions are never hit
+    version = 2
+
+    directory = None
+    max_bytes = None
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        return
+
+    """
+    Get the key of a cut request on the mesh arrays
+    request and config_state are json serializable, config_state holds only the values that matter
+    """
+    def get_key(self, vertices, triangles, request, config_state):
+        digest = hashlib.sha1()
+        digest.update(str(CuttingCache.version).encode())
+        digest.update(np.ascontiguousarray(vertices, dtype=np.float64).tobytes())
+        # Vertex and triangle bytes must not run into each other
+        digest.update(str(len(vertices)).encode())
+        digest.update(np.ascontiguousarray(triangles, dtype=np.int64).tobytes())
+        digest.update(json.dumps(request, sort_keys=True, default=float).encode())
+        digest.update(json.dumps(config_state, sort_keys=True, default=float).encode())
+        return digest.hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.directory, str.format("{}.json", key))
+
+    """
+    Get the entry stored under key, None on a miss
+    A hit marks the entry as recently used
+    """
+    def load(self, key):
+        path = self.get_path(key)
+        try:
+            with open(path, "r") as entry_file:
+                entry = json.load(entry_file)
+            os.utime(path, None)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    """
+    Store entry under key, then evict old entries if the cache went over its size
+    The file is written aside and moved in place so a reader never sees half an entry
+    """
+    def store(self, key, entry):
+        os.makedirs(self.directory, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(handle, "w") as entry_file:
+                json.dump(entry, entry_file, default=float)
+            os.replace(temp_path, self.get_path(key))
+        except (OSError, TypeError, ValueError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self.evict()
+
+    """
+    Remove the least recently used entries until the cache fits in max_bytes
+    """
+    def evict(self):
+        entries = []
+        total_bytes = 0
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+            total_bytes += stat.st_size
+        entries.sort()
+        for used_time, path, size in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_bytes -= size
+
+    """
+    Remove every entry
+    """
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith(".json"):
+                os.remove(os.path.join(self.directory, file_name))
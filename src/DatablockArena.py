@@ -0,0 +1,89 @@
+import bpy
+
+import transformer_tracer as tracer
+
+"""
+Records the objects and meshes created within a scope, e.g. one cut request, and frees them all
+in one go when the scope exits, so cleanup cost follows what was created and not the scene size
+Objects discarded before the exit are only unlinked from the scene until then
+Objects to outlive the scope, like the chosen cuts, must be kept
+"""
+class DatablockArena(object):
+
+    # Arenas entered and not exited yet, the last one records new datablocks
+    active_arenas = []
+
+    objects = None
+    meshes = None
+
+    def __init__(self):
+        self.objects = {}
+        self.meshes = {}
+        return
+
+    def __enter__(self):
+        DatablockArena.active_arenas.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        DatablockArena.active_arenas.remove(self)
+        self.free()
+        return False
+
+    """
+    Get the arena recording new datablocks, None outside of any scope
+    """
+    @staticmethod
+    def get_active():
+        if len(DatablockArena.active_arenas) == 0:
+            return None
+        return DatablockArena.active_arenas[-1]
+
+    def add_object(self, obj):
+        self.objects[obj.as_pointer()] = obj
+        if obj.data != None:
+            self.add_mesh(obj.data)
+
+    def add_mesh(self, mesh):
+        self.meshes[mesh.as_pointer()] = mesh
+
+    """
+    Let an object and its mesh outlive the scope
+    """
+    def keep(self, obj):
+        self.objects.pop(obj.as_pointer(), None)
+        if obj.data != None:
+            self.meshes.pop(obj.data.as_pointer(), None)
+
+    """
+    Take an object out of the scene now, it is freed with the rest of the arena
+    """
+    def discard(self, obj):
+        scene_objects = bpy.context.scene.objects
+        if obj.name in scene_objects:
+            scene_objects.unlink(obj)
+        self.add_object(obj)
+
+    """
+    Remove every recorded object, then every recorded mesh left without users
+    """
+    @tracer.traced
+    def free(self):
+        scene_objects = bpy.context.scene.objects
+        objects = list(self.objects.values())
+        for obj in objects:
+            if obj.name in scene_objects:
+                scene_objects.unlink(obj)
+        if hasattr(bpy.data, "batch_remove"):
+            bpy.data.batch_remove(objects)
+        else:
+            for obj in objects:
+                bpy.data.objects.remove(obj)
+        meshes = [mesh for mesh in self.meshes.values() if mesh.users == 0]
+        if hasattr(bpy.data, "batch_remove"):
+            bpy.data.batch_remove(meshes)
+        else:
+            for mesh in meshes:
+                bpy.data.meshes.remove(mesh)
+        self.objects = {}
+        self.meshes = {}
@@ -0,0 +1,196 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from TransformerMesh import TransformerMesh
+
+"""
+Binary container of the pieces of a cutting run, one file for all of them
+Layout, little endian:
+    header      magic, version, piece count and the offsets and sizes of the sections below
+    pieces      per piece the start and count of its vertices and of its triangles
+    vertices    float32 (N,3) of all pieces one after another
+    triangles   uint32 (M,3) of all pieces, indices count from the piece's first vertex
+    records     utf-8 json list with a record per piece: name, bone, cut box, pd, candidate id and any extras
+                like the world matrix of exported blender objects
+Sections start at multiples of 8 bytes, so a reader maps the file and views a piece's arrays in place
+without reading the others
+"""
+
+magic = b"TRPIECES"
+version = 1
+
+header_type = np.dtype([("magic","S8"),("version","<u4"),("num_pieces","<u4"),\
+                        ("pieces_offset","<u8"),("vertices_offset","<u8"),("triangles_offset","<u8"),\
+                        ("records_offset","<u8"),("records_size","<u8"),("num_vertices","<u8"),("num_triangles","<u8")])
+piece_type = np.dtype([("vertex_start","<u8"),("vertex_count","<u8"),("triangle_start","<u8"),("triangle_count","<u8")])
+
+def get_aligned(offset):
+    return (offset + 7)//8*8
+
+"""
+Write pieces, a list of TransformerMesh or (name, vertices, triangles), with their records to path
+records holds a json serializable dict per piece, the piece's name is added to it
+The file is written aside and moved in place so a reader never sees half an archive
+"""
+def write_archive(path, pieces, records):
+    if len(pieces) != len(records):
+        raise ValueError("Every piece needs a record")
+    names = []
+    piece_arrays = []
+    for piece in pieces:
+        if isinstance(piece, TransformerMesh):
+            piece = (piece.name, piece.vertices, piece.triangles)
+        name, vertices, triangles = piece
+        names.append(name)
+        piece_arrays.append((np.asarray(vertices, dtype=np.float64).reshape(-1,3), np.asarray(triangles, dtype=np.int64).reshape(-1,3)))
+
+    table = np.zeros(len(pieces), dtype=piece_type)
+    vertex_start = 0
+    triangle_start = 0
+    for i in range(0,len(pieces)):
+        vertices, triangles = piece_arrays[i]
+        if len(triangles) > 0 and (triangles.min() < 0 or triangles.max() >= len(vertices)):
+            raise ValueError(str.format("Piece {} has a vertex index out of range", names[i]))
+        table[i] = (vertex_start, len(vertices), triangle_start, len(triangles))
+        vertex_start += len(vertices)
+        triangle_start += len(triangles)
+
+    piece_records = []
+    for name, record in zip(names, records):
+        piece_record = dict(record)
+        piece_record["name"] = name
+        piece_records.append(piece_record)
+    records_bytes = json.dumps(piece_records, default=float).encode("utf-8")
+
+    header = np.zeros(1, dtype=header_type)
+    header["magic"] = magic
+    header["version"] = version
+    header["num_pieces"] = len(pieces)
+    header["pieces_offset"] = get_aligned(header_type.itemsize)
+    header["vertices_offset"] = get_aligned(int(header["pieces_offset"][0]) + table.nbytes)
+    header["triangles_offset"] = get_aligned(int(header["vertices_offset"][0]) + vertex_start*12)
+    header["records_offset"] = get_aligned(int(header["triangles_offset"][0]) + triangle_start*12)
+    header["records_size"] = len(records_bytes)
+    header["num_vertices"] = vertex_start
+    header["num_triangles"] = triangle_start
+
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as archive:
+            write_section(archive, 0, header.tobytes())
+            write_section(archive, header["pieces_offset"][0], table.tobytes())
+            archive.seek(int(header["vertices_offset"][0]))
+            for vertices, triangles in piece_arrays:
+                archive.write(vertices.astype("<f4").tobytes())
+            archive.seek(int(header["triangles_offset"][0]))
+            for vertices, triangles in piece_arrays:
+                archive.write(triangles.astype("<u4").tobytes())
+            write_section(archive, header["records_offset"][0], records_bytes)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def write_section(archive, offset, data):
+    archive.seek(int(offset))
+    archive.write(data)
+
+"""
+Get the records of the pieces of a cutting run, see transformer_engine.cutting_run
+plan holds the chosen candidate of every cut request, symmetric ones give a _pos and a _neg piece
+bones maps piece names to bone names, piece names are used where it has none
+"""
+def get_plan_records(pieces, plan, bones = None):
+    if bones == None:
+        bones = {}
+    records = []
+    i = 0
+    for step in plan:
+        candidate = step["candidate"]
+        for cut_box in candidate["cut_boxes"]:
+            name = pieces[i].name
+            records.append({"bone":bones.get(name, name),"cut_box":cut_box,"pd":candidate["pd"],\
+                            "candidate_id":candidate["id"],"volume":candidate["volume"]})
+            i += 1
+    return records
+
+"""
+Read side of an archive, the file is mapped and pieces are viewed as they are asked for
+"""
+class PieceArchive(object):
+
+    path = None
+    data = None
+    header = None
+    table = None
+    records = None
+
+    def __init__(self, path):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        if len(self.data) < header_type.itemsize:
+            raise ValueError(str.format("{} is too short for a piece archive", path))
+        self.header = np.frombuffer(self.data, header_type, 1, 0)[0]
+        if self.header["magic"] != magic:
+            raise ValueError(str.format("{} is not a piece archive", path))
+        if self.header["version"] != version:
+            raise ValueError(str.format("{} is a piece archive of version {}, {} is read", path, self.header["version"], version))
+        self.table = np.frombuffer(self.data, piece_type, int(self.header["num_pieces"]), int(self.header["pieces_offset"]))
+        offset = int(self.header["records_offset"])
+        self.records = json.loads(self.data[offset:offset + int(self.header["records_size"])].tobytes().decode("utf-8"))
+        return
+
+    def __len__(self):
+        return len(self.table)
+
+    def get_names(self):
+        return [record["name"] for record in self.records]
+
+    """
+    Get the position of a piece given by name or position
+    """
+    def get_index(self, piece):
+        if isinstance(piece, str):
+            names = self.get_names()
+            if piece not in names:
+                raise KeyError(str.format("No piece named {} in {}", piece, self.path))
+            return names.index(piece)
+        return piece
+
+    def get_record(self, piece):
+        return self.records[self.get_index(piece)]
+
+    """
+    Get a piece's vertices and triangles as read only float32 and uint32 views into the file
+    """
+    def get_arrays(self, piece):
+        entry = self.table[self.get_index(piece)]
+        vertices_offset = int(self.header["vertices_offset"]) + int(entry["vertex_start"])*12
+        triangles_offset = int(self.header["triangles_offset"]) + int(entry["triangle_start"])*12
+        vertices = np.frombuffer(self.data, "<f4", int(entry["vertex_count"])*3, vertices_offset).reshape(-1,3)
+        triangles = np.frombuffer(self.data, "<u4", int(entry["triangle_count"])*3, triangles_offset).reshape(-1,3)
+        return (vertices, triangles)
+
+    """
+    Get a piece's vertices in world space, placed by the matrix_world of its record, a list of 4 rows
+    Pieces without one are taken to be in world space already, like the ones of headless runs
+    """
+    def get_world_vertices(self, piece):
+        vertices = self.get_arrays(piece)[0].astype(np.float64)
+        matrix = self.get_record(piece).get("matrix_world")
+        if matrix == None:
+            return vertices
+        matrix = np.array(matrix, dtype=np.float64)
+        return vertices.dot(matrix[0:3,0:3].T) + matrix[0:3,3]
+
+    """
+    Get a piece as a TransformerMesh, its arrays are copied out of the file
+    """
+    def get_mesh(self, piece):
+        vertices, triangles = self.get_arrays(piece)
+        return TransformerMesh(self.get_record(piece)["name"], vertices, triangles)
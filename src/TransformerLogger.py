@@ -1,60 +1,159 @@
+import atexit
+import os
+import threading
+
+import transformer_config as config
+
+"""
+Log entries are buffered in memory and written out by a background thread
+Buffers are shared by all loggers so entries to the same file keep their order across modules
+"""
+buffers = {}
+buffer_lock = threading.Lock()
+write_lock = threading.Lock()
+flush_event = threading.Event()
+flush_thread = None
+# List of (directory, log file, text) entries while logs are captured instead of buffered,
+# directory is None for the ones under config.log_directory
+captured_logs = None
+
+"""
+Queue text to be appended to the log file at path
+"""
+def buffer_log(path, text):
+    if captured_logs != None:
+        directory, log_file = os.path.split(path)
+        if directory == config.log_directory:
+            directory = None
+        captured_logs.append((directory, log_file, text))
+        return
+    with buffer_lock:
+        if path not in buffers:
+            buffers[path] = []
+        buffers[path].append(text)
+    start_flush_thread()
+
+"""
+Write all buffered entries out, one open per log file
+"""
+def flush_logs():
+    global buffers
+    with write_lock:
+        with buffer_lock:
+            pending = buffers
+            buffers = {}
+        for path in pending:
+            directory = os.path.dirname(path)
+            if directory != "" and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(path,'a+') as log:
+                log.write("".join(pending[path]))
+
+"""
+Capture log entries in a list rather than writing them, used by worker processes
+whose entries are handed back and replayed in order by the parent
+Entries to the log directory go to the parent's one, workers do not know where that is
+"""
+def start_log_capture():
+    global captured_logs
+    captured_logs = []
+
+"""
+Stop capturing, return the entries captured
+"""
+def stop_log_capture():
+    global captured_logs
+    entries = captured_logs
+    captured_logs = None
+    return entries
+
+def replay_logs(entries):
+    for directory, log_file, text in entries:
+        if directory == None:
+            directory = config.log_directory
+        buffer_log(os.path.join(directory, log_file), text)
+
+def flush_loop():
+    while True:
+        flush_event.wait(config.log_flush_interval)
+        flush_event.clear()
+        flush_logs()
+
+def start_flush_thread():
+    global flush_thread
+    if flush_thread != None:
+        return
+    with buffer_lock:
+        if flush_thread == None:
+            flush_thread = threading.Thread(target=flush_loop, name="TransformerLogger")
+            flush_thread.daemon = True
+            flush_thread.start()
+
+atexit.register(flush_logs)
+
 class TransformerLogger(object):
-    
+
+    log_directory = None
     matching_log_file = None
     error_log_file = None
     choice_log_file = None
     analytic_log_file = None
 
-    def __init__(self):
-        self.matching_log_file = 'C:/Users/Xiaopewpew/Desktop/GithubProjects/Transformer/matching_log.txt'
-        self.error_log_file = 'C:/Users/Xiaopewpew/Desktop/GithubProjects/Transformer/error_log.txt'
-        self.choice_log_file = 'C:/Users/Xiaopewpew/Desktop/GithubProjects/Transformer/choice_log.txt'
-        self.analytic_log_file = 'C:/Users/Xiaopewpew/Desktop/GithubProjects/Transformer/analytic_log.txt'
+    """
+    log_directory pins this logger to a directory, config.log_directory is followed otherwise
+    """
+    def __init__(self, log_directory = None):
+        self.log_directory = log_directory
+        self.matching_log_file = 'matching_log.txt'
+        self.error_log_file = 'error_log.txt'
+        self.choice_log_file = 'choice_log.txt'
+        self.analytic_log_file = 'analytic_log.txt'
         return
-    
+
+    def get_log_path(self,log_file):
+        log_directory = self.log_directory
+        if log_directory == None:
+            log_directory = config.log_directory
+        return os.path.join(log_directory,log_file)
+
     def log_start(self):
-        with open(self.matching_log_file,'w') as log:
-            log.close()
-        with open(self.error_log_file,'w') as log:
-            log.close()
-        with open(self.choice_log_file,'w') as log:
-            log.close()
-        with open(self.analytic_log_file,'w') as log:
-            log.close()
-        
+        paths = [self.get_log_path(log_file) for log_file in \
+                 (self.matching_log_file,self.error_log_file,self.choice_log_file,self.analytic_log_file)]
+        with write_lock:
+            with buffer_lock:
+                for path in paths:
+                    buffers.pop(path, None)
+            for path in paths:
+                directory = os.path.dirname(path)
+                if directory != "" and not os.path.isdir(directory):
+                    os.makedirs(directory)
+                with open(path,'w') as log:
+                    log.close()
+
+    """
+    Write buffered entries out now, called at tier boundaries and before reading logs back
+    """
+    def flush(self):
+        flush_logs()
+
     def add_matching_log(self,log_entry):
-        with open(self.matching_log_file,'a+') as log:
-            log.write(log_entry)
-            log.write("\n")
-            log.close()
-    
+        buffer_log(self.get_log_path(self.matching_log_file), log_entry + "\n")
+
     def add_matching_separation(self):
-        with open(self.matching_log_file,'a+') as log:
-            log.write("\n")
-            log.write("=================================================================================================================================")
-            log.write("\n")
-            log.write("#################################################################################################################################")
-            log.write("\n")
-            log.write("=================================================================================================================================")
-            log.write("\n")
-            log.write("\n")
-            log.close()
-        
+        separation = "\n" \
+            + "=================================================================================================================================" + "\n" \
+            + "#################################################################################################################################" + "\n" \
+            + "=================================================================================================================================" + "\n" \
+            + "\n"
+        buffer_log(self.get_log_path(self.matching_log_file), separation)
+        # A cut request is done, hand the entries to the background thread
+        flush_event.set()
+
     def add_error_log(self,log_entry):
-        with open(self.error_log_file,'a+') as log:
-            log.write(log_entry)
-            log.write("\n")
-            log.close()
-        
+        buffer_log(self.get_log_path(self.error_log_file), log_entry + "\n")
+
     def add_choice_log(self,log_entry):
-        with open(self.choice_log_file,'a+') as log:
-            log.write(log_entry)
-            log.write("\n")
-            log.close()
-    
+        buffer_log(self.get_log_path(self.choice_log_file), log_entry + "\n")
+
     def add_analytic_log(self,log_entry):
-        with open(self.analytic_log_file,'a+') as log:
-            log.write(log_entry)
-            log.write("\n")
-            log.close()
-    
\ No newline at end of file
+        buffer_log(self.get_log_path(self.analytic_log_file), log_entry + "\n")
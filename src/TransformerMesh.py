@@ -0,0 +1,135 @@
+import numpy as np
+
+import boundbox_helper as bb
+import clipping_helper as clip
+import transformer_config as config
+import volume_helper as vol
+
+from TriangleBVH import TriangleBVH
+from VolumeProfile import VolumeProfile
+
+class TransformerMesh(object):
+
+    name = None
+    vertices = None
+    triangles = None
+    # Bumped whenever the geometry changes, memoized statistics of older revisions are stale
+    revision = 0
+    extents = None
+    extents_revision = -1
+    # Volume profiles by axis, built on demand or handed down from the mesh this one was cut from
+    profiles = None
+    profiles_revision = -1
+    bvh = None
+    bvh_revision = -1
+    # config.bvh_min_triangles when the mesh was made, meshes cut from it take it over
+    # so the ones cut in worker processes do not depend on the worker's config
+    bvh_min_triangles = None
+
+    def __init__(self, name, vertices, triangles, bvh_min_triangles=None):
+        self.name = name
+        self.bvh_min_triangles = bvh_min_triangles
+        if bvh_min_triangles == None:
+            self.bvh_min_triangles = config.bvh_min_triangles
+        self.set_geometry(vertices, triangles)
+        return
+
+    def set_geometry(self, vertices, triangles):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float64).reshape(-1,3)
+        self.triangles = np.ascontiguousarray(triangles, dtype=np.int64).reshape(-1,3)
+        self.revision += 1
+
+    def get_triangle_verts(self):
+        return vol.get_triangle_verts(self.vertices, self.triangles)
+
+    """
+    Taken off a volume profile when there is one
+    """
+    def get_volume(self):
+        for profile in self.get_volume_profiles().values():
+            return profile.get_volume()
+        return vol.get_volume(self.get_triangle_verts())
+
+    """
+    Get the volume profiles of the current geometry by axis
+    """
+    def get_volume_profiles(self):
+        if self.profiles_revision != self.revision:
+            self.profiles = {}
+            self.profiles_revision = self.revision
+        return self.profiles
+
+    """
+    Get the volume profile along axis, built if there is none yet
+    """
+    def get_volume_profile(self, axis):
+        profiles = self.get_volume_profiles()
+        if axis not in profiles:
+            profiles[axis] = VolumeProfile(self.get_triangle_verts(), axis)
+        return profiles[axis]
+
+    def set_volume_profile(self, axis, profile):
+        self.get_volume_profiles()[axis] = profile
+
+    """
+    Get volume below each plane perpendicular to axis, off the volume profile if there is one
+    """
+    def get_volumes_below(self, axis, planes):
+        profiles = self.get_volume_profiles()
+        if axis in profiles:
+            return profiles[axis].get_volumes_below(planes)
+        return vol.get_volumes_below(self.get_triangle_verts(), axis, planes)
+
+    """
+    Get (min, max) corner arrays, memoized until the geometry changes
+    """
+    def get_extents(self):
+        if self.extents_revision != self.revision:
+            self.extents = bb.get_extents(self.vertices, self.triangles)
+            self.extents_revision = self.revision
+        return self.extents
+
+    def get_boundbox(self, num_divs):
+        mins, maxs = self.get_extents()
+        return bb.get_boundbox(mins, maxs, num_divs)
+
+    def get_dims(self):
+        mins, maxs = self.get_extents()
+        return tuple(maxs - mins)
+
+    """
+    Get the TriangleBVH of the current geometry for a box query, memoized until the geometry changes
+    None for the first query of a geometry, most regions are only queried once and scanning them whole
+    is cheaper than building one, and for meshes under bvh_min_triangles
+    """
+    def get_bvh(self):
+        if len(self.triangles) < self.bvh_min_triangles:
+            return None
+        if self.bvh_revision != self.revision:
+            self.bvh = None
+            self.bvh_revision = self.revision
+        elif self.bvh == None:
+            self.bvh = TriangleBVH(self.vertices, self.triangles)
+        return self.bvh
+
+    """
+    Get the dimensions intersect_box would give without clipping, see clipping_helper
+    closed is False for regions left open by clipping
+    """
+    def get_clipped_dims(self, cut_box, closed=True):
+        mins, maxs = clip.get_clipped_extents(self.vertices, self.triangles, cut_box, closed, self.get_bvh())
+        return tuple(maxs - mins)
+
+    """
+    Without cap the result is left open on the box faces, see transformer_engine
+    """
+    def intersect_box(self, cut_box, name, cap=True):
+        bvh = None
+        if not cap:
+            bvh = self.get_bvh()
+        vertices, triangles = clip.intersect_box(self.vertices, self.triangles, cut_box, cap, bvh)
+        return TransformerMesh(name, vertices, triangles, self.bvh_min_triangles)
+
+    def subtract_box(self, cut_box):
+        vertices, triangles = clip.subtract_box(self.vertices, self.triangles, cut_box)
+        return TransformerMesh(self.name, vertices, triangles, self.bvh_min_triangles)
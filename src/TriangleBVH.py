@@ -0,0 +1,186 @@
+import numpy as np
+
+"""
+Bounding volume hierarchy over the triangles of a mesh, for box, plane and line queries
+Triangles are sorted along a Morton curve of their centroids and cut into leaves of leaf_size,
+every level above halves the one below, so node i of a level has nodes 2i and 2i+1 below it
+and covers a range of the sorted triangles. Levels are (mins, maxs) arrays of node bounds.
+A query walks the levels with all nodes of a level at once: nodes missing the query are dropped,
+nodes inside it are answered off their aggregated bounds and triangle ranges, and only the triangles
+of leaves on its boundary are tested one by one, so a query costs what the boundary of the query holds
+rather than what the mesh does
+"""
+class TriangleBVH(object):
+
+    leaf_size = None
+    num_triangles = None
+    # Triangle indices in the sorted order, and their bounds in that order
+    order = None
+    tri_mins = None
+    tri_maxs = None
+    # (mins, maxs) per level, root first
+    levels = None
+
+    def __init__(self, vertices, triangles, leaf_size=16):
+        vertices = np.asarray(vertices, dtype=np.float64)
+        triangles = np.asarray(triangles, dtype=np.int64).reshape(-1,3)
+        self.leaf_size = leaf_size
+        self.num_triangles = len(triangles)
+        self.levels = []
+        if len(triangles) == 0:
+            self.order = np.zeros(0, dtype=np.int64)
+            self.tri_mins = np.zeros((0,3))
+            self.tri_maxs = np.zeros((0,3))
+            return
+
+        corners = [vertices[triangles[:,i]] for i in range(0,3)]
+        tri_mins = np.minimum(np.minimum(corners[0], corners[1]), corners[2])
+        tri_maxs = np.maximum(np.maximum(corners[0], corners[1]), corners[2])
+        self.order = np.argsort(get_morton_codes((tri_mins + tri_maxs)/2), kind="stable")
+        self.tri_mins = tri_mins[self.order]
+        self.tri_maxs = tri_maxs[self.order]
+
+        leaf_starts = np.arange(0, len(triangles), leaf_size)
+        mins = np.minimum.reduceat(self.tri_mins, leaf_starts, axis=0)
+        maxs = np.maximum.reduceat(self.tri_maxs, leaf_starts, axis=0)
+        self.levels.append((mins, maxs))
+        while len(mins) > 1:
+            # An odd node out gets an empty sibling that misses every query
+            if len(mins) % 2 == 1:
+                mins = np.concatenate((mins, np.full((1,3), np.inf)))
+                maxs = np.concatenate((maxs, np.full((1,3), -np.inf)))
+            mins = np.minimum(mins[0::2], mins[1::2])
+            maxs = np.maximum(maxs[0::2], maxs[1::2])
+            self.levels.append((mins, maxs))
+        self.levels.reverse()
+        return
+
+    """
+    Get (min, max) corner arrays of the mesh
+    """
+    def get_extents(self):
+        if self.num_triangles == 0:
+            return (np.zeros(3), np.zeros(3))
+        return (self.levels[0][0][0], self.levels[0][1][0])
+
+    """
+    Query the box between lows and highs, bounds may be infinite
+    A triangle is inside the box if its bounds are, with strict_lows strictly above lows
+    Return (inside ranges, inside bounds, nearby triangles)
+    inside ranges are (starts, ends) of sorted triangles inside the box, see get_triangles,
+    inside bounds the (mins, maxs) of every range, and nearby triangles the indices of the triangles
+    overlapping the box without being inside it
+    """
+    def query_box(self, lows, highs, strict_lows=False):
+        lows = np.asarray(lows, dtype=np.float64)
+        highs = np.asarray(highs, dtype=np.float64)
+        starts = [np.zeros(0, dtype=np.int64)]
+        ends = [np.zeros(0, dtype=np.int64)]
+        inside_mins = [np.zeros((0,3))]
+        inside_maxs = [np.zeros((0,3))]
+        nodes = np.zeros(min(1, len(self.levels)), dtype=np.int64)
+        depth = len(self.levels)
+        for level in range(0,depth):
+            mins = self.levels[level][0][nodes]
+            maxs = self.levels[level][1][nodes]
+            is_overlapping, is_inside = classify_bounds(mins, maxs, lows, highs, strict_lows)
+            is_inside &= is_overlapping
+            # Leaves covered by a node of this level
+            leaf_span = 1 << (depth - 1 - level)
+            inside_nodes = nodes[is_inside]
+            starts.append(inside_nodes*leaf_span*self.leaf_size)
+            ends.append(np.minimum((inside_nodes + 1)*leaf_span*self.leaf_size, self.num_triangles))
+            inside_mins.append(mins[is_inside])
+            inside_maxs.append(maxs[is_inside])
+            nodes = nodes[is_overlapping & ~is_inside]
+            if level < depth - 1:
+                nodes = np.concatenate((2*nodes, 2*nodes + 1))
+                nodes = nodes[nodes < len(self.levels[level+1][0])]
+
+        # Triangles of the leaves on the boundary
+        positions = get_range_positions(nodes*self.leaf_size, np.minimum((nodes + 1)*self.leaf_size, self.num_triangles))
+        is_overlapping, is_inside = classify_bounds(self.tri_mins[positions], self.tri_maxs[positions], lows, highs, strict_lows)
+        is_inside &= is_overlapping
+        starts.append(positions[is_inside])
+        ends.append(positions[is_inside] + 1)
+        inside_mins.append(self.tri_mins[positions[is_inside]])
+        inside_maxs.append(self.tri_maxs[positions[is_inside]])
+        nearby = self.order[positions[is_overlapping & ~is_inside]]
+        return ((np.concatenate(starts), np.concatenate(ends)), (np.concatenate(inside_mins), np.concatenate(inside_maxs)), nearby)
+
+    """
+    Get the triangle indices of ranges of sorted triangles
+    """
+    def get_triangles(self, ranges):
+        return self.order[get_range_positions(ranges[0], ranges[1])]
+
+    """
+    Get the indices of the triangles overlapping the box between lows and highs
+    """
+    def get_box_triangles(self, lows, highs):
+        ranges, bounds, nearby = self.query_box(lows, highs)
+        return np.concatenate((self.get_triangles(ranges), nearby))
+
+    """
+    Get the indices of the triangles reaching the plane p[axis] = t from both sides or lying on it
+    """
+    def get_plane_triangles(self, axis, t):
+        lows = np.full(3, -np.inf)
+        highs = np.full(3, np.inf)
+        lows[axis] = t
+        highs[axis] = t
+        return self.get_box_triangles(lows, highs)
+
+    """
+    Get the indices of the triangles whose bounds come within margin of the line through point parallel to axis
+    """
+    def get_line_triangles(self, axis, point, margin):
+        lows = np.asarray(point, dtype=np.float64) - margin
+        highs = np.asarray(point, dtype=np.float64) + margin
+        lows[axis] = -np.inf
+        highs[axis] = np.inf
+        return self.get_box_triangles(lows, highs)
+
+"""
+Get (overlapping, inside) masks of bounds against the box between lows and highs
+"""
+def classify_bounds(mins, maxs, lows, highs, strict_lows):
+    is_overlapping = np.all((maxs >= lows) & (mins <= highs), axis=1)
+    if strict_lows:
+        is_inside = np.all((mins > lows) & (maxs <= highs), axis=1)
+    else:
+        is_inside = np.all((mins >= lows) & (maxs <= highs), axis=1)
+    return (is_overlapping, is_inside)
+
+"""
+Get the positions of the ranges from starts to ends, one after another
+"""
+def get_range_positions(starts, ends):
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(total)
+
+"""
+Get the 10 bit numbers with two zero bits put after each bit, looked up by get_morton_codes
+"""
+def get_spread_bits():
+    bits = np.arange(1024, dtype=np.int64)
+    bits = (bits | (bits << 16)) & 0x030000FF
+    bits = (bits | (bits << 8)) & 0x0300F00F
+    bits = (bits | (bits << 4)) & 0x030C30C3
+    bits = (bits | (bits << 2)) & 0x09249249
+    return bits.astype(np.int32)
+
+spread_bits = get_spread_bits()
+
+"""
+Get 30 bit Morton codes of points, 10 bits per axis within the points' bounds
+"""
+def get_morton_codes(points):
+    mins = points.min(axis=0)
+    spans = np.maximum(points.max(axis=0) - mins, 1e-300)
+    cells = np.clip(((points - mins)*(1023/spans)).astype(np.int32), 0, 1023)
+    return (spread_bits[cells[:,0]] << 2) | (spread_bits[cells[:,1]] << 1) | spread_bits[cells[:,2]]
@@ -0,0 +1,93 @@
+import copy
+
+import numpy as np
+
+"""
+Volume of a closed mesh below any plane perpendicular to an axis, kept as a piecewise cubic
+The flux volume_helper.get_volumes_below sums is, per triangle, a cubic in the plane position
+between the triangle's lowest, middle and highest corner. Adding up the changes of these cubics
+at the corners in order gives the profile once, after which any plane is a lookup.
+Profiles of pieces cut out of the mesh are subtracted without going over the mesh again
+"""
+class VolumeProfile(object):
+
+    axis = None
+    # Positions are taken relative to center to keep the cubic coefficients small
+    center = None
+    # Corner gaps below tolerance are closed, a cubic over them would have huge coefficients
+    tolerance = None
+    # Sorted corner positions and the change of the cubic's coefficients (1, t, t^2, t^3) at each
+    breaks = None
+    deltas = None
+    # Coefficients in force after each break, the first row before any break
+    coefficients = None
+
+    def __init__(self, tri_verts, axis, center=None):
+        self.axis = axis
+        coords = tri_verts[:,:,axis]
+        if center == None:
+            center = float(coords.mean()) if len(coords) > 0 else 0.0
+        self.center = center
+        self.tolerance = 1e-6*float(coords.max() - coords.min()) if len(coords) > 0 else 0.0
+        self.set_deltas(*self.get_deltas(tri_verts))
+        return
+
+    """
+    Get (corner positions, coefficient changes) of the triangles' cubics
+    """
+    def get_deltas(self, tri_verts):
+        edge_1 = tri_verts[:,1] - tri_verts[:,0]
+        edge_2 = tri_verts[:,2] - tri_verts[:,0]
+        area = 0.5*np.cross(edge_1, edge_2)[:,self.axis]
+        coords = np.sort(tri_verts[:,:,self.axis], axis=1) - self.center
+        lo = coords[:,0]
+        mid = coords[:,1]
+        hi = coords[:,2]
+        mean = (lo+mid+hi)/3
+        is_first_empty = mid - lo <= self.tolerance
+        is_second_empty = hi - mid <= self.tolerance
+        zeros = np.zeros(len(area))
+
+        # Past the highest corner
+        whole = np.stack((area*mean, -area, zeros, zeros), axis=1)
+        # Between the middle and the highest corner, whole less -area*(hi-t)^3/(3*(hi-mid)*(hi-lo))
+        k = np.where(is_second_empty, 0.0, -area/(3*np.where(is_second_empty, 1, (hi-mid)*(hi-lo))))
+        upper = whole + k[:,None]*np.stack((hi**3, -3*hi**2, 3*hi, -np.ones(len(area))), axis=1)
+        # Between the lowest and the middle corner, -area*(t-lo)^3/(3*(mid-lo)*(hi-lo))
+        k = np.where(is_first_empty, 0.0, -area/(3*np.where(is_first_empty, 1, (mid-lo)*(hi-lo))))
+        lower = k[:,None]*np.stack((-lo**3, 3*lo**2, -3*lo, np.ones(len(area))), axis=1)
+        upper = np.where(is_second_empty[:,None], whole, upper)
+        lower = np.where(is_first_empty[:,None], upper, lower)
+
+        breaks = np.concatenate((lo, mid, hi))
+        deltas = np.concatenate((lower, upper - lower, whole - upper))
+        return (breaks, deltas)
+
+    def set_deltas(self, breaks, deltas):
+        order = np.argsort(breaks, kind="stable")
+        self.breaks = breaks[order]
+        self.deltas = deltas[order]
+        self.coefficients = np.concatenate((np.zeros((1,4)), np.cumsum(self.deltas, axis=0)))
+
+    """
+    Get the profile of the mesh with the closed piece tri_verts cut out of it
+    """
+    def subtract(self, tri_verts):
+        profile = copy.copy(self)
+        breaks, deltas = self.get_deltas(tri_verts)
+        profile.set_deltas(np.concatenate((self.breaks, breaks)), np.concatenate((self.deltas, -deltas)))
+        return profile
+
+    """
+    Get volume below each plane, like volume_helper.get_volumes_below
+    """
+    def get_volumes_below(self, planes):
+        t = np.atleast_1d(np.asarray(planes, dtype=np.float64)) - self.center
+        # A flat triangle on a plane counts as below it
+        coefficients = self.coefficients[np.searchsorted(self.breaks, t, side="right")]
+        return coefficients[:,0] + t*(coefficients[:,1] + t*(coefficients[:,2] + t*coefficients[:,3]))
+
+    def get_volume(self):
+        if len(self.breaks) == 0:
+            return 0.0
+        return float(self.get_volumes_below([self.breaks[-1] + self.center])[0])
@@ -0,0 +1,29 @@
+import numpy as np
+
+"""
+Volume ratio of a region below planes perpendicular to an axis, between lo and hi
+Stands in for a cumulative volume table in the volume_helper solvers, which then find cut positions by
+root finding on the exact volume instead of interpolating between table boundaries
+"""
+class VolumeRatioFunction(object):
+
+    profile = None
+    lo = None
+    hi = None
+    volume_lo = None
+    volume = None
+
+    def __init__(self, profile, lo, hi):
+        self.profile = profile
+        self.lo = lo
+        self.hi = hi
+        self.volume_lo, volume_hi = profile.get_volumes_below([lo, hi])
+        self.volume = volume_hi - self.volume_lo
+        return
+
+    """
+    Get volume ratio below each of the planes, clamped to 0 and 1 outside lo and hi like a table is
+    """
+    def __call__(self, planes):
+        planes = np.clip(np.atleast_1d(np.asarray(planes, dtype=np.float64)), self.lo, self.hi)
+        return (self.profile.get_volumes_below(planes) - self.volume_lo)/self.volume
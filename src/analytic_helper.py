@@ -1,36 +1,36 @@
-import bpy
 import math
 
-import transformer_config as config
+import volume_helper as vol
 
 """
-DEPENDENCY : http://wiki.blender.org/index.php/Extensions:2.6/Py/Scripts/Mesh/VolumeTools
+Compare estimated volume ratios of divisions of the object named name against their exact volumes
+Exact volumes of the object and all its divisions are computed in one batched call
+mesh and divisions are (vertices, triangles) pairs, mesh the arrays the caller read off the object
 """
 
-def analyse_volume_approximation(object, divisions, estimated_volume_ratios, logger):
-    logger.add_analytic_log(object.name)
+def analyse_volume_approximation(name, mesh, divisions, estimated_volume_ratios, logger):
+    logger.add_analytic_log(name)
     logger.add_analytic_log(str.format("Estimated volume: {}", estimated_volume_ratios))
-    if config.DEBUG_ANALYTICS:
-        volume_ratios = []
-        pds = []
-        # Set cuboid to be current active object
-        object.select = True
-        bpy.context.scene.objects.active = object
-        bpy.ops.object.volume()
-        total_volume = object['volume']
-        object.select = False
-        
-        for division in divisions:
-            division.select = True
-            bpy.context.scene.objects.active = division
-            bpy.ops.object.volume()
-            volume_ratios.append(division['volume']/total_volume)
-            division.select = False
-        
-        """
-        for i in range(0,len(estimated_volume_ratios)):
-            pd = math.fabs((estimated_volume_ratios[i] - volume_ratios[i])/volume_ratios[i])
-            pds.append(pd)
-        """
-        logger.add_analytic_log(str.format("Actual volume: {}", volume_ratios))
-        logger.add_analytic_log(str.format("Percentage discrepancy: {}", pds))
+    
+    meshes = [mesh]
+    meshes.extend(divisions)
+    volumes = vol.get_mesh_volumes(meshes)
+    total_volume = volumes[0]
+    logger.add_analytic_log(str.format("Total volume: {}", total_volume))
+    
+    # Estimates from the slab profiler come without divisions and are exact already
+    if len(divisions) == 0 or total_volume == 0:
+        return
+    
+    volume_ratios = []
+    pds = []
+    for i in range(0,len(divisions)):
+        volume_ratio = volumes[i+1]/total_volume
+        volume_ratios.append(volume_ratio)
+        if volume_ratio != 0:
+            pds.append(math.fabs((estimated_volume_ratios[i] - volume_ratio)/volume_ratio))
+        else:
+            pds.append(-1)
+    
+    logger.add_analytic_log(str.format("Actual volume: {}", volume_ratios))
+    logger.add_analytic_log(str.format("Percentage discrepancy: {}", pds))
@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 """ Get sum of items in a list """
 def summation(x):
     result = 0;
@@ -41,3 +43,11 @@ def next_smallest_prime(mynum):
         if isPrime:
             return num
         num = num+1
+
+"""
+Rank candidates by pd, best first, candidates with equal pds keep their order
+pds is a list or array of pds
+Return array of indices into pds
+"""
+def rank_candidates(pds):
+    return np.argsort(np.asarray(pds, dtype=np.float64), kind="stable")
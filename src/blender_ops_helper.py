@@ -1,4 +1,12 @@
 import bpy
+import numpy as np
+
+import transformer_tracer as tracer
+import volume_helper as vol
+
+from CuboidPool import CuboidPool
+from DatablockArena import DatablockArena
+from TransformerMesh import TransformerMesh
 
 """
 Return the 8 vertices of a cuboid constructed from  constrains of 3 dimensions
@@ -18,16 +26,22 @@ def generate_cuboid_verts(x_max,x_min,y_max,y_min,z_max,z_min):
 """
 Create a cubic blender object
 Takes in 8 vertices of cuboid and name of the object
+Within a pool's scope the object is a reused one from the pool
 Return the object created
 """
 def create_cuboid(verts, name):
+    pool = CuboidPool.get_active()
+    if pool != None:
+        return pool.acquire(verts, name)
     cuboid_verts = verts
-    cuboid_faces = [(0,1,3,2),(4,6,7,5),(0,4,5,1),(1,5,7,3),(4,0,2,6),(6,2,3,7)]
+    cuboid_faces = CuboidPool.faces
     cuboid_mesh = bpy.data.meshes.new(name)
     cuboid = bpy.data.objects.new(name, cuboid_mesh)
     bpy.context.scene.objects.link(cuboid)
+    tracer.count_object_created()
     cuboid_mesh.from_pydata(cuboid_verts, [], cuboid_faces)
     cuboid_mesh.update(calc_edges=True)
+    record_object(cuboid)
     return cuboid
 
 """
@@ -38,6 +52,7 @@ Return copied object
 def copy_object(orig_obj, to_obj_name):
     temp_mesh = bpy.data.meshes.new('SomeNameThatDoesntMatter')
     copy = bpy.data.objects.new(to_obj_name, temp_mesh)
+    tracer.count_object_created()
     copy.data = orig_obj.data.copy()
     copy.data.name = to_obj_name
     copy.location = orig_obj.location
@@ -46,8 +61,123 @@ def copy_object(orig_obj, to_obj_name):
     bpy.context.scene.objects.link(copy)
     
     bpy.data.meshes.remove(temp_mesh)
+    record_object(copy)
     return copy
 
+"""
+Record a created object in the active arena, if any, so it is freed when the arena's scope exits
+"""
+def record_object(obj):
+    arena = DatablockArena.get_active()
+    if arena != None:
+        arena.add_object(obj)
+
+"""
+Let objects outlive the active arena's and pool's scope
+"""
+def keep_objects(objs):
+    arena = DatablockArena.get_active()
+    pool = CuboidPool.get_active()
+    for obj in objs:
+        if arena != None:
+            arena.keep(obj)
+        if pool != None:
+            pool.keep(obj)
+
+"""
+Delete objects and their meshes directly, without selecting them or scanning the scene
+Within an arena's scope they are unlinked now and freed in bulk when the scope exits
+Cuboids of the active pool go back to the pool instead
+"""
+@tracer.traced
+def remove_objects(objs):
+    pool = CuboidPool.get_active()
+    if pool != None:
+        for obj in objs:
+            if pool.owns(obj):
+                pool.release(obj)
+        objs = [obj for obj in objs if not pool.owns(obj)]
+    arena = DatablockArena.get_active()
+    if arena != None:
+        for obj in objs:
+            arena.discard(obj)
+        return
+    scene_objects = bpy.context.scene.objects
+    for obj in objs:
+        mesh = obj.data
+        if obj.name in scene_objects:
+            scene_objects.unlink(obj)
+        bpy.data.objects.remove(obj)
+        if mesh != None and mesh.users == 0:
+            bpy.data.meshes.remove(mesh)
+
+"""
+Read vertex and triangle arrays of a blender object's mesh in bulk
+Polygons are fan triangulated
+Return (vertices, triangles) as numpy arrays
+"""
+def get_mesh_arrays(obj):
+    mesh = obj.data
+    vertices = np.empty(len(mesh.vertices)*3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", vertices)
+    loop_starts = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_start", loop_starts)
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_totals)
+    loop_vertices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loop_vertices)
+    
+    triangles = vol.triangulate_polygons(loop_starts, loop_totals, loop_vertices)
+    return (vertices.reshape(-1,3).astype(np.float64), triangles)
+
+"""
+Load a blender object into a TransformerMesh for the headless engine
+"""
+def get_transformer_mesh(obj):
+    vertices, triangles = get_mesh_arrays(obj)
+    return TransformerMesh(obj.name, vertices, triangles)
+
+"""
+Create a blender mesh from a TransformerMesh in bulk
+Return the mesh created
+"""
+def create_mesh(transformer_mesh, name):
+    vertices = transformer_mesh.vertices
+    triangles = transformer_mesh.triangles
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(vertices))
+    mesh.vertices.foreach_set("co", vertices.astype(np.float32).ravel())
+    mesh.loops.add(len(triangles)*3)
+    mesh.loops.foreach_set("vertex_index", triangles.astype(np.int32).ravel())
+    mesh.polygons.add(len(triangles))
+    mesh.polygons.foreach_set("loop_start", np.arange(0, len(triangles)*3, 3, dtype=np.int32))
+    mesh.polygons.foreach_set("loop_total", np.full(len(triangles), 3, dtype=np.int32))
+    mesh.update(calc_edges=True)
+    return mesh
+
+"""
+Write a TransformerMesh back into an existing blender object, old mesh is flushed
+"""
+def set_transformer_mesh(obj, transformer_mesh):
+    old_mesh = obj.data
+    obj.data = create_mesh(transformer_mesh, obj.name)
+    if old_mesh.users == 0:
+        bpy.data.meshes.remove(old_mesh)
+
+"""
+Create a blender object from a TransformerMesh
+Transformation is copied from orig_obj as the mesh is in its local coordinates
+Return the object created
+"""
+def create_transformer_object(transformer_mesh, name, orig_obj):
+    obj = bpy.data.objects.new(name, create_mesh(transformer_mesh, name))
+    tracer.count_object_created()
+    obj.location = orig_obj.location
+    obj.scale = orig_obj.scale
+    obj.rotation_euler = orig_obj.rotation_euler
+    bpy.context.scene.objects.link(obj)
+    return obj
+
 """
 Set object's origin to its center of mass
 """
@@ -64,6 +194,7 @@ obj_from is the object parameter in boolean operation
 obj_to is the object which operator is applied to
 level is the level of subdivision on the to object
 """
+@tracer.traced
 def perform_boolean_intersection(obj_from, obj_to, level):
     # Set obj_to to be current active object
     obj_to.select = True
@@ -96,6 +227,7 @@ obj_from is the object parameter in boolean operation
 obj_to is the object which operator is applied to
 level is the level of subdivision on the from object
 """
+@tracer.traced
 def perform_boolean_difference(obj_from, obj_to, level):
     # Subdivide obj_from
     obj_from.select = True
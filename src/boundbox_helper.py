@@ -0,0 +1,58 @@
+from collections import namedtuple
+
+import numpy as np
+
+"""
+Bounding box statistics the tiers work with
+Extents are read off vertex arrays in bulk, TransformerMesh memoizes them per revision
+"""
+
+"""
+Extents of a mesh, the interval of num_divs divisions along each dimension
+and the box padded by one interval the division and cut boxes extend to
+"""
+class BoundBox(namedtuple("BoundBox", ["x_min","x_max","y_min","y_max","z_min","z_max",\
+                                       "x_interval","y_interval","z_interval",\
+                                       "x_max_box","x_min_box","y_max_box","y_min_box","z_max_box","z_min_box"])):
+    __slots__ = ()
+
+    """
+    Get a value by dimension string, get("y","min") is y_min
+    """
+    def get(self, dim_string, key):
+        return getattr(self, str.format("{}_{}", dim_string, key))
+
+    def get_dims(self):
+        return (self.x_max-self.x_min, self.y_max-self.y_min, self.z_max-self.z_min)
+
+"""
+Build the bounding box of extents mins and maxs divided num_divs times along each dimension
+"""
+def get_boundbox(mins, maxs, num_divs):
+    mins = np.asarray(mins, dtype=np.float64)
+    maxs = np.asarray(maxs, dtype=np.float64)
+    intervals = (maxs-mins)/num_divs
+    maxs_box = maxs + intervals
+    mins_box = mins - intervals
+    return BoundBox(float(mins[0]), float(maxs[0]), float(mins[1]), float(maxs[1]), float(mins[2]), float(maxs[2]),\
+                    float(intervals[0]), float(intervals[1]), float(intervals[2]),\
+                    float(maxs_box[0]), float(mins_box[0]), float(maxs_box[1]), float(mins_box[1]), float(maxs_box[2]), float(mins_box[2]))
+
+"""
+Get the bounding box around groups of points, like blender's bound_box corners or (min, max) extents
+"""
+def get_points_boundbox(point_groups, num_divs):
+    points = np.concatenate([np.asarray([tuple(point) for point in points], dtype=np.float64).reshape(-1,3) for points in point_groups])
+    return get_boundbox(points.min(axis=0), points.max(axis=0), num_divs)
+
+"""
+Get (min, max) corner arrays of the vertices triangles use, loose vertices are left out
+"""
+def get_extents(vertices, triangles):
+    vertices = np.asarray(vertices)
+    used = np.zeros(len(vertices), dtype=bool)
+    used[np.asarray(triangles, dtype=np.int64).ravel()] = True
+    if not used.any():
+        return (np.zeros(3), np.zeros(3))
+    used_vertices = vertices[used]
+    return (used_vertices.min(axis=0), used_vertices.max(axis=0))
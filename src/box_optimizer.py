@@ -0,0 +1,261 @@
+import itertools
+import time
+
+import numpy as np
+
+import boundbox_helper as bb
+import clipping_helper as clip
+import volume_helper as vol
+
+from TriangleBVH import TriangleBVH
+from VolumeProfile import VolumeProfile
+
+"""
+Continuous search for a cut box over its six bounds, free of the tier grids and their fixed axis order
+A box is a (2,3) array of low and high bounds within the mesh's extents.
+The search cycles over the axes, moving the two bounds along one axis at a time with the other four held.
+The mesh is clipped to the held bounds once without caps, which is the step's only geometry evaluation.
+Caps on those planes are parallel to the axis, so the clipped region's volume profile along it is exact,
+and the intersection of any box of the step with the mesh is bounded by the region's surface between
+the two bounds, the box corners inside the mesh and nothing else. Volumes and extents of many bounds
+are then evaluated at once off the region, and the bounds are zoomed in on on a grid.
+Boxes are scored by a function of their volume ratios and clipped dimensions, lower is better
+"""
+
+"""
+Get the cut box dict of bounds
+"""
+def get_cut_box(bounds):
+    return {"x_min":float(bounds[0,0]),"x_max":float(bounds[1,0])\
+            ,"y_min":float(bounds[0,1]),"y_max":float(bounds[1,1])\
+            ,"z_min":float(bounds[0,2]),"z_max":float(bounds[1,2])}
+
+"""
+Everything a step along axis needs from the geometry, with bounds along the other axes held
+Return (region vertices sorted along axis, region edge starts, region edge ends, volume profile, corner lines)
+corner lines are (corner point, crossings) of the 4 box edges along axis, see volume_helper.get_line_crossings
+The region and the lines only look at the triangles bvh finds near them
+"""
+def get_axis_region(vertices, triangles, bvh, bounds, axis):
+    open_bounds = bounds.copy()
+    open_bounds[0,axis] = -np.inf
+    open_bounds[1,axis] = np.inf
+    region_vertices, region_triangles = clip.intersect_box(vertices, triangles, get_cut_box(open_bounds), False, bvh)
+    profile = VolumeProfile(vol.get_triangle_verts(region_vertices, region_triangles), axis)
+    starts = region_vertices[region_triangles].reshape(-1,3)
+    ends = region_vertices[region_triangles[:,[1,2,0]]].reshape(-1,3)
+    b, c = [i for i in range(0,3) if i != axis]
+    mins, maxs = bvh.get_extents()
+    margin = 1e-6*max(1.0, float(np.max(maxs - mins)))
+    corner_lines = []
+    for p in (bounds[0,b], bounds[1,b]):
+        for q in (bounds[0,c], bounds[1,c]):
+            corner = np.zeros(3)
+            corner[b] = p
+            corner[c] = q
+            near = triangles[bvh.get_line_triangles(axis, corner, margin)]
+            corner_lines.append((corner, vol.get_line_crossings(vol.get_triangle_verts(vertices, near), axis, corner)))
+    region_vertices = region_vertices[np.argsort(region_vertices[:,axis], kind="stable")]
+    return (region_vertices, starts, ends, profile, corner_lines)
+
+"""
+Get volumes and clipped dimensions of the boxes the region's step gives with lows and highs along axis
+Return (volumes, (n,3) dims), dims are zeros for boxes missing the mesh
+"""
+def evaluate_bounds(region, axis, lows, highs):
+    region_vertices, starts, ends, profile, corner_lines = region
+    volumes = profile.get_volumes_below(highs) - profile.get_volumes_below(lows)
+    mins = np.full((len(lows),3), np.inf)
+    maxs = np.full((len(lows),3), -np.inf)
+
+    # Region vertices between the bounds, the ones between every pair of bounds are shared
+    coords = region_vertices[:,axis]
+    first = np.searchsorted(coords, lows.max(), side="right")
+    last = np.searchsorted(coords, highs.min(), side="left")
+    if first < last:
+        mins = np.minimum(mins, region_vertices[first:last].min(axis=0))
+        maxs = np.maximum(maxs, region_vertices[first:last].max(axis=0))
+    for band in (slice(np.searchsorted(coords, lows.min(), side="left"), max(first, 0)),\
+                 slice(max(last, first), np.searchsorted(coords, highs.max(), side="right"))):
+        band_vertices = region_vertices[band]
+        is_within = (band_vertices[None,:,axis] >= lows[:,None]) & (band_vertices[None,:,axis] <= highs[:,None])
+        mins = np.minimum(mins, np.where(is_within[:,:,None], band_vertices[None], np.inf).min(axis=1, initial=np.inf))
+        maxs = np.maximum(maxs, np.where(is_within[:,:,None], band_vertices[None], -np.inf).max(axis=1, initial=-np.inf))
+    # Region edges crossing the bounds, only the ones spanning some bound are looked at
+    for planes in (lows, highs):
+        edge_lows = np.minimum(starts[:,axis], ends[:,axis])
+        edge_highs = np.maximum(starts[:,axis], ends[:,axis])
+        is_spanning = (edge_lows <= planes.max()) & (edge_highs >= planes.min()) & (edge_lows < edge_highs)
+        span_starts = starts[is_spanning]
+        span_ends = ends[is_spanning]
+        ratios = (planes[:,None] - span_starts[None,:,axis])/(span_ends[:,axis] - span_starts[:,axis])
+        is_crossing = (ratios >= 0) & (ratios <= 1)
+        points = span_starts[None] + ratios[:,:,None]*(span_ends - span_starts)[None]
+        mins = np.minimum(mins, np.where(is_crossing[:,:,None], points, np.inf).min(axis=1, initial=np.inf))
+        maxs = np.maximum(maxs, np.where(is_crossing[:,:,None], points, -np.inf).max(axis=1, initial=-np.inf))
+    # Box corners inside the mesh
+    for corner, crossings in corner_lines:
+        for planes in (lows, highs):
+            is_inside = (len(crossings) - np.searchsorted(crossings, planes, side="right")) % 2 == 1
+            points = np.repeat(corner[None], len(planes), axis=0)
+            points[:,axis] = planes
+            mins = np.where(is_inside[:,None], np.minimum(mins, points), mins)
+            maxs = np.where(is_inside[:,None], np.maximum(maxs, points), maxs)
+
+    dims = maxs - mins
+    dims[~np.all(np.isfinite(dims), axis=1)] = 0.0
+    return (volumes, dims)
+
+"""
+Get the bounds of a start box of widths within limits, placed at position along y
+position 0 puts it at the low y limit like the tier cuts, 1 at the high one
+Like the tier cuts it starts at the low z limit and is centered along x, a symmetric pair's neg box
+starts at the low x limit instead
+"""
+def get_start_bounds(limits, widths, position, is_sym):
+    widths = np.minimum(np.asarray(widths, dtype=np.float64), limits[1] - limits[0])
+    bounds = np.array([limits[0], limits[0] + widths])
+    bounds[:,1] += position*(limits[1,1] - limits[0,1] - widths[1])
+    if not is_sym:
+        center = (limits[0,0] + limits[1,0])/2
+        bounds[:,0] = [center - widths[0]/2, center + widths[0]/2]
+    return bounds
+
+"""
+Get the bounds of a start box shaped like widths at position, scaled to hold about volume, see get_start_bounds
+profile is the volume profile along y of the mesh within limits. A box is taken to hold the volume between
+its y bounds times its share of the limits' area across y, num_scales scales up to the largest fitting
+within limits are tried at once
+"""
+def get_filled_start_bounds(limits, profile, volume, widths, position, is_sym, num_scales):
+    widths = np.asarray(widths, dtype=np.float64)
+    spans = limits[1] - limits[0]
+    scales = np.linspace(0, np.min(spans/widths), num_scales + 1)[1:]
+    lows = limits[0,1] + position*(spans[1] - scales*widths[1])
+    volumes = profile.get_volumes_below(lows + scales*widths[1]) - profile.get_volumes_below(lows)
+    volumes = volumes*np.minimum(scales*widths[0]/spans[0], 1.0)*np.minimum(scales*widths[2]/spans[2], 1.0)
+    scale = scales[int(np.argmin(np.fabs(volumes - volume)))]
+    return get_start_bounds(limits, scale*widths, position, is_sym)
+
+"""
+Get the bounds a pattern move from base through bounds leads to, within limits
+Bounds along an axis that would cross each other stay where they are
+"""
+def get_pattern_bounds(base, bounds, limits):
+    moved = np.clip(2*bounds - base, limits[0], limits[1])
+    is_crossed = moved[0] >= moved[1]
+    moved[:,is_crossed] = bounds[:,is_crossed]
+    return moved
+
+"""
+Search boxes holding volume_ratio of a closed mesh, once from each of seed_bounds, boxes of (2,3) bounds
+clipped to the mesh's extents, then once from each of the start widths at each of the start positions
+along y, scaled to hold volume_ratio off the volume profile along y of the mesh within its limits,
+see get_filled_start_bounds
+Steps cycle over the axes, every cycle that improved the score is followed by a pattern move
+like in Hooke and Jeeves' search, until a cycle improves it by tolerance at most or max_cycles ran.
+With is_sym the box is the neg one of a symmetric pair: its high x bound stays below the mesh's x center
+and the pos box mirrors it.
+get_scores maps (volume ratios, (n,3) clipped dimensions) to an array of scores.
+The search stops early once a start finds a box scoring within tolerance, or once time_budget seconds are
+spent keeping the best box found so far
+Return list of (bounds, volume ratio, dims, score), one per start that ran, and the number of geometry evaluations
+"""
+def search_boxes(vertices, triangles, volume, volume_ratio, get_scores, is_sym, seed_bounds, start_widths, start_positions, tolerance, max_cycles, num_scans, time_budget):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1,3)
+    bvh = TriangleBVH(vertices, triangles)
+    mins, maxs = bb.get_extents(vertices, triangles)
+    limits = np.array([mins, maxs])
+    if is_sym:
+        limits[1,0] = (mins[0] + maxs[0])/2
+    deadline = time.time() + time_budget
+    results = []
+    num_evaluations = 0
+    starts = [np.clip(np.asarray(bounds, dtype=np.float64), limits[0], limits[1]) for bounds in seed_bounds]
+    starts = [bounds for bounds in starts if np.all(bounds[1] > bounds[0])]
+    # The region of the limits along y, a symmetric pair's neg box only holds the volume of its half
+    profile = get_axis_region(vertices, triangles, bvh, limits, 1)[3]
+    num_evaluations += 1
+    for widths, position in itertools.product(start_widths, start_positions):
+        starts.append(get_filled_start_bounds(limits, profile, volume_ratio*volume, widths, position, is_sym, num_scans*num_scans))
+    for bounds in starts:
+        if time.time() > deadline:
+            break
+        best = None
+        base = bounds
+        is_pattern = False
+        for cycle in range(0,max_cycles):
+            previous_score = None if best == None else best[3]
+            for axis in range(0,3):
+                if time.time() > deadline:
+                    break
+                region = get_axis_region(vertices, triangles, bvh, bounds, axis)
+                num_evaluations += 1
+                step = search_axis(region, bounds, axis, limits, volume, get_scores, tolerance, num_scans)
+                bounds = step[0]
+                if best == None or step[3] <= best[3]:
+                    best = step
+            if best == None:
+                break
+            if previous_score != None and previous_score - best[3] <= tolerance:
+                # A cycle from a pattern move that did not pay off is run again from the best bounds
+                if not is_pattern:
+                    break
+                bounds = best[0]
+                is_pattern = False
+                continue
+            # Pattern move, the next cycle starts from the best bounds pushed on the way the last cycle went
+            bounds = get_pattern_bounds(base, best[0], limits)
+            base = best[0]
+            is_pattern = True
+        if best != None:
+            results.append(best)
+            # Nothing beats a box that fits
+            if best[3] <= tolerance:
+                break
+    return (results, num_evaluations)
+
+"""
+Search the two bounds along axis with the others held, see search_boxes
+Pairs of bounds on a num_scans by num_scans grid within limits are evaluated at once, and the grid is
+zoomed in around the best pair until its cells are within tolerance
+Return the best (bounds, volume ratio, dims, score), never worse than bounds
+"""
+def search_axis(region, bounds, axis, limits, volume, get_scores, tolerance, num_scans):
+    lo_range = [limits[0,axis], limits[1,axis]]
+    hi_range = [limits[0,axis], limits[1,axis]]
+    best_lo = bounds[0,axis]
+    best_hi = bounds[1,axis]
+    best_score = None
+    best_volume = None
+    best_dims = None
+    while True:
+        lows, highs = np.meshgrid(np.linspace(lo_range[0], lo_range[1], num_scans), np.linspace(hi_range[0], hi_range[1], num_scans))
+        lows = np.append(lows.ravel(), best_lo)
+        highs = np.append(highs.ravel(), best_hi)
+        is_valid = highs > lows
+        lows = lows[is_valid]
+        highs = highs[is_valid]
+        volumes, dims = evaluate_bounds(region, axis, lows, highs)
+        scores = np.asarray(get_scores(volumes/volume, dims), dtype=np.float64)
+        scores = np.where(np.isnan(scores), np.inf, scores)
+        i = int(np.argmin(scores))
+        if best_score == None or scores[i] < best_score:
+            best_lo = lows[i]
+            best_hi = highs[i]
+            best_score = float(scores[i])
+            best_volume = float(volumes[i]/volume)
+            best_dims = tuple(dims[i])
+
+        lo_cell = (lo_range[1] - lo_range[0])/(num_scans - 1)
+        hi_cell = (hi_range[1] - hi_range[0])/(num_scans - 1)
+        if max(lo_cell, hi_cell) <= tolerance:
+            break
+        lo_range = [max(best_lo - lo_cell, limits[0,axis]), min(best_lo + lo_cell, limits[1,axis])]
+        hi_range = [max(best_hi - hi_cell, limits[0,axis]), min(best_hi + hi_cell, limits[1,axis])]
+
+    new_bounds = bounds.copy()
+    new_bounds[0,axis] = best_lo
+    new_bounds[1,axis] = best_hi
+    return (new_bounds, best_volume, best_dims, best_score)
@@ -0,0 +1,673 @@
+import numpy as np
+
+import volume_helper as vol
+
+"""
+Plane and box clipping of indexed triangle meshes
+vertices is a (N,3) float array, triangles is a (M,3) int array of vertex indices
+Split points are shared through the vertex array, so pieces cut from one mesh stay watertight
+"""
+
+"""
+Split triangles by the plane p[axis] = t
+Vertices on the plane count as below it
+Return (vertices, below, above, below_parents, above_parents, segments, segment_parents)
+vertices is the input with the split points appended,
+parents index the input triangle every output triangle and segment comes from,
+segments (K,2) are the cut edges oriented to close the below side,
+the above side is closed by the reversed segments
+"""
+def split_triangles(vertices, triangles, axis, t):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1,3)
+    dist = vertices[:,axis] - t
+    is_below = dist <= 0
+
+    tri_below = is_below[triangles]
+    num_below = tri_below.sum(axis=1)
+    all_below = np.nonzero(num_below == 3)[0]
+    all_above = np.nonzero(num_below == 0)[0]
+    one_below = np.nonzero(num_below == 1)[0]
+    two_below = np.nonzero(num_below == 2)[0]
+
+    # Rotate triangles so the odd corner comes first, rotation keeps the winding
+    odd_one = np.argmax(tri_below[one_below], axis=1)
+    odd_two = np.argmin(tri_below[two_below], axis=1)
+    rolled_one = np.take_along_axis(triangles[one_below], (odd_one[:,None] + np.arange(3)) % 3, axis=1)
+    rolled_two = np.take_along_axis(triangles[two_below], (odd_two[:,None] + np.arange(3)) % 3, axis=1)
+
+    # Every crossing edge gets one split point, keyed by its sorted end points
+    crossing = np.concatenate((rolled_one[:,[0,1]], rolled_one[:,[0,2]], rolled_two[:,[0,1]], rolled_two[:,[0,2]]))
+    if len(crossing) == 0:
+        return (vertices, triangles[all_below], triangles[all_above], all_below, all_above, np.zeros((0,2), dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    edges = np.sort(crossing, axis=1)
+    unique_edges, inverse = np.unique(edges, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    start = unique_edges[:,0]
+    end = unique_edges[:,1]
+    ratio = dist[start]/(dist[start] - dist[end])
+    split_points = vertices[start] + ratio[:,None]*(vertices[end] - vertices[start])
+    split_ids = len(vertices) + inverse
+    vertices = np.concatenate((vertices, split_points))
+
+    n_one = len(rolled_one)
+    n_two = len(rolled_two)
+    one_ab = split_ids[0:n_one]
+    one_ac = split_ids[n_one:2*n_one]
+    two_ab = split_ids[2*n_one:2*n_one+n_two]
+    two_ac = split_ids[2*n_one+n_two:]
+
+    # One corner (a) on its side: triangle a,ab,ac on that side and quad ab,b,c,ac on the other
+    tri_one = np.stack((rolled_one[:,0], one_ab, one_ac), axis=1)
+    quad_one = np.concatenate((np.stack((one_ab, rolled_one[:,1], rolled_one[:,2]), axis=1),\
+                               np.stack((one_ab, rolled_one[:,2], one_ac), axis=1)))
+    tri_two = np.stack((rolled_two[:,0], two_ab, two_ac), axis=1)
+    quad_two = np.concatenate((np.stack((two_ab, rolled_two[:,1], rolled_two[:,2]), axis=1),\
+                               np.stack((two_ab, rolled_two[:,2], two_ac), axis=1)))
+
+    below = np.concatenate((triangles[all_below], tri_one, quad_two))
+    above = np.concatenate((triangles[all_above], tri_two, quad_one))
+    below_parents = np.concatenate((all_below, one_below, two_below, two_below))
+    above_parents = np.concatenate((all_above, two_below, one_below, one_below))
+
+    # The new edge of the below piece runs ab->ac for one below and ac->ab for two below,
+    # the cap has to run the other way
+    segments = np.concatenate((np.stack((one_ac, one_ab), axis=1), np.stack((two_ab, two_ac), axis=1)))
+    segment_parents = np.concatenate((one_below, two_below))
+    return (vertices, below, above, below_parents, above_parents, segments, segment_parents)
+
+"""
+Chain oriented segments into closed loops
+Return list of loops, each a list of vertex indices
+"""
+def get_loops(segments):
+    next_ids = {}
+    for segment in segments:
+        start = int(segment[0])
+        end = int(segment[1])
+        if start == end:
+            continue
+        if start not in next_ids:
+            next_ids[start] = []
+        next_ids[start].append(end)
+
+    loops = []
+    while len(next_ids) > 0:
+        first = next(iter(next_ids))
+        loop = [first]
+        current = first
+        while True:
+            ends = next_ids.get(current)
+            if ends is None:
+                break
+            end = ends.pop()
+            if len(ends) == 0:
+                del next_ids[current]
+            if end == first:
+                break
+            loop.append(end)
+            current = end
+        if len(loop) >= 3:
+            loops.append(loop)
+    return loops
+
+"""
+Get area centroid of a 2D loop
+"""
+def get_loop_centroid(points):
+    next_points = np.roll(points, -1, axis=0)
+    crosses = points[:,0]*next_points[:,1] - next_points[:,0]*points[:,1]
+    return np.sum((points + next_points)*crosses[:,None], axis=0)/(3*np.sum(crosses))
+
+"""
+Get signed area of a 2D loop, positive for counterclockwise ones
+"""
+def get_loop_area(points):
+    return np.sum(points[:,0]*np.roll(points[:,1], -1) - np.roll(points[:,0], -1)*points[:,1])/2
+
+"""
+Check whether a 2D point lies inside a 2D loop, by the crossings of a ray from it along the first dimension
+"""
+def is_inside_loop(point, points):
+    next_points = np.roll(points, -1, axis=0)
+    is_straddling = (points[:,1] > point[1]) != (next_points[:,1] > point[1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crossings = points[:,0] + (point[1] - points[:,1])*(next_points[:,0] - points[:,0])/(next_points[:,1] - points[:,1])
+    return np.count_nonzero(is_straddling & (crossings > point[0])) % 2 == 1
+
+"""
+Check whether the 2D segment from start to end properly crosses any of the edges from edge_starts to edge_ends
+Edges only touching it at an end point do not count
+"""
+def is_crossing_edges(start, end, edge_starts, edge_ends):
+    direction = end - start
+    edge_directions = edge_ends - edge_starts
+    side_start = direction[0]*(edge_starts[:,1] - start[1]) - direction[1]*(edge_starts[:,0] - start[0])
+    side_end = direction[0]*(edge_ends[:,1] - start[1]) - direction[1]*(edge_ends[:,0] - start[0])
+    side_from = edge_directions[:,0]*(start[1] - edge_starts[:,1]) - edge_directions[:,1]*(start[0] - edge_starts[:,0])
+    side_to = edge_directions[:,0]*(end[1] - edge_starts[:,1]) - edge_directions[:,1]*(end[0] - edge_starts[:,0])
+    return bool(np.any((side_start*side_end < 0) & (side_from*side_to < 0)))
+
+"""
+Check whether point lies inside the corner p_0, p_1, p_2 of a loop whose area has sign
+"""
+def is_inside_corner(p_0, p_1, p_2, point, sign):
+    is_after_first = get_turn(p_0, p_1, point)*sign > 0
+    is_before_second = get_turn(p_1, p_2, point + p_2 - p_1)*sign > 0
+    if get_turn(p_0, p_1, p_2)*sign > 0:
+        return is_after_first and is_before_second
+    return is_after_first or is_before_second
+
+"""
+Join a hole into the polygon around it with a bridge from the hole's corner furthest along the first dimension
+to the closest polygon corner the bridge reaches without crossing an edge of the polygon or of other_holes
+points are the 2D points of all vertices, polygon, hole and other_holes lists of vertex indices
+Return the polygon, walking the hole between the two ends of the bridge, whose corners repeat
+"""
+def bridge_hole(points, polygon, hole, other_holes):
+    hole_points = points[hole]
+    first = int(np.argmax(hole_points[:,0]))
+    start = hole_points[first]
+    polygon_points = points[polygon]
+    edge_loops = [polygon, hole] + other_holes
+    edge_starts = np.concatenate([points[loop] for loop in edge_loops])
+    edge_ends = np.concatenate([np.roll(points[loop], -1, axis=0) for loop in edge_loops])
+    sign = 1 if get_loop_area(polygon_points) > 0 else -1
+    order = np.argsort(np.sum((polygon_points - start)**2, axis=1), kind="stable")
+    corner = int(order[0])
+    for k in order:
+        # Bridged corners repeat, the bridge has to leave the copy whose inside it runs into
+        if is_inside_corner(polygon_points[k-1], polygon_points[k], polygon_points[(k+1) % len(polygon)], start, sign)\
+           and not is_crossing_edges(start, polygon_points[k], edge_starts, edge_ends):
+            corner = int(k)
+            break
+    return polygon[:corner+1] + hole[first:] + hole[:first+1] + polygon[corner:]
+
+"""
+Group the loops of a cap into polygons with holes, a loop inside an odd number of others is a hole
+of the innermost one of them, and bridge the holes into it, see bridge_hole
+points are the 2D points of all vertices
+Return list of polygons, each a list of vertex indices
+"""
+def get_cap_polygons(points, loops):
+    loop_points = [points[loop] for loop in loops]
+    mins = [p.min(axis=0) for p in loop_points]
+    maxs = [p.max(axis=0) for p in loop_points]
+    areas = [get_loop_area(p) for p in loop_points]
+    holes = [[] for loop in loops]
+    is_hole = [False]*len(loops)
+    for i in range(0,len(loops)):
+        around = [j for j in range(0,len(loops)) if j != i and abs(areas[j]) > abs(areas[i])\
+                  and np.all(mins[j] <= mins[i]) and np.all(maxs[j] >= maxs[i]) and is_inside_loop(loop_points[i][0], loop_points[j])]
+        if len(around) % 2 == 0:
+            continue
+        parent = min(around, key=lambda j: abs(areas[j]))
+        # Holes run against the loop around them, anything else is capped on its own
+        if areas[i]*areas[parent] < 0:
+            holes[parent].append(i)
+            is_hole[i] = True
+
+    polygons = []
+    for i in range(0,len(loops)):
+        if is_hole[i]:
+            continue
+        polygon = list(loops[i])
+        remaining = sorted(holes[i], key=lambda j: -maxs[j][0])
+        while len(remaining) > 0:
+            hole = remaining.pop(0)
+            polygon = bridge_hole(points, polygon, list(loops[hole]), [list(loops[j]) for j in remaining])
+        polygons.append(polygon)
+    return polygons
+
+"""
+Get the turn at p_1 of the 2D corner p_0, p_1, p_2, positive for counterclockwise ones
+"""
+def get_turn(p_0, p_1, p_2):
+    return (p_1[0]-p_0[0])*(p_2[1]-p_1[1]) - (p_1[1]-p_0[1])*(p_2[0]-p_1[0])
+
+"""
+Triangulate a planar loop given by its 2D points by ear clipping
+Star shaped loops, the usual case, are fanned from their centroid in one go
+Return list of index triples into the loop, following the loop's orientation,
+index -1 stands for the centroid
+"""
+def triangulate_loop(points):
+    count = len(points)
+    edges = np.roll(points, -1, axis=0) - points
+    area = get_loop_area(points)
+    if area == 0:
+        return []
+    sign = 1 if area > 0 else -1
+
+    centroid = get_loop_centroid(points)
+    to_points = points - centroid
+    fan_areas = to_points[:,0]*edges[:,1] - to_points[:,1]*edges[:,0]
+    if np.all(fan_areas*sign > 0):
+        return [(-1, i, (i+1) % count) for i in range(0,count)]
+
+    triangles = []
+    indices = list(range(0,count))
+    coords = points.tolist()
+    # Only corners turning against the loop, reflex ones, can lie in an ear
+    prev_edges = np.roll(edges, 1, axis=0)
+    is_reflex = (prev_edges[:,0]*edges[:,1] - prev_edges[:,1]*edges[:,0])*sign <= 0
+    is_left = np.ones(count, dtype=bool)
+    # Corners are tried on from the last ear, clipping it only changes the corners next to it
+    first = 0
+    while len(indices) > 3:
+        is_clipped = False
+        reflex_points = points[is_reflex & is_left]
+        for j in range(0,len(indices)):
+            k = (first + j) % len(indices)
+            i_0 = indices[k-1]
+            i_1 = indices[k]
+            i_2 = indices[(k+1) % len(indices)]
+            p_0 = coords[i_0]
+            p_1 = coords[i_1]
+            p_2 = coords[i_2]
+            if get_turn(p_0, p_1, p_2)*sign <= 0:
+                continue
+            # No reflex corner may lie in the ear, copies of its corners left by bridged holes aside
+            inside = np.ones(len(reflex_points), dtype=bool)
+            for a in (p_0, p_1, p_2):
+                inside &= (reflex_points[:,0] != a[0]) | (reflex_points[:,1] != a[1])
+            for a, b in ((p_0,p_1),(p_1,p_2),(p_2,p_0)):
+                inside &= ((b[0]-a[0])*(reflex_points[:,1]-a[1]) - (b[1]-a[1])*(reflex_points[:,0]-a[0]))*sign >= 0
+            if np.any(inside):
+                continue
+            triangles.append((i_0, i_1, i_2))
+            indices.pop(k)
+            is_left[i_1] = False
+            first = (k - 1) % len(indices)
+            for m in (first, (first + 1) % len(indices)):
+                is_reflex[indices[m]] = get_turn(coords[indices[m-1]], coords[indices[m]], coords[indices[(m+1) % len(indices)]])*sign <= 0
+            is_clipped = True
+            break
+        # Degenerate loop, fan whatever is left
+        if not is_clipped:
+            break
+    for k in range(1,len(indices)-1):
+        triangles.append((indices[0], indices[k], indices[k+1]))
+    return triangles
+
+"""
+Build cap triangles closing the cut loops on a plane perpendicular to axis
+Holes are bridged into the loop around them, so every cap is one polygon and leaves the holes open
+Return (vertices, triangles), vertices with loop centroids appended where needed
+"""
+def get_cap_triangles(vertices, segments, axis):
+    dims = [i for i in range(0,3) if i != axis]
+    new_points = []
+    triangles = []
+    for loop in get_cap_polygons(vertices[:,dims], get_loops(segments)):
+        loop_points = vertices[loop]
+        loop_triangles = triangulate_loop(loop_points[:,dims])
+        centroid_id = -1
+        for triangle in loop_triangles:
+            ids = []
+            for i in triangle:
+                if i == -1:
+                    if centroid_id == -1:
+                        centroid_id = len(vertices) + len(new_points)
+                        centroid = loop_points[0].copy()
+                        centroid[dims] = get_loop_centroid(loop_points[:,dims])
+                        new_points.append(centroid)
+                    ids.append(centroid_id)
+                else:
+                    ids.append(loop[i])
+            triangles.append(ids)
+    if len(new_points) > 0:
+        vertices = np.concatenate((vertices, np.array(new_points)))
+    return (vertices, np.array(triangles, dtype=np.int64).reshape(-1,3))
+
+"""
+Clip a mesh by the plane p[axis] = t, keeping the part below or above it
+With cap, the cut is closed with cap triangles, otherwise the result is an open surface
+whose volume integrals along the other axes are still exact, see volume_helper
+Return (vertices, triangles)
+"""
+def clip_mesh(vertices, triangles, axis, t, keep_below, cap=True):
+    vertices, below, above, below_parents, above_parents, segments, segment_parents = split_triangles(vertices, triangles, axis, t)
+    kept = below
+    if not keep_below:
+        kept = above
+        segments = segments[:,::-1]
+    if cap and len(segments) > 0:
+        vertices, cap_triangles = get_cap_triangles(vertices, segments, axis)
+        kept = np.concatenate((kept, cap_triangles))
+    return (vertices, kept)
+
+"""
+Get the slab of every triangle's lowest and highest corner among the ascending planes
+Vertices on a plane count as below it, like in split_triangles
+Return (first slabs, last slabs), slab i lies below planes[i] and above planes[i-1]
+"""
+def get_triangle_slabs(vertices, triangles, axis, planes):
+    coords = vertices[:,axis][triangles]
+    return (np.searchsorted(planes, coords.min(axis=1), side="left"), np.searchsorted(planes, coords.max(axis=1), side="left"))
+
+"""
+Slice a mesh into slabs by the ascending planes p[axis] = t in planes, in one sweep
+Triangles within one slab are assigned without splitting, only the crossing ones are split,
+each plane only splitting the pieces that reach it
+There are len(planes)+1 slabs, all indexing the one returned vertex array
+Return (vertices, list of triangle arrays, one per slab)
+"""
+def slice_mesh(vertices, triangles, axis, planes, cap=True):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1,3)
+    planes = np.asarray(planes, dtype=np.float64)
+    first_slab, last_slab = get_triangle_slabs(vertices, triangles, axis, planes)
+    is_within = first_slab == last_slab
+    slabs = [[triangles[is_within & (first_slab == i)]] for i in range(0,len(planes)+1)]
+
+    rest = triangles[~is_within]
+    for i, t in enumerate(planes):
+        if len(rest) == 0:
+            break
+        # Pieces above this plane are left for the next ones
+        is_reaching = vertices[:,axis][rest].min(axis=1) <= t
+        vertices, below, above, below_parents, above_parents, segments, segment_parents = split_triangles(vertices, rest[is_reaching], axis, t)
+        slabs[i].append(below)
+        rest = np.concatenate((rest[~is_reaching], above))
+        if cap and len(segments) > 0:
+            vertices, cap_triangles = get_cap_triangles(vertices, segments, axis)
+            slabs[i].append(cap_triangles)
+            slabs[i+1].append(cap_triangles[:,::-1])
+    slabs[-1].append(rest)
+    return (vertices, [np.concatenate(slab) for slab in slabs])
+
+"""
+Clip a mesh below each of the ascending planes p[axis] = t in planes, in one sweep
+Triangles are classified against all planes at once, a plane only splits the triangles crossing it,
+so unlike a union of slabs the parts keep the triangles below their plane whole
+All parts index the one returned vertex array
+Return (vertices, list of triangle arrays, one per plane)
+"""
+def clip_below_planes(vertices, triangles, axis, planes, cap=True):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1,3)
+    planes = np.asarray(planes, dtype=np.float64)
+    first_slab, last_slab = get_triangle_slabs(vertices, triangles, axis, planes)
+    parts = []
+    for i, t in enumerate(planes):
+        is_crossing = (first_slab <= i) & (last_slab > i)
+        vertices, below, above, below_parents, above_parents, segments, segment_parents = split_triangles(vertices, triangles[is_crossing], axis, t)
+        part = [triangles[last_slab <= i], below]
+        if cap and len(segments) > 0:
+            vertices, cap_triangles = get_cap_triangles(vertices, segments, axis)
+            part.append(cap_triangles)
+        parts.append(np.concatenate(part))
+    return (vertices, parts)
+
+"""
+Get the clipping planes of a cut box as (axis, t, keep_below)
+Planes the mesh lies entirely on the kept side of are left out
+"""
+def get_box_planes(vertices, cut_box):
+    planes = []
+    if len(vertices) == 0:
+        return planes
+    mins = vertices.min(axis=0)
+    maxs = vertices.max(axis=0)
+    for axis, dim_string in enumerate(("x","y","z")):
+        t_min = cut_box[str.format("{}_min", dim_string)]
+        t_max = cut_box[str.format("{}_max", dim_string)]
+        if t_min > mins[axis]:
+            planes.append((axis, t_min, False))
+        if t_max < maxs[axis]:
+            planes.append((axis, t_max, True))
+    return planes
+
+"""
+Intersect a mesh with a cut box
+Without cap the mesh's TriangleBVH may be given, triangles missing the box are then never looked at
+and the ones inside it are kept whole, only the ones crossing its faces are clipped.
+Caps need the whole cross section of the mesh on a plane, so with cap every triangle is clipped
+Return (vertices, triangles)
+"""
+def intersect_box(vertices, triangles, cut_box, cap=True, bvh=None):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1,3)
+    if bvh != None and not cap:
+        return intersect_box_nearby(vertices, triangles, cut_box, bvh)
+    for axis, t, keep_below in get_box_planes(vertices, cut_box):
+        vertices, triangles = clip_mesh(vertices, triangles, axis, t, keep_below, cap)
+    return compact_mesh(vertices, triangles)
+
+"""
+Intersect a mesh with a cut box without cap, clipping only the triangles near its faces, see intersect_box
+Vertices on a low face count as outside of it like in split_triangles, so triangles touching one are clipped
+Return (vertices, triangles)
+"""
+def intersect_box_nearby(vertices, triangles, cut_box, bvh):
+    lows = np.array([cut_box["x_min"], cut_box["y_min"], cut_box["z_min"]], dtype=np.float64)
+    highs = np.array([cut_box["x_max"], cut_box["y_max"], cut_box["z_max"]], dtype=np.float64)
+    inside_ranges, inside_bounds, nearby = bvh.query_box(lows, highs, True)
+    inside = triangles[bvh.get_triangles(inside_ranges)]
+    nearby = triangles[nearby]
+    # Only the vertices of the two are carried through the clipping
+    used = np.zeros(len(vertices), dtype=bool)
+    used[inside.ravel()] = True
+    used[nearby.ravel()] = True
+    new_ids = np.cumsum(used) - 1
+    vertices = vertices[used]
+    inside = new_ids[inside]
+    nearby = new_ids[nearby]
+    # Planes are left out by the extents of the whole mesh, the corners of its bounds have the same
+    for axis, t, keep_below in get_box_planes(np.array(bvh.get_extents()), cut_box):
+        vertices, nearby = clip_mesh(vertices, nearby, axis, t, keep_below, False)
+    return compact_mesh(vertices, np.concatenate((inside, nearby)))
+
+"""
+Subtract a cut box from a closed mesh
+The mesh is clipped to the box plane by plane like in intersect_box and the hole is closed with the final caps
+reversed. Only the triangles whose bounds reach the box keep their parts outside the planes, the others lie
+outside the box whole and are kept as they are, so surface away from the box is never split. Where one of
+them shares an edge with a split triangle it is split at the same points, see fill_split_edges
+Return (vertices, triangles), the mesh as it is if the box misses its extents
+"""
+def subtract_box(vertices, triangles, cut_box):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1,3)
+    planes = get_box_planes(vertices, cut_box)
+    # Box holds the whole mesh
+    if len(planes) == 0:
+        return (np.zeros((0,3)), np.zeros((0,3), dtype=np.int64))
+    lows = np.array([cut_box["x_min"], cut_box["y_min"], cut_box["z_min"]], dtype=np.float64)
+    highs = np.array([cut_box["x_max"], cut_box["y_max"], cut_box["z_max"]], dtype=np.float64)
+    if len(triangles) == 0 or np.any(highs <= vertices.min(axis=0)) or np.any(lows >= vertices.max(axis=0)):
+        return (vertices, triangles)
+    corners = [vertices[triangles[:,i]] for i in range(0,3)]
+    tri_mins = np.minimum(np.minimum(corners[0], corners[1]), corners[2])
+    tri_maxs = np.maximum(np.maximum(corners[0], corners[1]), corners[2])
+    is_near = np.all((tri_maxs >= lows) & (tri_mins <= highs), axis=1)
+
+    # Triangles inside the planes so far, with the triangle of the mesh they are part of, -1 for caps
+    current = triangles
+    origins = np.arange(len(triangles))
+    kept = [triangles[~is_near]]
+    split_edges = [np.zeros((0,2), dtype=np.int64)]
+    split_ids = [np.zeros(0, dtype=np.int64)]
+    for axis, t, keep_below in planes:
+        edges = get_split_edges(vertices, current, axis, t)
+        split_edges.append(edges)
+        split_ids.append(len(vertices) + np.arange(len(edges)))
+        vertices, below, above, below_parents, above_parents, segments, segment_parents = split_triangles(vertices, current, axis, t)
+        inside, outside = below, above
+        inside_parents, outside_parents = below_parents, above_parents
+        if not keep_below:
+            inside, outside = above, below
+            inside_parents, outside_parents = above_parents, below_parents
+            segments = segments[:,::-1]
+
+        # Parts of the triangles near the box outside this plane are kept, caps outside it are inside the result
+        outside_origins = origins[outside_parents]
+        is_kept = outside_origins >= 0
+        is_kept[is_kept] = is_near[outside_origins[is_kept]]
+        kept.append(outside[is_kept])
+
+        vertices, cap_triangles = get_cap_triangles(vertices, segments, axis)
+        current = np.concatenate((inside, cap_triangles))
+        origins = np.concatenate((origins[inside_parents], np.full(len(cap_triangles), -1)))
+
+    kept.append(current[origins < 0][:,::-1])
+    result = fill_split_edges(np.concatenate(kept), np.concatenate(split_edges), np.concatenate(split_ids), len(vertices))
+    return compact_mesh(vertices, result)
+
+"""
+Get the edges split_triangles splits by the plane p[axis] = t, in the order it appends their split points
+Return (K,2) array of sorted vertex index pairs
+"""
+def get_split_edges(vertices, triangles, axis, t):
+    is_below = vertices[:,axis] - t <= 0
+    edges = np.concatenate((triangles[:,[0,1]], triangles[:,[1,2]], triangles[:,[2,0]]))
+    edges = edges[is_below[edges[:,0]] != is_below[edges[:,1]]]
+    return np.unique(np.sort(edges, axis=1), axis=0).reshape(-1,2)
+
+"""
+Split triangles of a mesh at the split points of edges split_ids, (K,2) sorted vertex index pairs, were split at
+An edge is split when no triangle runs it the other way, i.e. the other side of it was split, until there are none
+Return triangles
+"""
+def fill_split_edges(triangles, split_edges, split_ids, num_vertices):
+    keys = split_edges[:,0]*num_vertices + split_edges[:,1]
+    order = np.argsort(keys)
+    keys = keys[order]
+    split_ids = split_ids[order]
+    while len(keys) > 0 and len(triangles) > 0:
+        ends = np.roll(triangles, -1, axis=1)
+        is_open = ~np.isin(ends*num_vertices + triangles, triangles*num_vertices + ends)
+        edge_keys = np.minimum(triangles, ends)*num_vertices + np.maximum(triangles, ends)
+        positions = np.minimum(np.searchsorted(keys, edge_keys), len(keys) - 1)
+        is_split = is_open & (keys[positions] == edge_keys)
+        rows = np.any(is_split, axis=1)
+        if not np.any(rows):
+            break
+        # One edge per triangle and pass, rotated to come first
+        first = np.argmax(is_split[rows], axis=1)
+        rolled = np.take_along_axis(triangles[rows], (first[:,None] + np.arange(3)) % 3, axis=1)
+        split_points = split_ids[positions[rows][np.arange(len(first)), first]]
+        halves = np.concatenate((np.stack((rolled[:,0], split_points, rolled[:,2]), axis=1),\
+                                 np.stack((split_points, rolled[:,1], rolled[:,2]), axis=1)))
+        triangles = np.concatenate((triangles[~rows], halves))
+    return triangles
+
+"""
+Get the extents of the intersection of a closed mesh with a cut box without clipping the mesh
+The extremes of the intersection lie on the surface within the box, i.e. on triangle corners inside it,
+on triangle edges crossing a box face or on box edges piercing a triangle, or else on box corners
+inside the mesh
+Without closed, like for regions left open by clipping, box corners are not checked
+With the mesh's TriangleBVH, triangles inside the box count off the bounds of its nodes and only the
+triangles near the box faces are looked at, corners are checked by lines through them
+Return (min, max) corner arrays, zeros if the intersection is empty like bounding boxes of empty meshes
+"""
+def get_clipped_extents(vertices, triangles, cut_box, closed=True, bvh=None):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1,3)
+    lows = np.array([cut_box["x_min"], cut_box["y_min"], cut_box["z_min"]], dtype=np.float64)
+    highs = np.array([cut_box["x_max"], cut_box["y_max"], cut_box["z_max"]], dtype=np.float64)
+    tolerance = 1e-9*max(1.0, float(np.max(np.fabs(highs - lows))))
+    
+    if bvh != None:
+        # Nodes inside the box hold triangles with all corners inside, the others overlapping it cross its faces
+        inside_ranges, inside_bounds, nearby = bvh.query_box(lows, highs)
+        points = list(inside_bounds)
+        crossing = vertices[triangles[nearby]]
+    else:
+        # Out codes of the vertices, a bit per box face they are outside of
+        codes = np.zeros(len(vertices), dtype=np.uint8)
+        for axis in range(0,3):
+            codes |= (vertices[:,axis] < lows[axis]).astype(np.uint8) << (2*axis)
+            codes |= (vertices[:,axis] > highs[axis]).astype(np.uint8) << (2*axis+1)
+        tri_codes = codes[triangles]
+        # Triangles all outside one face miss the box, ones with all corners inside contribute their corners only
+        is_missing = (tri_codes[:,0] & tri_codes[:,1] & tri_codes[:,2]) != 0
+        is_within = (tri_codes[:,0] | tri_codes[:,1] | tri_codes[:,2]) == 0
+        used = np.zeros(len(vertices), dtype=bool)
+        used[triangles[is_within].ravel()] = True
+        points = [vertices[used]]
+        crossing = vertices[triangles[~is_missing & ~is_within]]
+    points.append(crossing.reshape(-1,3))
+    starts = crossing.reshape(-1,3)
+    ends = crossing[:,[1,2,0]].reshape(-1,3)
+    for axis in range(0,3):
+        deltas = ends[:,axis] - starts[:,axis]
+        safe_deltas = np.where(deltas != 0, deltas, 1)
+        for t in (lows[axis], highs[axis]):
+            ratios = (t - starts[:,axis])/safe_deltas
+            is_crossing = (deltas != 0) & (ratios >= 0) & (ratios <= 1)
+            edge_points = starts[is_crossing] + ratios[is_crossing,None]*(ends[is_crossing] - starts[is_crossing])
+            edge_points[:,axis] = t
+            points.append(edge_points)
+    
+    # Box edges piercing triangles, an edge runs along an axis so it is a 2D test in the other two
+    tri_mins = crossing.min(axis=1)
+    tri_maxs = crossing.max(axis=1)
+    for axis in range(0,3):
+        b, c = [i for i in range(0,3) if i != axis]
+        for p in (lows[b], highs[b]):
+            for q in (lows[c], highs[c]):
+                is_near = (tri_mins[:,b] <= p) & (tri_maxs[:,b] >= p) & (tri_mins[:,c] <= q) & (tri_maxs[:,c] >= q)
+                if not is_near.any():
+                    continue
+                near = crossing[is_near]
+                edge_1 = near[:,1] - near[:,0]
+                edge_2 = near[:,2] - near[:,0]
+                dets = edge_1[:,b]*edge_2[:,c] - edge_1[:,c]*edge_2[:,b]
+                safe_dets = np.where(dets != 0, dets, 1)
+                # Barycentric coordinates of the edge in the projected triangles
+                to_b = p - near[:,0,b]
+                to_c = q - near[:,0,c]
+                u = (to_b*edge_2[:,c] - to_c*edge_2[:,b])/safe_dets
+                v = (edge_1[:,b]*to_c - edge_1[:,c]*to_b)/safe_dets
+                is_piercing = (dets != 0) & (u >= 0) & (v >= 0) & (u + v <= 1)
+                edge_points = near[is_piercing,0] + u[is_piercing,None]*edge_1[is_piercing] + v[is_piercing,None]*edge_2[is_piercing]
+                edge_points[:,b] = p
+                edge_points[:,c] = q
+                points.append(edge_points)
+    
+    points = np.concatenate(points)
+    points = points[np.all((points >= lows - tolerance) & (points <= highs + tolerance), axis=1)]
+    points = np.clip(points, lows, highs)
+    if closed:
+        corners = np.array([(x,y,z) for x in (lows[0],highs[0]) for y in (lows[1],highs[1]) for z in (lows[2],highs[2])])
+        # Corners out of the mesh's extents are out of the mesh
+        if bvh != None:
+            mins, maxs = bvh.get_extents()
+        else:
+            mins, maxs = (vertices.min(axis=0), vertices.max(axis=0))
+        corners = corners[np.all((corners > mins) & (corners < maxs), axis=1)]
+        if len(corners) > 0 and bvh != None:
+            points = np.concatenate([points] + [corner[None] for corner in corners if is_inside_along_line(vertices, triangles, bvh, corner)])
+        elif len(corners) > 0:
+            points = np.concatenate((points, corners[vol.get_winding_numbers(vertices[triangles], corners) > 0.5]))
+    if len(points) == 0:
+        return (np.zeros(3), np.zeros(3))
+    return (points.min(axis=0), points.max(axis=0))
+
+"""
+Check a point is inside a closed mesh by the parity of the crossings of the line through it along z
+Only triangles the TriangleBVH finds near the line are crossed, widened by more than the nudge
+volume_helper.get_line_crossings gives the line off edges
+"""
+def is_inside_along_line(vertices, triangles, bvh, point):
+    mins, maxs = bvh.get_extents()
+    margin = 1e-6*max(1.0, float(np.max(maxs - mins)))
+    near = triangles[bvh.get_line_triangles(2, point, margin)]
+    crossings = vol.get_line_crossings(vertices[near], 2, point)
+    return (len(crossings) - np.searchsorted(crossings, point[2], side="right")) % 2 == 1
+
+"""
+Drop vertices no triangle uses
+Return (vertices, triangles)
+"""
+def compact_mesh(vertices, triangles):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1,3)
+    used = np.zeros(len(vertices), dtype=bool)
+    used[triangles.ravel()] = True
+    new_ids = np.cumsum(used) - 1
+    return (vertices[used], new_ids[triangles])
@@ -0,0 +1,469 @@
+import os
+import re
+
+import numpy as np
+
+import volume_helper as vol
+
+from TransformerMesh import TransformerMesh
+
+"""
+Loaders of OBJ, PLY and binary STL files into vertex and triangle arrays, for running the pipeline without blender
+Text is read in blocks and tokenized on its bytes with numpy, binary data is mapped and viewed in place,
+so no python object is made per vertex or face and memory stays at the size of the arrays.
+Polygons are fan triangulated like blender meshes are in blender_ops_helper.get_mesh_arrays
+Return values of the loaders are (vertices, triangles), (N,3) float64 and (M,3) int64 arrays
+"""
+
+# Bytes read per block of a text file
+block_size = 1 << 24
+# Bytes of a binary element whose lists change length chained at once, see get_entry_starts
+entry_block_size = 1 << 16
+
+is_whitespace = np.zeros(256, dtype=bool)
+is_whitespace[[9,10,11,12,13,32]] = True
+
+ply_types = {"char":"i1","int8":"i1","uchar":"u1","uint8":"u1","short":"i2","int16":"i2","ushort":"u2","uint16":"u2",\
+             "int":"i4","int32":"i4","uint":"u4","uint32":"u4","float":"f4","float32":"f4","double":"f8","float64":"f8"}
+
+# Texture and normal indices of an OBJ face corner
+face_suffix = re.compile(rb"/[^\s]*")
+
+stl_facet = np.dtype([("normal","<f4",(3,)),("vertices","<f4",(3,3)),("attribute","<u2")])
+
+"""
+Load a mesh file into a TransformerMesh named after the file unless name is given
+"""
+def load_mesh(path, name=None):
+    if name == None:
+        name = os.path.splitext(os.path.basename(path))[0]
+    vertices, triangles = load_mesh_arrays(path)
+    return TransformerMesh(name, vertices, triangles)
+
+"""
+Load a mesh file by its extension, .obj, .ply or .stl
+"""
+def load_mesh_arrays(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".obj":
+        return load_obj_arrays(path)
+    elif extension == ".ply":
+        return load_ply_arrays(path)
+    elif extension == ".stl":
+        return load_stl_arrays(path)
+    raise ValueError(str.format("Unknown mesh format {}", path))
+
+"""
+Get the line starts and the line ends (positions of the newlines) of data, a uint8 array of whole lines
+"""
+def get_lines(data):
+    line_ends = np.flatnonzero(data == 10)
+    line_starts = np.concatenate(([0], line_ends[:-1] + 1)).astype(np.int64)
+    return (line_starts, line_ends)
+
+"""
+Get the bytes of the lines of data that start with keyword followed by whitespace, keyword left out
+"""
+def select_lines(data, line_starts, line_ends, keyword):
+    is_keyword = np.ones(len(line_starts), dtype=bool)
+    for i in range(0,len(keyword)):
+        is_keyword &= data[np.minimum(line_starts + i, len(data) - 1)] == ord(keyword[i])
+    is_keyword &= is_whitespace[data[np.minimum(line_starts + len(keyword), len(data) - 1)]]
+    is_selected = np.repeat(is_keyword, line_ends - line_starts + 1)
+    for i in range(0,len(keyword)):
+        is_selected[line_starts[is_keyword] + i] = False
+    return (data[is_selected], is_keyword)
+
+"""
+Tokenize data, a uint8 array of whole lines of numbers
+Return (values, number of values on every line)
+"""
+def get_line_values(data, dtype):
+    line_ends = np.flatnonzero(data == 10)
+    if len(line_ends) == 0:
+        return (np.zeros(0, dtype=dtype), np.zeros(0, dtype=np.int64))
+    is_space = is_whitespace[data]
+    token_starts = np.flatnonzero(is_space[:-1] & ~is_space[1:]) + 1
+    if not is_space[0]:
+        token_starts = np.concatenate(([0], token_starts))
+    counts = np.diff(np.concatenate(([0], np.searchsorted(token_starts, line_ends))))
+    values = np.fromstring(data.tobytes(), dtype=dtype, sep=" ")
+    if len(values) != len(token_starts):
+        raise ValueError("Mesh file holds values that are not numbers")
+    return (values, counts)
+
+"""
+Drop what follows a '/' in every token of data, leaving the vertex indices of OBJ faces
+"""
+def strip_face_slashes(data):
+    text = data.tobytes()
+    if b"/" not in text:
+        return data
+    return np.frombuffer(face_suffix.sub(b"", text), dtype=np.uint8)
+
+"""
+Read a text file in blocks of whole lines, a last line without a newline gets one
+"""
+def read_line_blocks(text_file):
+    remainder = b""
+    while True:
+        block = text_file.read(block_size)
+        if len(block) == 0:
+            break
+        block = remainder + block
+        end = block.rfind(b"\n") + 1
+        remainder = block[end:]
+        if end > 0:
+            yield np.frombuffer(block[:end], dtype=np.uint8)
+    if len(remainder.strip()) > 0:
+        yield np.frombuffer(remainder + b"\n", dtype=np.uint8)
+
+"""
+Load a Wavefront OBJ file, only v and f lines are read
+Extra vertex components like w or colors are dropped, texture and normal indices of faces too,
+negative indices count back from the last vertex read
+"""
+def load_obj_arrays(path):
+    vertex_blocks = []
+    triangle_blocks = []
+    num_vertices = 0
+    with open(path, "rb") as obj_file:
+        for data in read_line_blocks(obj_file):
+            line_starts, line_ends = get_lines(data)
+            vertex_data, is_vertex = select_lines(data, line_starts, line_ends, "v")
+            values, counts = get_line_values(vertex_data, np.float64)
+            if np.any(counts < 3):
+                raise ValueError(str.format("Vertex with less than 3 coordinates in {}", path))
+            offsets = np.cumsum(counts) - counts
+            vertex_blocks.append(values[offsets[:,None] + np.arange(3)])
+
+            face_data, is_face = select_lines(data, line_starts, line_ends, "f")
+            indices, counts = get_line_values(strip_face_slashes(face_data), np.int64)
+            # Vertices read up to every face, for the negative indices
+            vertex_counts = num_vertices + np.cumsum(is_vertex)[is_face]
+            indices = np.where(indices < 0, indices + np.repeat(vertex_counts, counts), indices - 1)
+            if np.any(indices < 0) or np.any(indices >= np.repeat(vertex_counts, counts)):
+                raise ValueError(str.format("Face with a vertex index out of range in {}", path))
+            triangle_blocks.append(vol.triangulate_polygons(np.cumsum(counts) - counts, counts, indices))
+            num_vertices += len(vertex_blocks[-1])
+    return (concatenate_blocks(vertex_blocks, np.float64), concatenate_blocks(triangle_blocks, np.int64))
+
+def concatenate_blocks(blocks, dtype):
+    if len(blocks) == 0:
+        return np.zeros((0,3), dtype=dtype)
+    return np.concatenate(blocks).astype(dtype, copy=False).reshape(-1,3)
+
+"""
+Read a PLY header
+Return (format, list of (element name, count, properties), header size in bytes)
+properties are (name, type) or (name, "list", count type, item type)
+"""
+def read_ply_header(ply_file):
+    if ply_file.readline().strip() != b"ply":
+        raise ValueError("Not a PLY file")
+    ply_format = None
+    elements = []
+    while True:
+        line = ply_file.readline()
+        if len(line) == 0:
+            raise ValueError("PLY header has no end_header")
+        words = line.decode("ascii", "replace").split()
+        if len(words) == 0 or words[0] in ("comment","obj_info"):
+            continue
+        if words[0] == "end_header":
+            break
+        if words[0] == "format":
+            ply_format = words[1]
+        elif words[0] == "element":
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == "property":
+            if words[1] == "list":
+                elements[-1][2].append((words[4], "list", ply_types[words[2]], ply_types[words[3]]))
+            else:
+                elements[-1][2].append((words[2], ply_types[words[1]]))
+    return (ply_format, elements, ply_file.tell())
+
+"""
+Load a PLY file, ascii or binary, the x, y and z of its vertex element and the vertex indices of its face element
+"""
+def load_ply_arrays(path):
+    with open(path, "rb") as ply_file:
+        ply_format, elements, header_size = read_ply_header(ply_file)
+    if ply_format == "ascii":
+        columns = read_ascii_ply(path, elements, header_size)
+    elif ply_format in ("binary_little_endian","binary_big_endian"):
+        byte_order = "<" if ply_format == "binary_little_endian" else ">"
+        columns = read_binary_ply(path, elements, header_size, byte_order)
+    else:
+        raise ValueError(str.format("Unknown PLY format {} in {}", ply_format, path))
+
+    if "vertex" not in columns:
+        raise ValueError(str.format("No vertex element in {}", path))
+    vertex_columns = columns["vertex"]
+    vertices = np.stack([vertex_columns[axis] for axis in ("x","y","z")], axis=1).astype(np.float64)
+    triangles = np.zeros((0,3), dtype=np.int64)
+    for name in ("vertex_indices","vertex_index"):
+        if name in columns.get("face", {}):
+            loop_starts, loop_totals, loop_vertices = columns["face"][name]
+            triangles = vol.triangulate_polygons(loop_starts, loop_totals, loop_vertices)
+            break
+    if len(triangles) > 0 and (triangles.min() < 0 or triangles.max() >= len(vertices)):
+        raise ValueError(str.format("Face with a vertex index out of range in {}", path))
+    return (vertices, triangles)
+
+"""
+Get the columns of the elements of an ascii PLY body, one line per element entry
+Scalar properties are arrays, list properties are (loop starts, loop totals, loop values) like polygons are
+The body is read in blocks, an element's lines may span several of them
+"""
+def read_ascii_ply(path, elements, header_size):
+    blocks = [dict((prop[0], []) for prop in properties) for name, count, properties in elements]
+    element = 0
+    # Lines of the current element read so far
+    line = 0
+    with open(path, "rb") as ply_file:
+        ply_file.seek(header_size)
+        for data in read_line_blocks(ply_file):
+            line_starts, line_ends = get_lines(data)
+            first = 0
+            while element < len(elements):
+                name, count, properties = elements[element]
+                last = min(len(line_starts), first + count - line)
+                if last > first:
+                    read_ascii_entries(data[line_starts[first]:line_ends[last-1]+1], properties, blocks[element])
+                line += last - first
+                first = last
+                if line < count:
+                    break
+                element += 1
+                line = 0
+    if element < len(elements):
+        raise ValueError(str.format("PLY element {} runs past the end of {}", elements[element][0], path))
+
+    columns = {}
+    for i in range(0,len(elements)):
+        name, count, properties = elements[i]
+        element_columns = {}
+        for prop in properties:
+            if len(prop) == 4:
+                totals = concatenate_values([totals for totals, values in blocks[i][prop[0]]], np.int64)
+                values = concatenate_values([values for totals, values in blocks[i][prop[0]]], np.int64)
+                element_columns[prop[0]] = (np.cumsum(totals) - totals, totals, values)
+            else:
+                element_columns[prop[0]] = concatenate_values(blocks[i][prop[0]], np.float64)
+        columns[name] = element_columns
+    return columns
+
+"""
+Tokenize data, whole lines of entries of an element, and add its columns to element_blocks
+Lists are added as (loop totals, loop values)
+"""
+def read_ascii_entries(data, properties, element_blocks):
+    values, counts = get_line_values(data, np.float64)
+    # Position of every property on its line, lists move the ones after them
+    positions = np.cumsum(counts) - counts
+    for prop in properties:
+        if len(prop) == 4:
+            totals = values[positions].astype(np.int64)
+            item_positions = get_run_positions(positions + 1, totals, 1)
+            element_blocks[prop[0]].append((totals, values[item_positions].astype(np.int64)))
+            positions = positions + 1 + totals
+        else:
+            element_blocks[prop[0]].append(values[positions])
+            positions = positions + 1
+
+def concatenate_values(blocks, dtype):
+    if len(blocks) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.concatenate(blocks)
+
+"""
+Get the positions of runs of totals items step apart, from starts, one run after another
+"""
+def get_run_positions(starts, totals, step):
+    offsets = np.cumsum(totals) - totals
+    return np.repeat(starts - offsets*step, totals) + np.arange(int(totals.sum()))*step
+
+"""
+Get the columns of the elements of a binary PLY body, see read_ascii_ply
+Elements whose lists have the same length throughout, like triangle faces, are viewed in place,
+for others the entry starts are found first, see get_entry_starts
+"""
+def read_binary_ply(path, elements, header_size, byte_order):
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    columns = {}
+    offset = header_size
+    for name, count, properties in elements:
+        element_columns, offset = read_binary_element(data, offset, count, properties, byte_order)
+        columns[name] = element_columns
+    return columns
+
+def read_binary_element(data, offset, count, properties, byte_order):
+    # Layout of the first entry, lists taken to be as long as in it
+    fields = []
+    position = offset
+    for prop in properties:
+        if len(prop) == 4:
+            count_type = np.dtype(byte_order + prop[2])
+            item_type = np.dtype(byte_order + prop[3])
+            if count == 0:
+                length = 0
+            else:
+                length = int(np.frombuffer(data, count_type, 1, position)[0])
+            fields.append((prop[0] + "_count", count_type))
+            fields.append((prop[0], item_type, (length,)))
+            position += count_type.itemsize + length*item_type.itemsize
+        else:
+            fields.append((prop[0], np.dtype(byte_order + prop[1])))
+            position += np.dtype(byte_order + prop[1]).itemsize
+    entry_type = np.dtype(fields)
+    if offset + count*entry_type.itemsize <= len(data):
+        entries = np.frombuffer(data, entry_type, count, offset)
+        is_uniform = True
+        for prop in properties:
+            if len(prop) == 4 and np.any(entries[prop[0] + "_count"] != entry_type[prop[0]].shape[0]):
+                is_uniform = False
+        if is_uniform:
+            element_columns = {}
+            for prop in properties:
+                if len(prop) == 4:
+                    length = entry_type[prop[0]].shape[0]
+                    element_columns[prop[0]] = (np.arange(count, dtype=np.int64)*length, np.full(count, length, dtype=np.int64),\
+                                                entries[prop[0]].reshape(-1).astype(np.int64))
+                else:
+                    element_columns[prop[0]] = np.asarray(entries[prop[0]])
+            return (element_columns, offset + count*entry_type.itemsize)
+    return read_binary_entries(data, offset, count, properties, byte_order)
+
+"""
+Get the columns of an element whose lists change length, see read_binary_element
+Entry starts are found by get_entry_starts, the properties are then gathered at them all at once
+"""
+def read_binary_entries(data, offset, count, properties, byte_order):
+    starts, end = get_entry_starts(data, offset, count, properties, byte_order)
+    element_columns = {}
+    positions = starts
+    for prop in properties:
+        if len(prop) == 4:
+            count_type = np.dtype(byte_order + prop[2])
+            item_type = np.dtype(byte_order + prop[3])
+            totals = read_values_at(data, positions, count_type).astype(np.int64)
+            item_positions = get_run_positions(positions + count_type.itemsize, totals, item_type.itemsize)
+            values = read_values_at(data, item_positions, item_type).astype(np.int64)
+            element_columns[prop[0]] = (np.cumsum(totals) - totals, totals, values)
+            positions = positions + count_type.itemsize + totals*item_type.itemsize
+        else:
+            item_type = np.dtype(byte_order + prop[1])
+            element_columns[prop[0]] = read_values_at(data, positions, item_type)
+            positions = positions + item_type.itemsize
+    return (element_columns, end)
+
+"""
+Get the start of every entry of an element whose lists change length
+An entry's size depends on the list lengths read in it, so the end an entry would have is worked out
+for every byte position of a block at once, and the entries are chained from the first one by pointer
+doubling, a log of the entries in the block passes over it rather than a step per entry
+Return (entry starts, end of the element)
+"""
+def get_entry_starts(data, offset, count, properties, byte_order):
+    starts = [np.zeros(0, dtype=np.int64)]
+    found = 0
+    position = offset
+    while found < count:
+        if position >= len(data):
+            break
+        block_end = min(len(data), position + entry_block_size)
+        # Entry after every position of the block, ones past it point at the block's end
+        ends = get_entry_ends(data, np.arange(position, block_end, dtype=np.int64), properties, byte_order)
+        jumps = np.append(np.minimum(ends - position, block_end - position), block_end - position)
+        chain = np.zeros(1, dtype=np.int64)
+        while len(chain) < count - found and chain[-1] < block_end - position:
+            chain = np.concatenate((chain, jumps[chain]))
+            jumps = jumps[jumps]
+        chain = chain[chain < block_end - position][:count - found]
+        starts.append(chain + position)
+        found += len(chain)
+        position = int(ends[chain[-1]])
+    if found < count or position > len(data):
+        raise ValueError("PLY element runs past the end of the file")
+    return (np.concatenate(starts), position)
+
+"""
+Get the end of an entry starting at each of positions, garbage for positions no entry starts at
+"""
+def get_entry_ends(data, positions, properties, byte_order):
+    ends = positions
+    for prop in properties:
+        if len(prop) == 4:
+            count_type = np.dtype(byte_order + prop[2])
+            item_type = np.dtype(byte_order + prop[3])
+            lengths = np.clip(read_values_at(data, ends, count_type).astype(np.int64), 0, len(data))
+            ends = ends + count_type.itemsize + lengths*item_type.itemsize
+        else:
+            ends = ends + np.dtype(byte_order + prop[1]).itemsize
+    return ends
+
+"""
+Get values of item_type at byte positions of data, which need not be aligned
+Positions too close to the end read the last value there is
+"""
+def read_values_at(data, positions, item_type):
+    if len(data) < item_type.itemsize:
+        return np.zeros(len(positions), dtype=item_type)
+    positions = np.minimum(positions, len(data) - item_type.itemsize)
+    return data[positions[:,None] + np.arange(item_type.itemsize)].view(item_type).reshape(-1)
+
+"""
+Load a binary STL file, mapped rather than read
+STL facets do not share their corners, corners at the same position are welded into one vertex
+so the mesh is indexed like the others and clipping keeps it watertight
+"""
+def load_stl_arrays(path):
+    size = os.path.getsize(path)
+    with open(path, "rb") as stl_file:
+        header = stl_file.read(84)
+    if len(header) < 84:
+        raise ValueError(str.format("{} is too short for a binary STL", path))
+    count = int(np.frombuffer(header, "<u4", 1, 80)[0])
+    if size != 84 + count*stl_facet.itemsize:
+        raise ValueError(str.format("{} is not a binary STL, ascii STL is not read", path))
+    if count == 0:
+        return (np.zeros((0,3), dtype=np.float64), np.zeros((0,3), dtype=np.int64))
+    facets = np.memmap(path, dtype=stl_facet, mode="r", offset=84, shape=(count,))
+    # Adding 0 turns -0 into 0 so both weld
+    corners = np.ascontiguousarray(facets["vertices"].reshape(-1,3)) + np.float32(0)
+    first, inverse = weld_corners(corners)
+    vertices = corners[first].astype(np.float64)
+    triangles = inverse.reshape(-1,3).astype(np.int64)
+    # Facets degenerated by the welding hold no volume
+    is_degenerate = (triangles[:,0] == triangles[:,1]) | (triangles[:,1] == triangles[:,2]) | (triangles[:,2] == triangles[:,0])
+    return (vertices, triangles[~is_degenerate])
+
+"""
+Group corners with the same coordinates
+Corners are sorted by a 64 bit hash of their bits, which is checked against the coordinates,
+and by the coordinates' bytes if two positions ever share a hash
+Return (first corner of every group, group of every corner)
+"""
+def weld_corners(corners):
+    bits = corners.view(np.uint32)
+    hashes = bits[:,0].astype(np.uint64)
+    with np.errstate(over="ignore"):
+        hashes *= np.uint64(0x9E3779B97F4A7C15)
+        hashes ^= bits[:,1].astype(np.uint64)*np.uint64(0xC2B2AE3D27D4EB4F)
+        hashes ^= bits[:,2].astype(np.uint64)*np.uint64(0x165667B19E3779F9)
+    order = np.argsort(hashes)
+    sorted_hashes = hashes[order]
+    del hashes
+    is_first = np.empty(len(order), dtype=bool)
+    is_first[0] = True
+    np.not_equal(sorted_hashes[1:], sorted_hashes[:-1], out=is_first[1:])
+    del sorted_hashes
+    inverse = np.empty(len(order), dtype=np.int64)
+    inverse[order] = np.cumsum(is_first) - 1
+    first = order[is_first]
+    if np.array_equal(corners[first][inverse], corners):
+        return (first, inverse)
+    keys = corners.view(np.dtype((np.void, corners.dtype.itemsize*3))).ravel()
+    unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    return (first, inverse)
@@ -0,0 +1,108 @@
+import math
+
+import numpy as np
+
+import clipping_helper as clip
+
+from TransformerMesh import TransformerMesh
+
+"""
+Parametric closed meshes for running the pipeline without blender, all with outward facing normals
+y is the length of a shape as tier 1 cuts along y
+"""
+
+"""
+Get a box spanning mins to maxs
+"""
+def get_box_mesh(name, mins, maxs):
+    corners = np.array([mins, maxs], dtype=np.float64)
+    # Vertex index is 4*ix + 2*iy + iz
+    vertices = np.array([(corners[ix][0],corners[iy][1],corners[iz][2]) for ix in (0,1) for iy in (0,1) for iz in (0,1)])
+    quads = [(0,1,3,2),(4,6,7,5),(0,4,5,1),(2,3,7,6),(0,2,6,4),(1,5,7,3)]
+    triangles = []
+    for a, b, c, d in quads:
+        triangles.append((a,b,c))
+        triangles.append((a,c,d))
+    return TransformerMesh(name, vertices, triangles)
+
+"""
+Get a box with a box shaped cavity, walls are wall thick
+"""
+def get_hollow_box_mesh(name, mins, maxs, wall):
+    outer = get_box_mesh(name, mins, maxs)
+    inner = get_box_mesh(name, np.asarray(mins) + wall, np.asarray(maxs) - wall)
+    # The cavity faces inwards
+    triangles = np.concatenate((outer.triangles, inner.triangles[:,::-1] + len(outer.vertices)))
+    return TransformerMesh(name, np.concatenate((outer.vertices, inner.vertices)), triangles)
+
+"""
+Extrude a counter clockwise (y,z) profile along x from 0 to width
+"""
+def get_extruded_mesh(name, profile, width):
+    profile = np.asarray(profile, dtype=np.float64)
+    count = len(profile)
+    vertices = np.concatenate((np.column_stack((np.zeros(count), profile)), np.column_stack((np.full(count, width), profile))))
+    triangles = []
+    for i in range(0,count):
+        j = (i+1) % count
+        triangles.append((i,j,count+j))
+        triangles.append((i,count+j,count+i))
+
+    extra_vertices = []
+    for x, offset, is_reversed in ((0.0, 0, True), (width, count, False)):
+        centroid_id = -1
+        for triangle in clip.triangulate_loop(profile):
+            ids = []
+            for i in triangle:
+                if i == -1:
+                    if centroid_id == -1:
+                        centroid_id = len(vertices) + len(extra_vertices)
+                        extra_vertices.append((x,) + tuple(clip.get_loop_centroid(profile)))
+                    ids.append(centroid_id)
+                else:
+                    ids.append(offset + i)
+            if is_reversed:
+                ids.reverse()
+            triangles.append(tuple(ids))
+    if len(extra_vertices) > 0:
+        vertices = np.concatenate((vertices, np.array(extra_vertices)))
+    return TransformerMesh(name, vertices, triangles)
+
+"""
+Get a car like body, a stepped profile of bonnet, cabin and boot extruded sideways
+"""
+def get_car_mesh(name, length=4.0, width=1.8, height=1.4):
+    body = 0.45*height
+    profile = [(0,0.1*height),(length,0.1*height),(length,body),(0.8*length,body),(0.7*length,height),\
+               (0.35*length,height),(0.25*length,body*1.1),(0,body)]
+    mesh = get_extruded_mesh(name, profile, width)
+    mesh.set_geometry(mesh.vertices - np.array([width/2,0,0]), mesh.triangles)
+    return mesh
+
+"""
+Get a UV sphere with resolution rings and 2*resolution segments
+"""
+def get_sphere_mesh(name, resolution, radius=1.0):
+    thetas = np.linspace(0, math.pi, resolution+1)[1:-1]
+    phis = np.linspace(0, 2*math.pi, 2*resolution, endpoint=False)
+    segments = len(phis)
+    ring_points = np.stack((np.outer(np.sin(thetas), np.cos(phis)), np.outer(np.sin(thetas), np.sin(phis)),\
+                            np.outer(np.cos(thetas), np.ones(segments))), axis=2).reshape(-1,3)
+    vertices = np.concatenate(([(0,0,1)], ring_points, [(0,0,-1)]))*radius
+    bottom = len(vertices) - 1
+
+    triangles = []
+    for j in range(0,segments):
+        triangles.append((0,1+j,1+(j+1) % segments))
+    for i in range(0,len(thetas)-1):
+        for j in range(0,segments):
+            a = 1 + i*segments + j
+            b = 1 + i*segments + (j+1) % segments
+            c = a + segments
+            d = b + segments
+            triangles.append((a,c,d))
+            triangles.append((a,d,b))
+    last_ring = 1 + (len(thetas)-1)*segments
+    for j in range(0,segments):
+        triangles.append((bottom,last_ring+(j+1) % segments,last_ring+j))
+    return TransformerMesh(name, vertices, triangles)
@@ -0,0 +1,201 @@
+'''
+Batch cutting of a manifest of models, every model in its own headless blender process
+usage: python transformer_batch.py manifest.json [--output-directory DIR] [--workers N] [--timeout SECONDS] [--blender PATH] [--result-cache]
+The manifest is a json list of models, only "model" is required:
+    {"model":"robot.blend","armature":"Armature","object":"Cube","bone_prefix":"Bone_","picks":[0,0],"headless":false,"timeout":600}
+Relative model paths are from the manifest's directory, the other keys default to the ones of cutting_main and --timeout.
+A model runs as "blender --background model --python transformer_batch.py -- --job job.json", which calls cutting_main
+and saves the cut model, a piece archive of its pieces, its logs and a result json to the model's own directory
+under the output directory.
+Up to --workers blender processes run at once, all cores by default. The results of all models are collected in
+batch_summary.json
+With --result-cache the cut requests of a rerun replay their candidates from a result cache shared by the models,
+kept in the cache directory under the output directory, see CuttingCache
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Blender runs this file as a script, without its directory on the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import transformer_config as config
+
+from TransformerLogger import flush_logs
+
+job_file = "job.json"
+result_file = "result.json"
+blender_log_file = "blender_log.txt"
+summary_file = "batch_summary.json"
+cache_directory = "cache"
+
+# Keys a manifest entry may leave out, with the defaults of transformer_driver.cutting_main
+job_defaults = {"armature":"Armature","object":"Cube","bone_prefix":"Bone_","picks":[0,0],"headless":False}
+
+"""
+Get the jobs of a manifest, one per model with every key filled in
+Jobs are named after their models, prefixed with their position so models of the same name do not collide
+"""
+def load_manifest(manifest_path, output_directory, timeout):
+    with open(manifest_path, "r") as manifest_file:
+        entries = json.load(manifest_file)
+    manifest_directory = os.path.dirname(os.path.abspath(manifest_path))
+    jobs = []
+    for i in range(0,len(entries)):
+        entry = entries[i]
+        if "model" not in entry:
+            raise ValueError(str.format("Manifest entry {} has no model", i))
+        job = dict(job_defaults)
+        job["timeout"] = timeout
+        job.update(entry)
+        job["model"] = os.path.join(manifest_directory, entry["model"])
+        model_name = os.path.splitext(os.path.basename(job["model"]))[0]
+        job["name"] = str.format("{:04d}_{}", i, model_name)
+        job["directory"] = os.path.abspath(os.path.join(output_directory, job["name"]))
+        job["output"] = os.path.join(job["directory"], str.format("{}_cut.blend", model_name))
+        job["archive"] = os.path.join(job["directory"], str.format("{}.pieces", model_name))
+        jobs.append(job)
+    return jobs
+
+"""
+Run a job in a blender process and wait for it, killing it once it runs past the job's timeout
+Return the job's result, see run_job_in_blender, with status "timeout" or "failed" if blender did not get to write it
+"""
+def run_job(job, blender):
+    if not os.path.isdir(job["directory"]):
+        os.makedirs(job["directory"])
+    job_path = os.path.join(job["directory"], job_file)
+    with open(job_path, "w") as job_json:
+        json.dump(job, job_json, indent=2)
+    result_path = os.path.join(job["directory"], result_file)
+    if os.path.exists(result_path):
+        os.remove(result_path)
+
+    command = [blender, "--background", job["model"], "--python", os.path.abspath(__file__), "--", "--job", job_path]
+    start = time.perf_counter()
+    result = None
+    with open(os.path.join(job["directory"], blender_log_file), "w") as blender_log:
+        try:
+            process = subprocess.run(command, stdout=blender_log, stderr=subprocess.STDOUT, timeout=job["timeout"])
+            return_code = process.returncode
+        except subprocess.TimeoutExpired:
+            return_code = None
+            result = {"status":"timeout","errors":[str.format("Killed after {} s", job["timeout"])]}
+        except OSError as error:
+            return_code = None
+            result = {"status":"failed","errors":[str.format("Blender could not be started: {}", error)]}
+    wall_time = time.perf_counter() - start
+
+    if result == None:
+        try:
+            with open(result_path, "r") as result_json:
+                result = json.load(result_json)
+        except (OSError, ValueError):
+            result = {"status":"failed","errors":[str.format("Blender exited with {} without a result, see {}", return_code, blender_log_file)]}
+    result["name"] = job["name"]
+    result["model"] = job["model"]
+    result["directory"] = job["directory"]
+    result["return_code"] = return_code
+    result["wall_time"] = wall_time
+    return result
+
+"""
+Run jobs on num_workers blender processes at a time
+The pool's threads only wait on their processes, so every core runs a blender
+Return the results in the order of jobs, also written to the summary file in output_directory
+"""
+def run_batch(jobs, output_directory, num_workers, blender):
+    if not os.path.isdir(output_directory):
+        os.makedirs(output_directory)
+    with ThreadPoolExecutor(num_workers) as pool:
+        futures = [pool.submit(run_job, job, blender) for job in jobs]
+        results = []
+        for job, future in zip(jobs, futures):
+            result = future.result()
+            print(str.format("{:<40}{:>10}{:>10.1f}{:>8}", job["name"], result["status"], result["wall_time"], len(result.get("errors", []))))
+            sys.stdout.flush()
+            results.append(result)
+    with open(os.path.join(output_directory, summary_file), "w") as summary:
+        json.dump(results, summary, indent=2)
+    return results
+
+"""
+Worker side, run in blender with the job's model open
+Logs go to the job's directory, the engine runs in this process since the batch already keeps every core busy
+Writes {"status", "time", "objects", "errors"} to the job's result file, errors are the lines of the error log
+"""
+def run_job_in_blender(job_path):
+    import bpy
+    import transformer_driver as driver
+    with open(job_path, "r") as job_json:
+        job = json.load(job_json)
+    config.log_directory = job["directory"]
+    config.engine_processes = 1
+    if job.get("cache_directory") != None:
+        config.use_result_cache = True
+        config.cache_directory = job["cache_directory"]
+
+    start = time.perf_counter()
+    result = {"status":"done"}
+    try:
+        driver.cutting_main(job["picks"], job["armature"], job["object"], job["bone_prefix"], job["headless"], job["archive"])
+        bpy.ops.wm.save_as_mainfile(filepath=job["output"], copy=True)
+        result["output"] = job["output"]
+        result["archive"] = job["archive"]
+    except Exception:
+        result["status"] = "failed"
+        result["traceback"] = traceback.format_exc()
+    result["time"] = time.perf_counter() - start
+    result["objects"] = [obj.name for obj in bpy.data.objects if obj.type == "MESH"]
+
+    flush_logs()
+    errors = []
+    error_path = os.path.join(job["directory"], "error_log.txt")
+    if os.path.exists(error_path):
+        with open(error_path, "r") as error_log:
+            errors = [line.rstrip("\n") for line in error_log if line.strip() != ""]
+    result["errors"] = errors
+    with open(os.path.join(job["directory"], result_file), "w") as result_json:
+        json.dump(result, result_json, indent=2)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Cut a manifest of models in headless blender processes")
+    parser.add_argument("manifest", nargs="?")
+    parser.add_argument("--output-directory", default="batch_output")
+    parser.add_argument("--workers", type=int, default=0, help="blender processes at once, 0 for one per core")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds a model may take unless its entry says otherwise")
+    parser.add_argument("--blender", default="blender", help="blender executable")
+    parser.add_argument("--result-cache", action="store_true", help="replay cut requests done by an earlier batch")
+    parser.add_argument("--job", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.job != None:
+        run_job_in_blender(args.job)
+        return 0
+    if args.manifest == None:
+        parser.error("a manifest is required")
+
+    num_workers = args.workers
+    if num_workers <= 0:
+        num_workers = os.cpu_count()
+    jobs = load_manifest(args.manifest, args.output_directory, args.timeout)
+    if args.result_cache:
+        for job in jobs:
+            job["cache_directory"] = os.path.join(os.path.abspath(args.output_directory), cache_directory)
+    print(str.format("{:<40}{:>10}{:>10}{:>8}", "model", "status", "wall s", "errors"))
+    results = run_batch(jobs, args.output_directory, num_workers, args.blender)
+    return 0 if all(result["status"] == "done" for result in results) else 1
+
+if __name__ == "__main__":
+    # Arguments of a worker come after blender's own
+    argv = sys.argv[1:]
+    if "--" in sys.argv:
+        argv = sys.argv[sys.argv.index("--")+1:]
+    sys.exit(main(argv))
@@ -0,0 +1,180 @@
+'''
+Benchmark of the cutting pipeline on synthetic meshes, runs headless through transformer_engine
+usage: python transformer_benchmark.py [--meshes cube,hollow,car,sphere,model.obj] [--resolutions 16,32,64] [--repeat 1] [--no-memory]
+Meshes other than the synthetic ones are OBJ, PLY or STL files, see mesh_loader_helper
+Every case runs once traced for peak memory, then repeat times untraced for the timings
+'''
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import clipping_helper as clip
+import mesh_loader_helper as loader
+import shape_helper as shapes
+import transformer_config as config
+import transformer_engine as engine
+
+from TransformerMesh import TransformerMesh
+
+# Cut request examples of transformer_setup, with their picks
+examples = [
+    ("sym_asym_sym", [0,0,0], [{"volume":0.18,"aspect":(2,1,1),"is_sym":True},\
+                               {"volume":0.1,"aspect":(1,1,1),"is_sym":False},\
+                               {"volume":0.18,"aspect":(2,1,1),"is_sym":True}]),
+    ("wide_sym", [0,0,0], [{"volume":0.15,"aspect":(2,1.5,1),"is_sym":True},\
+                           {"volume":0.1,"aspect":(1,1,1),"is_sym":False},\
+                           {"volume":0.15,"aspect":(2,1,1),"is_sym":True}]),
+    ("long_sym_big_asym", [0,0], [{"volume":0.15,"aspect":(4,1,1),"is_sym":True},\
+                                  {"volume":0.4,"aspect":(2,2,1),"is_sym":False}]),
+]
+
+tier_functions = {"asym_tier_1_matching":1, "asym_tier_2_matching":2, "asym_tier_3_matching":3,\
+                  "sym_tier_1_matching":1, "sym_tier_2_matching":2, "sym_tier_3_matching":3}
+
+# Passes over a mesh's triangles in clipping_helper, the tiers and box_optimizer both go through them
+geometry_functions = ["clip_below_planes", "intersect_box", "get_clipped_extents", "subtract_box"]
+
+"""
+Counters filled in by the instrumented engine, tier times exclude the nested tiers
+"""
+class BenchmarkStats(object):
+
+    tier_times = None
+    booleans = 0
+    meshes_created = 0
+    geometry_evaluations = 0
+    timer_stack = None
+
+    def __init__(self):
+        self.tier_times = {1:0.0, 2:0.0, 3:0.0}
+        self.booleans = 0
+        self.meshes_created = 0
+        self.geometry_evaluations = 0
+        self.timer_stack = []
+        return
+
+    """
+    Wrap a tier function so its own time goes to its tier and not to the tier it is nested in
+    """
+    def time_tier(self, function, tier):
+        def timed(*args):
+            start = time.perf_counter()
+            self.timer_stack.append(0.0)
+            try:
+                return function(*args)
+            finally:
+                nested = self.timer_stack.pop()
+                elapsed = time.perf_counter() - start
+                self.tier_times[tier] += elapsed - nested
+                if len(self.timer_stack) > 0:
+                    self.timer_stack[-1] += elapsed
+        return timed
+
+    def count_calls(self, function, counter):
+        def counted(*args, **kwargs):
+            setattr(self, counter, getattr(self, counter) + 1)
+            return function(*args, **kwargs)
+        return counted
+
+"""
+Run cut_reqs on mesh with the engine instrumented
+Memory tracing slows numpy down several times, so with trace_memory the times are not representative
+The result cache is off during the run, a cached case would time its replay instead of its search
+Return (BenchmarkStats, wall time, peak traced memory in bytes or 0)
+"""
+def run_case(mesh, cut_reqs, picks, trace_memory):
+    stats = BenchmarkStats()
+    use_result_cache = config.use_result_cache
+    config.use_result_cache = False
+    originals = {}
+    for name in tier_functions:
+        originals[name] = getattr(engine, name)
+        setattr(engine, name, stats.time_tier(originals[name], tier_functions[name]))
+    mesh_methods = {"__init__":getattr(TransformerMesh, "__init__"),\
+                    "intersect_box":getattr(TransformerMesh, "intersect_box"),\
+                    "subtract_box":getattr(TransformerMesh, "subtract_box")}
+    TransformerMesh.__init__ = stats.count_calls(mesh_methods["__init__"], "meshes_created")
+    TransformerMesh.intersect_box = stats.count_calls(mesh_methods["intersect_box"], "booleans")
+    TransformerMesh.subtract_box = stats.count_calls(mesh_methods["subtract_box"], "booleans")
+    clip_functions = {}
+    for name in geometry_functions:
+        clip_functions[name] = getattr(clip, name)
+        setattr(clip, name, stats.count_calls(clip_functions[name], "geometry_evaluations"))
+
+    random.seed(0)
+    peak_memory = 0
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        engine.cutting_run(mesh, cut_reqs, picks)
+    finally:
+        wall_time = time.perf_counter() - start
+        if trace_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        for name in originals:
+            setattr(engine, name, originals[name])
+        for name in mesh_methods:
+            setattr(TransformerMesh, name, mesh_methods[name])
+        for name in clip_functions:
+            setattr(clip, name, clip_functions[name])
+        config.use_result_cache = use_result_cache
+    return (stats, wall_time, peak_memory)
+
+def get_meshes(mesh_names, resolutions):
+    meshes = []
+    for mesh_name in mesh_names:
+        if mesh_name == "cube":
+            meshes.append(shapes.get_box_mesh("cube", (-1,-1,-1), (1,1,1)))
+        elif mesh_name == "hollow":
+            meshes.append(shapes.get_hollow_box_mesh("hollow", (-1,-2,-1), (1,2,1), 0.2))
+        elif mesh_name == "car":
+            meshes.append(shapes.get_car_mesh("car"))
+        elif mesh_name == "sphere":
+            for resolution in resolutions:
+                meshes.append(shapes.get_sphere_mesh(str.format("sphere_{}", resolution), resolution))
+        elif os.path.isfile(mesh_name):
+            meshes.append(loader.load_mesh(mesh_name))
+        else:
+            raise ValueError(str.format("Unknown mesh {}", mesh_name))
+    return meshes
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the cutting pipeline on synthetic meshes")
+    parser.add_argument("--meshes", default="cube,hollow,car,sphere", help="synthetic meshes or mesh files")
+    parser.add_argument("--resolutions", default="16,32,64", help="sphere resolutions")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="skip the extra traced run measuring peak memory")
+    parser.add_argument("--debug-matching", action="store_true", help="keep matching logs on, they are off by default")
+    args = parser.parse_args(argv)
+
+    config.DEBUG_MATCHING = args.debug_matching
+    config.engine_processes = 1
+    config.log_directory = tempfile.mkdtemp(prefix="transformer_benchmark_")
+    meshes = get_meshes(args.meshes.split(","), [int(i) for i in args.resolutions.split(",")])
+
+    header = str.format("{:<14}{:>8}  {:<18}{:>9}{:>9}{:>9}{:>9}{:>10}{:>9}{:>9}{:>10}",\
+                        "mesh","tris","example","wall s","tier1 s","tier2 s","tier3 s","booleans","meshes","geom","peak MB")
+    print(header)
+    print("-"*len(header))
+    for mesh in meshes:
+        for example_name, picks, cut_reqs in examples:
+            peak_memory = 0
+            if not args.no_memory:
+                peak_memory = run_case(mesh, cut_reqs, picks, True)[2]
+            for i in range(0,args.repeat):
+                stats, wall_time = run_case(mesh, cut_reqs, picks, False)[0:2]
+                print(str.format("{:<14}{:>8}  {:<18}{:>9.3f}{:>9.3f}{:>9.3f}{:>9.3f}{:>10}{:>9}{:>9}{:>10.1f}",\
+                                 mesh.name, len(mesh.triangles), example_name, wall_time,\
+                                 stats.tier_times[1], stats.tier_times[2], stats.tier_times[3],\
+                                 stats.booleans, stats.meshes_created, stats.geometry_evaluations, peak_memory/1e6))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,7 +1,12 @@
+import os
+
+from collections import namedtuple
+
 import arithmetic_helper as arith
 
 """
 Global constants
+The ones CuttingConfig holds are the defaults of every run and are never changed by one
 """
 # Floating point error tolerance
 fp_tolerance = 0.0001
@@ -19,18 +24,77 @@ allowed_pd_volume = 0.1
 allowed_pd_aspect = 0.2
 mediocre_pd_cap = 0.8
 bad_pd_cap = 1.5
+# Get division volumes from the mesh arrays instead of a boolean per division
+# Turn off for meshes that are not closed, volumes are then approximated by cut surfaces
+use_slab_profiler = True
+# Slabs per division in the cumulative volume table when the slab profiler is used
+volume_table_refinement = 4
+# Find cut positions in the engine by root finding on the exact volume instead of a cumulative volume table,
+# positions are then within fp_tolerance whatever the number of divisions
+use_root_search = False
+# Search the engine's candidates over continuous box bounds with box_optimizer instead of the tiers
+use_box_optimizer = False
+# Start boxes are put at these positions along y, 0 is the low end like the tier cuts and 1 the high end
+optimizer_start_positions = (0.0, 0.5, 1.0)
+# Axis cycles per start, bounds scanned per axis in every zoom of the grid, and seconds for all starts
+optimizer_max_cycles = 12
+optimizer_scans = 8
+optimizer_time_budget = 10.0
+# Search from the best tier candidates of a cut request first, this many, 0 for none
+# Seeds run the whole tier search before the box search, only worth it where the start boxes get stuck
+optimizer_seeds = 0
+# Meshes of at least this many triangles get a TriangleBVH for their box queries, smaller ones are scanned whole
+bvh_min_triangles = 16384
+# Match cut requests on box descriptors and only run booleans for the chosen cut
+# Turn off to get every candidate as a blender object for inspection
+use_deferred_booleans = True
+# Worker processes exploring tier 2 subtrees in the engine, 1 explores them in this process, 0 uses every core
+# Headless runs only, blender's own python cannot spawn workers and explores them in this process whatever the value
+engine_processes = 1
+# Keep the candidates of every cut request on disk, a rerun with the same mesh, request and settings
+# replays them instead of searching again and picks from them anew. Off for interactive runs,
+# transformer_batch turns it on with --result-cache
+use_result_cache = False
+# Cache files are written to this directory, least recently used ones go once they take more than cache_max_bytes
+cache_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "cache")
+cache_max_bytes = 256*1024*1024
 
 # Debug messages control
 DEBUG_MATCHING = True
-DEBUG_ANALYTICS = False
+# Record spans of the cutting pipeline, written out as trace.json and trace_summary.txt in log_directory, see transformer_tracer
+DEBUG_TRACING = False
+# Log files are written to this directory, the project root by default
+log_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+# Seconds between background writes of buffered log entries
+log_flush_interval = 1.0
+
+"""
+Settings of one cutting run, passed down to the tiers instead of read off the module
+A run starts from get_cutting_config() and moves on with next_subdivision_level after every cut request,
+so runs in the same process, thread or worker pool do not see each other's divisions
+"""
+class CuttingConfig(namedtuple("CuttingConfig", ["fp_tolerance","normal_tolerance",\
+                                                 "tier_1_divs","tier_2_divs","tier_3_divs",\
+                                                 "tier_1_subdivision_level","tier_2_subdivision_level","tier_3_subdivision_level",\
+                                                 "allowed_pd_volume","allowed_pd_aspect","mediocre_pd_cap","bad_pd_cap",\
+                                                 "use_slab_profiler","volume_table_refinement","use_root_search",\
+                                                 "use_box_optimizer","optimizer_start_positions","optimizer_max_cycles",\
+                                                 "optimizer_scans","optimizer_time_budget","optimizer_seeds",\
+                                                 "DEBUG_MATCHING"])):
+    __slots__ = ()
+
+    """
+    Get the config with the next subdivision levels
+    avoids a new cut with an edge landing right on the edge of an old cut
+    """
+    def next_subdivision_level(self):
+        return self._replace(tier_1_divs = arith.next_smallest_prime(self.tier_1_divs),\
+                             tier_2_divs = arith.next_smallest_prime(self.tier_2_divs),\
+                             tier_3_divs = arith.next_smallest_prime(self.tier_3_divs))
 
 """
-Change subdivision level to avoid a new cut with an edge landing right on the edge of an old cut
+Get the config a run starts with from the module's current values
 """
-def next_subdivision_level():
-    global tier_1_divs
-    global tier_2_divs
-    global tier_3_divs
-    tier_1_divs = arith.next_smallest_prime(tier_1_divs)
-    tier_2_divs = arith.next_smallest_prime(tier_2_divs)
-    tier_3_divs = arith.next_smallest_prime(tier_3_divs)
\ No newline at end of file
+def get_cutting_config():
+    values = globals()
+    return CuttingConfig(*[values[field] for field in CuttingConfig._fields])
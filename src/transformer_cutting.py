@@ -2,496 +2,277 @@
 @author: Jiang HaoYuan, National University of Singapore
 '''
 
-import bpy
 import bmesh
 
 import math
-import arithmetic_helper as arith
+import numpy as np
+
 import analytic_helper as analysis
 import blender_ops_helper as bops
+import boundbox_helper as bb
+import clipping_helper as clip
 import transformer_config as config
+import transformer_engine as engine
+import transformer_tracer as tracer
+import volume_helper as vol
 
 from TransformerLogger import TransformerLogger
 
 # Logger
 logger = TransformerLogger()
 
-"""
-Get a bunch of values from the boundbox of an object
-"""
-def process_boundbox(boundboxes,num_divs):
-    boundbox_verts = []
-    for boundbox in boundboxes:
-        for i in boundbox:
-            boundbox_verts.append(i)
-
-    x_min = boundbox_verts[0][0]
-    x_max = boundbox_verts[0][0]
-    y_min = boundbox_verts[0][1]
-    y_max = boundbox_verts[0][1]
-    z_min = boundbox_verts[0][2]
-    z_max = boundbox_verts[0][2]
-    for i in boundbox_verts:
-        if i[0] > x_max:
-            x_max = i[0]
-        if i[0] < x_min:
-            x_min = i[0]
-        if i[1] > y_max:
-            y_max = i[1]
-        if i[1] < y_min:
-            y_min = i[1]
-        if i[2] > z_max:
-            z_max = i[2]
-        if i[2] < z_min:
-            z_min = i[2]
-    
-    x_interval = (x_max-x_min)/num_divs
-    y_interval = (y_max-y_min)/num_divs
-    z_interval = (z_max-z_min)/num_divs
-    x_max_box = x_max + x_interval
-    x_min_box = x_min - x_interval
-    y_max_box = y_max + y_interval
-    y_min_box = y_min - y_interval
-    z_max_box = z_max + z_interval
-    z_min_box = z_min - z_interval
-    
-    params = {"x_min":x_min,"x_max":x_max,"y_min":y_min,"y_max":y_max,"z_min":z_min,"z_max":z_max,\
-            "x_interval":x_interval,"y_interval":y_interval,"z_interval":z_interval,\
-            "x_max_box":x_max_box,"x_min_box":x_min_box,"y_max_box":y_max_box,"y_min_box":y_min_box,"z_max_box":z_max_box,"z_min_box":z_min_box}
-    return params
-     
 """
 Get area of cut surfaces for volume approximation
+vertices and triangles are the arrays of one division
 """
-def get_cut_surfaces_area(vertices,polygons,dim_string,near_plane,far_plane,interval):
+def get_cut_surfaces_area(vertices,triangles,dim_string,near_plane,far_plane,interval,run_config):
     # Determine dimension
-    dim = 0
-    if dim_string == "x":
-        dim = 0
-    elif dim_string == "y":
-        dim = 1
-    elif dim_string == "z":
-        dim = 2
-    else:
+    dim = vol.get_axis(dim_string)
+    if dim == -1 or len(triangles) == 0:
         return 0
     
+    tri_verts = vol.get_triangle_verts(vertices,triangles)
+    crosses = np.cross(tri_verts[:,1]-tri_verts[:,0],tri_verts[:,2]-tri_verts[:,0])
+    areas = np.linalg.norm(crosses,axis=1)/2
+    normals = crosses[:,dim]/np.where(areas > 0,2*areas,1)
+    average_planes = tri_verts[:,:,dim].mean(axis=1)
+    
     """
     In here, average plane is checked against a threshold to take into account of
     hollowed object, the hollowed face, if its normal is just right, should not be
     counted to make the estimated volume even larger than it already is
     """
-    area = 0
     far_threshold = far_plane - interval/10
     near_threshold = near_plane + interval/10
-    for face in polygons:
-        # Facing towards positive axis
-        if math.fabs(face.normal[dim]-1)<= config.normal_tolerance:
-            average_plane = 0
-            for vert in face.vertices:
-                average_plane += vertices[vert].co[dim]
-            average_plane = average_plane/len(face.vertices)
-            if average_plane >= far_threshold:
-                area = area+face.area*(average_plane-near_plane)/interval
-        # Facing towards negative axis
-        elif math.fabs(face.normal[dim]+1) <= config.normal_tolerance:
-            average_plane = 0
-            for vert in face.vertices:
-                average_plane += vertices[vert].co[dim]
-            average_plane = average_plane/len(face.vertices)
-            if average_plane <= near_threshold:
-                area = area+face.area*(far_plane-average_plane)/interval
-    return area
+    # Facing towards positive axis
+    towards_far = (np.fabs(normals-1) <= run_config.normal_tolerance) & (average_planes >= far_threshold)
+    # Facing towards negative axis
+    towards_near = (np.fabs(normals+1) <= run_config.normal_tolerance) & (average_planes <= near_threshold)
+    area = np.sum(areas[towards_far]*(average_planes[towards_far]-near_plane))\
+           + np.sum(areas[towards_near]*(far_plane-average_planes[towards_near]))
+    return float(area/interval)
 
 """
-Get estimated volume ratios based on surface area ratios
+Get volume ratios of num_divs divisions of obj along a dimension
+Divisions start at the min of params and are an interval apart, the first and last one extend to the box
+With the slab profiler, exact slab volumes are read off the mesh arrays in one pass
+Otherwise the mesh arrays are sliced into all divisions in one sweep and the volume of every
+division is approximated by its cut surfaces
 """
-def get_volume_ratios(cut_id, cut_surface_areas):
-    volume_ratios = []
-    area_sum = math.fsum(cut_surface_areas)
-    if area_sum == 0:
-        logger.add_error_log(str.format("Error at cut {} produced area sum 0",cut_id))
-    for area in cut_surface_areas:
-        volume_ratios.append(area/area_sum)
+def get_division_volume_ratios(ratio_id, obj, dim_string, params, num_divs, run_config):
+    dim_min = params.get(dim_string,"min")
+    interval = (params.get(dim_string,"max") - dim_min)/num_divs
+    vertices, triangles = bops.get_mesh_arrays(obj)
+    planes = [dim_min + (i+1)*interval for i in range(0,num_divs-1)]
+    
+    if run_config.use_slab_profiler:
+        slab_volumes = vol.get_slab_volumes(vol.get_triangle_verts(vertices,triangles),vol.get_axis(dim_string),planes)
+        volume_ratios = engine.get_volume_ratios(ratio_id,slab_volumes)
+        analysis.analyse_volume_approximation(obj.name, (vertices, triangles), [], volume_ratios, logger)
+        return volume_ratios
+    
+    # Slabs are closed with caps on their planes like the boolean divisions were
+    slab_vertices, slabs = clip.slice_mesh(vertices, triangles, vol.get_axis(dim_string), planes)
+    divisions = []
+    cutsurface_areas = []
+    for i in range(0,num_divs):
+        near = dim_min + i*interval
+        far = near + interval
+        divisions.append((slab_vertices, slabs[i]))
+        cutsurface_areas.append(get_cut_surfaces_area(slab_vertices,slabs[i],dim_string,near,far,interval,run_config))
+    
+    volume_ratios = engine.get_volume_ratios(ratio_id,cutsurface_areas)
+    
+    analysis.analyse_volume_approximation(obj.name, (vertices, triangles), divisions, volume_ratios, logger)
     return volume_ratios
 
 """
-Pad the print message in verify cut with appropriate number of '*'
+Get cumulative volume ratio table of obj along a dimension, see volume_helper
+With the slab profiler the table is finer than the tier divisions since slabs are cheap
 """
-def pad_msg(div_id):
-    if div_id.count('_') == 0:
-        return ""
-    elif div_id.count('_') == 1:
-        return "**********"
-    else:
-        return "********************"
-        
+def get_cumulative_volume_table(ratio_id, obj, dim_string, params, num_divs, run_config):
+    if run_config.use_slab_profiler:
+        num_divs = num_divs*run_config.volume_table_refinement
+    dim_min = params.get(dim_string,"min")
+    interval = (params.get(dim_string,"max") - dim_min)/num_divs
+    volume_ratios = get_division_volume_ratios(ratio_id, obj, dim_string, params, num_divs, run_config)
+    return vol.build_cumulative_volume(dim_min, interval, volume_ratios)
+
 """
 Verify if a cut can be accepted based on its volume ratio and aspect ratio
-temp_sto is a dictionary containing some values to be written back to the cut
+The pd found is written back to the cut
 Return BOOLEAN
 """
-def verify_cut(div_id, req_volume_ratio, req_aspects, estimated_volume, cut):
-    # Matching volume 
-    if config.DEBUG_MATCHING:
-        logger.add_matching_log("{} matching {}".format(pad_msg(div_id), div_id))
-        logger.add_matching_log("{} volume req/act : {} / {}".format(pad_msg(div_id), req_volume_ratio, estimated_volume))
-
-    if not arith.percentage_discrepancy(estimated_volume, req_volume_ratio) <= config.allowed_pd_volume:
-        if config.DEBUG_MATCHING:
-            logger.add_matching_log("{} rejected".format(pad_msg(div_id)))
-            logger.add_matching_log("")
-        cut['pd'] = -1
-        return False
-    
-    # Matching aspect ratio    
-    aspect_ratio_satisfied = False
-    
-    params = process_boundbox([cut.bound_box],1)
-    x_max = params["x_max"]
-    x_min = params["x_min"]
-    y_max = params["y_max"]
-    y_min = params["y_min"]
-    z_max = params["z_max"]
-    z_min = params["z_min"]
-            
-    dim_x = x_max - x_min
-    dim_y = y_max - y_min
-    dim_z = z_max - z_min
-    
-    configure_1 = []
-    configure_1.append(dim_x/dim_y)
-    configure_1.append(dim_z/dim_y)
-    configure_2 = []
-    configure_2.append(dim_y/dim_x)
-    configure_2.append(dim_z/dim_x)
-    configure_3 = []
-    configure_3.append(dim_x/dim_z)
-    configure_3.append(dim_y/dim_z)
-    
-    if config.DEBUG_MATCHING:
-        logger.add_matching_log("{} aspect ratio req : {}".format(pad_msg(div_id), req_aspects))
-        logger.add_matching_log("{} aspect ratio 1/2/3 : {} / {} / {}".format(pad_msg(div_id), configure_1, configure_2, configure_3))
-    
-    # The smallest percentage difference possible
-    pds = {arith.percentage_discrepancy(configure_1[0], req_aspects[0]) + arith.percentage_discrepancy(configure_1[1], req_aspects[1]),\
-           arith.percentage_discrepancy(configure_1[1], req_aspects[0]) + arith.percentage_discrepancy(configure_1[0], req_aspects[1]),\
-           arith.percentage_discrepancy(configure_2[0], req_aspects[0]) + arith.percentage_discrepancy(configure_2[1], req_aspects[1]),\
-           arith.percentage_discrepancy(configure_2[1], req_aspects[0]) + arith.percentage_discrepancy(configure_2[0], req_aspects[1]),\
-           arith.percentage_discrepancy(configure_3[0], req_aspects[0]) + arith.percentage_discrepancy(configure_3[1], req_aspects[1]),\
-           arith.percentage_discrepancy(configure_3[1], req_aspects[0]) + arith.percentage_discrepancy(configure_3[0], req_aspects[1])}
-    pd = min(pds)
+@tracer.traced
+def verify_cut(div_id, req_volume_ratio, req_aspects, estimated_volume, cut, run_config):
+    dims = bb.get_points_boundbox([cut.bound_box],1).get_dims()
+    is_accepted_cut, pd = engine.verify_candidate(div_id, req_volume_ratio, req_aspects, estimated_volume, dims, run_config)
     cut['pd'] = pd
-    
-    if (arith.percentage_discrepancy(configure_1[0], req_aspects[0]) <= config.allowed_pd_aspect \
-    and arith.percentage_discrepancy(configure_1[1], req_aspects[1]) <= config.allowed_pd_aspect) \
-    or (arith.percentage_discrepancy(configure_1[1], req_aspects[0]) <= config.allowed_pd_aspect \
-    and arith.percentage_discrepancy(configure_1[0], req_aspects[1]) <= config.allowed_pd_aspect):
-        aspect_ratio_satisfied = True
-    
-    if (arith.percentage_discrepancy(configure_2[0], req_aspects[0]) <= config.allowed_pd_aspect \
-    and arith.percentage_discrepancy(configure_2[1], req_aspects[1]) <= config.allowed_pd_aspect) \
-    or (arith.percentage_discrepancy(configure_2[1], req_aspects[0]) <= config.allowed_pd_aspect \
-    and arith.percentage_discrepancy(configure_2[0], req_aspects[1]) <= config.allowed_pd_aspect):
-        aspect_ratio_satisfied = True
-        
-    if (arith.percentage_discrepancy(configure_3[0], req_aspects[0]) <= config.allowed_pd_aspect \
-    and arith.percentage_discrepancy(configure_3[1], req_aspects[1]) <= config.allowed_pd_aspect) \
-    or (arith.percentage_discrepancy(configure_3[1], req_aspects[0]) <= config.allowed_pd_aspect \
-    and arith.percentage_discrepancy(configure_3[0], req_aspects[1]) <= config.allowed_pd_aspect):
-        aspect_ratio_satisfied = True
-    
-    if not aspect_ratio_satisfied:
-        if config.DEBUG_MATCHING:
-            logger.add_matching_log("{} rejected".format(pad_msg(div_id)))
-            logger.add_matching_log("")
-        return False
-    
-    if config.DEBUG_MATCHING:
-        logger.add_matching_log("{} accepted".format(pad_msg(div_id)))
-        logger.add_matching_log("")
-        
-    return True
-            
-"""
-Remove all intermediate objects created
-and flush all associated meshes
-"""
-def intermediate_cleanup():
-    objects = bpy.data.objects
-    for obj in objects:
-        obj.select = False
-        if "division" in obj.name or "assist" in obj.name:
-            obj.select = True
-    bpy.ops.object.delete()
-    for mesh in bpy.data.meshes:
-        if "division" in mesh.name or "assist" in mesh.name:
-            bpy.data.meshes.remove(mesh)
+    return is_accepted_cut
             
 """
-Remove all potential cuts with pd = -1 (not a volume fit)
-Remove all temporary cuts
-Flush all associated meshes
+Cut the candidates of a cut request out of obj into registry, run_config is the run's transformer_config.CuttingConfig
 """
-
-def tier_end_cleanup():
-    objects = bpy.data.objects
-        
-    # Remove all potential cuts without acceptable volume
-    mesh_to_remove = []
-    for obj in objects:
-        obj.select = False
-        if "potential" in obj.name:
-            if obj['pd'] == None:
-                logger.add_error_log("!!!!!!!!!!!!")
-                logger.add_error_log(str.format("Unexpected error, {} does not have pd",obj.name))
-                logger.add_error_log("!!!!!!!!!!!!")
-            elif obj['pd'] == -1:
-                mesh_to_remove.append(obj.name)
-                obj.select = True
-        if "temp" in obj.name:
-            mesh_to_remove.append(obj.name)
-            obj.select = True
-            
-    bpy.ops.object.delete()
-    for mesh in bpy.data.meshes:
-        if mesh.name in mesh_to_remove:
-            bpy.data.meshes.remove(mesh)
-            
-def cutting_start(obj,req_volume_ratio,req_aspects,is_sym):
+@tracer.traced
+def cutting_start(obj,req_volume_ratio,req_aspects,is_sym,run_config,registry):
     if is_sym:
-        sym_tier_1_matching(obj, req_volume_ratio, req_aspects)
+        sym_tier_1_matching(obj, req_volume_ratio, req_aspects, run_config, registry)
     else:
-        asym_tier_1_matching(obj, req_volume_ratio, req_aspects)
+        asym_tier_1_matching(obj, req_volume_ratio, req_aspects, run_config, registry)
 
 """
 Asym cuttings
 """
-def asym_tier_1_matching(obj, req_volume_ratio, req_aspects):
-    params = process_boundbox([obj.bound_box],config.tier_1_divs)
-    y_min = params["y_min"]
-    y_interval = params["y_interval"]
-    x_max_box = params["x_max_box"]
-    x_min_box = params["x_min_box"]
-    y_max_box = params["y_max_box"]
-    y_min_box = params["y_min_box"]
-    z_max_box = params["z_max_box"]
-    z_min_box = params["z_min_box"]
+@tracer.traced
+def asym_tier_1_matching(obj, req_volume_ratio, req_aspects, run_config, registry):
+    params = bb.get_points_boundbox([obj.bound_box],run_config.tier_1_divs)
+    y_min = params.y_min
+    y_interval = params.y_interval
+    x_max_box = params.x_max_box
+    x_min_box = params.x_min_box
+    y_min_box = params.y_min_box
+    z_max_box = params.z_max_box
+    z_min_box = params.z_min_box
     
-    this_y = y_min
     obj.select = False
-    divisions = []
-    cutsurface_areas = []
-    for i in range(0,config.tier_1_divs):  
-        y_near = this_y
-        this_y = this_y + y_interval
-        y_far = this_y
-        name = str.format("division_{}", i+1)
-        cuboid = None
-        if i == 0:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_far,y_min_box,z_max_box,z_min_box),name)
-        elif i == config.tier_1_divs - 1:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_max_box,y_near,z_max_box,z_min_box),name)
-        else:  
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_far,y_near,z_max_box,z_min_box),name)
-        
-        bops.perform_boolean_intersection(obj,cuboid,config.tier_1_subdivision_level)
-        divisions.append(cuboid)
-        cutsurface_areas.append(get_cut_surfaces_area(cuboid.data.vertices,cuboid.data.polygons,"y",y_near,y_far,y_interval))
-    
-    volume_ratios = get_volume_ratios("tier_1",cutsurface_areas)
-    
-    analysis.analyse_volume_approximation(obj, divisions, volume_ratios, logger)
-    
-    intermediate_cleanup()
+    table = get_cumulative_volume_table("tier_1", obj, "y", params, run_config.tier_1_divs, run_config)
     
     if config.DEBUG_MATCHING:
         logger.add_matching_log("Asym tier 1 matching starts")
         logger.add_matching_log("")
-    # Find a cut with volume just bigger than required volume
-    accumulated_volume_ratio = 0
+    # Cut holding the required volume, then the grid lines past it for tier 2 to trim down
+    y_cut = vol.solve_cut_position(table, req_volume_ratio)
+    y_fars = engine.get_grid_positions_after(y_cut, y_min, y_interval, run_config.tier_1_divs, run_config)
     cut_id = 1
-    for i in range(0,config.tier_1_divs):
+    for y_far in y_fars:
         div_id = str.format("{}", cut_id)
-        accumulated_volume_ratio += volume_ratios[i]
-        y_far = y_min + (i+1)*y_interval
-        if accumulated_volume_ratio > req_volume_ratio or arith.percentage_discrepancy(accumulated_volume_ratio, req_volume_ratio) <= config.allowed_pd_volume:
-            name = str.format("temp_cut_{}", cut_id)
-            tier_1_cut = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_far,y_min_box,z_max_box,z_min_box),name)
-            tier_1_cut["cut_box"] = {"x_max":x_max_box,"x_min":x_min_box\
-                                     ,"y_max":y_far,"y_min":y_min_box\
-                                     ,"z_max":z_max_box,"z_min":z_min_box}
-            bops.perform_boolean_intersection(obj,tier_1_cut,config.tier_1_subdivision_level)
-            is_accepted_cut = verify_cut(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,tier_1_cut)
-            if is_accepted_cut:
-                tier_1_cut.name = str.format("accepted_cut_{}", cut_id)
-                tier_1_cut.data.name = str.format("accepted_cut_{}", cut_id)
-            elif accumulated_volume_ratio > req_volume_ratio:
-                tier_1_cut.name = str.format("potential_cut_{}", cut_id)
-                tier_1_cut.data.name = str.format("potential_cut_{}", cut_id)
-                asym_tier_2_matching(cut_id, tier_1_cut, req_volume_ratio/accumulated_volume_ratio, req_aspects)
+        accumulated_volume_ratio = vol.get_cumulative_volume(table, y_far)
+        name = str.format("temp_cut_{}", cut_id)
+        tier_1_cut = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_far,y_min_box,z_max_box,z_min_box),name)
+        tier_1_cut["cut_box"] = {"x_max":x_max_box,"x_min":x_min_box\
+                                 ,"y_max":y_far,"y_min":y_min_box\
+                                 ,"z_max":z_max_box,"z_min":z_min_box}
+        bops.perform_boolean_intersection(obj,tier_1_cut,run_config.tier_1_subdivision_level)
+        is_accepted_cut = verify_cut(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,tier_1_cut,run_config)
+        if is_accepted_cut:
+            tier_1_cut.name = str.format("accepted_cut_{}", cut_id)
+            tier_1_cut.data.name = str.format("accepted_cut_{}", cut_id)
+            registry.add_cut(div_id, [tier_1_cut], "accepted", tier_1_cut['pd'])
+        elif accumulated_volume_ratio > req_volume_ratio + run_config.fp_tolerance:
+            tier_1_cut.name = str.format("potential_cut_{}", cut_id)
+            tier_1_cut.data.name = str.format("potential_cut_{}", cut_id)
+            registry.add_cut(div_id, [tier_1_cut], "potential", tier_1_cut['pd'])
+            asym_tier_2_matching(cut_id, tier_1_cut, req_volume_ratio/accumulated_volume_ratio, req_aspects, run_config, registry)
+        else:
+            registry.add_cut(div_id, [tier_1_cut], "temp", tier_1_cut['pd'])
         cut_id += 1
         
-    tier_end_cleanup()
+    registry.remove_tier_leftovers()
            
     if config.DEBUG_MATCHING:     
         logger.add_matching_log("Asym tier 1 matching ends")
         logger.add_matching_log("")
         
-def asym_tier_2_matching(tier_1_id, tier_1_cut, req_volume_ratio, req_aspects):
-    params = process_boundbox([tier_1_cut.bound_box],config.tier_2_divs)
-    x_min = params["x_min"]
-    x_max = params["x_max"]
-    x_interval = params["x_interval"]
-    x_max_box = params["x_max_box"]
-    x_min_box = params["x_min_box"]
-    y_max_box = params["y_max_box"]
-    y_min_box = params["y_min_box"]
-    z_max_box = params["z_max_box"]
-    z_min_box = params["z_min_box"]
+@tracer.traced
+def asym_tier_2_matching(tier_1_id, tier_1_cut, req_volume_ratio, req_aspects, run_config, registry):
+    params = bb.get_points_boundbox([tier_1_cut.bound_box],run_config.tier_2_divs)
+    x_min = params.x_min
+    x_max = params.x_max
+    x_interval = params.x_interval
+    y_max_box = params.y_max_box
+    y_min_box = params.y_min_box
+    z_max_box = params.z_max_box
+    z_min_box = params.z_min_box
 
-    this_x = x_min
     tier_1_cut.select = False
-    divisions = []
-    cutsurface_areas = []
-    for i in range(0,config.tier_2_divs):  
-        x_near = this_x
-        this_x = this_x + x_interval
-        x_far = this_x
-        name = str.format("division_{}", i+1)
-        cuboid = None
-        if i == 0:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_far,x_min_box,y_max_box,y_min_box,z_max_box,z_min_box),name)
-        elif i == config.tier_2_divs -1:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_near,y_max_box,y_min_box,z_max_box,z_min_box),name)
-        else:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_far,x_near,y_max_box,y_min_box,z_max_box,z_min_box),name)
-        
-        bops.perform_boolean_intersection(tier_1_cut,cuboid,config.tier_2_subdivision_level)
-        divisions.append(cuboid)
-        cutsurface_areas.append(get_cut_surfaces_area(cuboid.data.vertices,cuboid.data.polygons,"x",x_near,x_far,x_interval))
-        
-    volume_ratios = get_volume_ratios(tier_1_id,cutsurface_areas)
-    
-    analysis.analyse_volume_approximation(tier_1_cut, divisions, volume_ratios, logger)
-    
-    intermediate_cleanup()
+    table = get_cumulative_volume_table(tier_1_id, tier_1_cut, "x", params, run_config.tier_2_divs, run_config)
     
     if config.DEBUG_MATCHING:
         logger.add_matching_log("********** Asym Tier 2 matching of div {}".format(tier_1_id))
         logger.add_matching_log("")
         
-    # Find a cut with volume just bigger than required volume (symmetric case)
-    accumulated_volume_ratio = 0
+    # Cut centered in x holding the required volume, then wider ones on the grid for tier 3 to trim down
+    x_center = (x_min + x_max)/2
+    x_width = vol.solve_centered_cut_width(table, x_center, req_volume_ratio, run_config.fp_tolerance)
+    x_nears = [x_center - x_width]
+    for i in reversed(range(1,math.floor((run_config.tier_2_divs+1)/2))):
+        x_near = x_min + i*x_interval
+        if x_near < x_nears[0] - run_config.fp_tolerance:
+            x_nears.append(x_near)
     cut_id = 1
-    for i in reversed(range(1,math.floor((config.tier_2_divs+1)/2))): 
-        # Odd number of divisions, first volume is the one piece in the center
-        if config.tier_2_divs%2 == 1 and i == math.floor((config.tier_2_divs+1)/2)-1:
-            accumulated_volume_ratio += volume_ratios[i]
-        # Otherwise add the 2 pieces in the center
-        else:
-            accumulated_volume_ratio += volume_ratios[i]
-            accumulated_volume_ratio += volume_ratios[config.tier_2_divs-1-i]
-        
+    for x_near in x_nears:
         div_id = str.format("{}_{}", tier_1_id, cut_id)
-        x_near = x_min + i*x_interval
-        x_far = x_max - i*x_interval
+        x_far = x_max - (x_near - x_min)
+        accumulated_volume_ratio = vol.get_cumulative_volume(table, x_far) - vol.get_cumulative_volume(table, x_near)
         
-        if accumulated_volume_ratio > req_volume_ratio or arith.percentage_discrepancy(accumulated_volume_ratio, req_volume_ratio) <= config.allowed_pd_volume:
-            name = str.format("temp_cut_{}", div_id)
-            tier_2_cut = bops.create_cuboid(bops.generate_cuboid_verts(x_far,x_near,y_max_box,y_min_box,z_max_box,z_min_box),name)
-            tier_2_cut["cut_box"] = {"x_max":x_far,"x_min":x_near\
-                                     ,"y_max":tier_1_cut["cut_box"]["y_max"],"y_min":tier_1_cut["cut_box"]["y_min"]\
-                                     ,"z_max":z_max_box,"z_min":z_min_box}
-            bops.perform_boolean_intersection(tier_1_cut,tier_2_cut,config.tier_2_subdivision_level)
-            is_accepted_cut = verify_cut(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,tier_2_cut)
-            if is_accepted_cut:
-                tier_2_cut.name = str.format("accepted_cut_{}", div_id)
-                tier_2_cut.data.name = str.format("accepted_cut_{}", div_id)
-            elif accumulated_volume_ratio > req_volume_ratio:
-                tier_2_cut.name = str.format("potential_cut_{}", div_id)
-                tier_2_cut.data.name = str.format("potential_cut_{}", div_id)
-                asym_tier_3_matching(tier_1_id, cut_id, tier_2_cut, req_volume_ratio/accumulated_volume_ratio, req_aspects)
+        name = str.format("temp_cut_{}", div_id)
+        tier_2_cut = bops.create_cuboid(bops.generate_cuboid_verts(x_far,x_near,y_max_box,y_min_box,z_max_box,z_min_box),name)
+        tier_2_cut["cut_box"] = {"x_max":x_far,"x_min":x_near\
+                                 ,"y_max":tier_1_cut["cut_box"]["y_max"],"y_min":tier_1_cut["cut_box"]["y_min"]\
+                                 ,"z_max":z_max_box,"z_min":z_min_box}
+        bops.perform_boolean_intersection(tier_1_cut,tier_2_cut,run_config.tier_2_subdivision_level)
+        is_accepted_cut = verify_cut(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,tier_2_cut,run_config)
+        if is_accepted_cut:
+            tier_2_cut.name = str.format("accepted_cut_{}", div_id)
+            tier_2_cut.data.name = str.format("accepted_cut_{}", div_id)
+            registry.add_cut(div_id, [tier_2_cut], "accepted", tier_2_cut['pd'])
+        elif accumulated_volume_ratio > req_volume_ratio + run_config.fp_tolerance:
+            tier_2_cut.name = str.format("potential_cut_{}", div_id)
+            tier_2_cut.data.name = str.format("potential_cut_{}", div_id)
+            registry.add_cut(div_id, [tier_2_cut], "potential", tier_2_cut['pd'])
+            asym_tier_3_matching(tier_1_id, cut_id, tier_2_cut, req_volume_ratio/accumulated_volume_ratio, req_aspects, run_config, registry)
+        else:
+            registry.add_cut(div_id, [tier_2_cut], "temp", tier_2_cut['pd'])
         cut_id += 1
         
-    tier_end_cleanup()
+    registry.remove_tier_leftovers()
                 
     if config.DEBUG_MATCHING:     
         logger.add_matching_log("********** Asym tier 2 matching of div {} ends".format(tier_1_id))
         logger.add_matching_log("")
         
-def asym_tier_3_matching(tier_1_id, tier_2_id, tier_2_cut, req_volume_ratio, req_aspects):
+@tracer.traced
+def asym_tier_3_matching(tier_1_id, tier_2_id, tier_2_cut, req_volume_ratio, req_aspects, run_config, registry):
     boundboxes = []
     boundboxes.append(tier_2_cut.bound_box)
-    params = process_boundbox(boundboxes,config.tier_3_divs)
-    z_min = params["z_min"]
-    z_interval = params["z_interval"]
-    x_max_box = params["x_max_box"]
-    x_min_box = params["x_min_box"]
-    y_max_box = params["y_max_box"]
-    y_min_box = params["y_min_box"]
-    z_max_box = params["z_max_box"]
-    z_min_box = params["z_min_box"]
+    params = bb.get_points_boundbox(boundboxes,run_config.tier_3_divs)
+    z_max = params.z_max
+    x_max_box = params.x_max_box
+    x_min_box = params.x_min_box
+    y_max_box = params.y_max_box
+    y_min_box = params.y_min_box
+    z_min_box = params.z_min_box
     
-    this_z = z_min
     tier_2_cut.select = False
     
-    divisions = []
-    cutsurface_areas = []
-    for i in range(0,config.tier_3_divs):  
-        z_near = this_z
-        this_z = this_z + z_interval
-        z_far = this_z
-        name = str.format("division_{}", i+1)
-        cuboid = None
-        if i == 0:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_max_box,y_min_box,z_far,z_min_box),name)
-        elif i == config.tier_3_divs - 1:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_max_box,y_min_box,z_max_box,z_near),name)
-        else:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_max_box,y_min_box,z_far,z_near),name)
-        
-        bops.perform_boolean_intersection(tier_2_cut,cuboid,config.tier_3_subdivision_level)
-       
-        divisions.append(cuboid)
-                    
-        cutsurface_areas.append(get_cut_surfaces_area(cuboid.data.vertices,cuboid.data.polygons,"z",z_near,z_far,z_interval))
-        
-    volume_ratios = get_volume_ratios(str.format("{}_{}",tier_1_id,tier_2_id),cutsurface_areas)
-    
-    analysis.analyse_volume_approximation(tier_2_cut, divisions, volume_ratios, logger)
-    
-    intermediate_cleanup()
+    table = get_cumulative_volume_table(str.format("{}_{}",tier_1_id,tier_2_id), tier_2_cut, "z", params, run_config.tier_3_divs, run_config)
     
     if config.DEBUG_MATCHING:
         logger.add_matching_log("******************** Asym tier 3 matching of div {}_{}".format(tier_1_id, tier_2_id))
         logger.add_matching_log("")
     
-    # Find acceptable cut
-    z_near = z_min
-    z_far = z_near
-    accumulated_volume_ratio = 0
+    # Find acceptable cut, the one holding the required volume is the only candidate
+    z_far = vol.solve_cut_position(table, req_volume_ratio)
+    accumulated_volume_ratio = vol.get_cumulative_volume(table, z_far)
     cut_id = 1
-    for i in range(0,config.tier_3_divs-1):  
-        accumulated_volume_ratio += volume_ratios[i]   
-        div_id = str.format("{}_{}_{}",tier_1_id,tier_2_id,cut_id) 
-        z_far = z_near + (i+1)*z_interval 
-        
-        if arith.percentage_discrepancy(accumulated_volume_ratio, req_volume_ratio) <= config.allowed_pd_volume:
-            name = str.format("temp_cut_{}", div_id)
-            tier_3_cut = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_max_box,y_min_box,z_far,z_min_box),name)
-            tier_3_cut["cut_box"] = {"x_max":tier_2_cut["cut_box"]["x_max"],"x_min":tier_2_cut["cut_box"]["x_min"]\
-                                     ,"y_max":tier_2_cut["cut_box"]["y_max"],"y_min":tier_2_cut["cut_box"]["y_min"]\
-                                     ,"z_max":z_far,"z_min":z_min_box}
-            bops.perform_boolean_intersection(tier_2_cut,tier_3_cut,config.tier_3_subdivision_level)
-            is_accepted_cut = verify_cut(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,tier_3_cut)
-            if is_accepted_cut:
-                tier_3_cut.name = str.format("accepted_cut_{}", div_id)
-                tier_3_cut.data.name = str.format("accepted_cut_{}", div_id)
-            else:
-                tier_3_cut.name = str.format("potential_cut_{}", div_id)
-                tier_3_cut.data.name = str.format("potential_cut_{}", div_id)
-           
-        cut_id += 1
+    div_id = str.format("{}_{}_{}",tier_1_id,tier_2_id,cut_id) 
+    
+    if z_far < z_max - run_config.fp_tolerance:
+        name = str.format("temp_cut_{}", div_id)
+        tier_3_cut = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_max_box,y_min_box,z_far,z_min_box),name)
+        tier_3_cut["cut_box"] = {"x_max":tier_2_cut["cut_box"]["x_max"],"x_min":tier_2_cut["cut_box"]["x_min"]\
+                                 ,"y_max":tier_2_cut["cut_box"]["y_max"],"y_min":tier_2_cut["cut_box"]["y_min"]\
+                                 ,"z_max":z_far,"z_min":z_min_box}
+        bops.perform_boolean_intersection(tier_2_cut,tier_3_cut,run_config.tier_3_subdivision_level)
+        is_accepted_cut = verify_cut(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,tier_3_cut,run_config)
+        if is_accepted_cut:
+            tier_3_cut.name = str.format("accepted_cut_{}", div_id)
+            tier_3_cut.data.name = str.format("accepted_cut_{}", div_id)
+            registry.add_cut(div_id, [tier_3_cut], "accepted", tier_3_cut['pd'])
+        else:
+            tier_3_cut.name = str.format("potential_cut_{}", div_id)
+            tier_3_cut.data.name = str.format("potential_cut_{}", div_id)
+            registry.add_cut(div_id, [tier_3_cut], "potential", tier_3_cut['pd'])
                 
     if config.DEBUG_MATCHING:     
         logger.add_matching_log("******************** Asym tier 3 matching of div {}_{} ends".format(tier_1_id, tier_2_id))
@@ -500,153 +281,111 @@ def asym_tier_3_matching(tier_1_id, tier_2_id, tier_2_cut, req_volume_ratio, req
 """
 Symmetric cuttings
 """
-def sym_tier_1_matching(obj, req_volume_ratio, req_aspects):
-    params = process_boundbox([obj.bound_box],config.tier_1_divs)
-    y_min = params["y_min"]
-    y_interval = params["y_interval"]
-    x_max_box = params["x_max_box"]
-    x_min_box = params["x_min_box"]
-    y_max_box = params["y_max_box"]
-    y_min_box = params["y_min_box"]
-    z_max_box = params["z_max_box"]
-    z_min_box = params["z_min_box"]
+@tracer.traced
+def sym_tier_1_matching(obj, req_volume_ratio, req_aspects, run_config, registry):
+    params = bb.get_points_boundbox([obj.bound_box],run_config.tier_1_divs)
+    y_min = params.y_min
+    y_interval = params.y_interval
+    x_max_box = params.x_max_box
+    x_min_box = params.x_min_box
+    y_min_box = params.y_min_box
+    z_max_box = params.z_max_box
+    z_min_box = params.z_min_box
     
-    this_y = y_min
     obj.select = False
-    divisions = []
-    cutsurface_areas = []
-    for i in range(0,config.tier_1_divs):  
-        y_near = this_y
-        this_y = this_y + y_interval
-        y_far = this_y
-        name = str.format("division_{}", i+1)
-        cuboid = None
-        if i == 0:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_far,y_min_box,z_max_box,z_min_box),name)
-        elif i == config.tier_1_divs - 1:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_max_box,y_near,z_max_box,z_min_box),name)
-        else:  
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_far,y_near,z_max_box,z_min_box),name)
-        
-        bops.perform_boolean_intersection(obj,cuboid,config.tier_1_subdivision_level)
-        divisions.append(cuboid)
-        cutsurface_areas.append(get_cut_surfaces_area(cuboid.data.vertices,cuboid.data.polygons,"y",y_near,y_far,y_interval))
-    
-    volume_ratios = get_volume_ratios("tier_1",cutsurface_areas)
-    
-    analysis.analyse_volume_approximation(obj, divisions, volume_ratios, logger)
-    
-    intermediate_cleanup()
+    table = get_cumulative_volume_table("tier_1", obj, "y", params, run_config.tier_1_divs, run_config)
     
     if config.DEBUG_MATCHING:
         logger.add_matching_log("Symmetric tier 1 matching starts")
         logger.add_matching_log("")
-    # Find a cut with volume just bigger than required volume
-    accumulated_volume_ratio = 0
+    # Cut holding the required volume, then the grid lines past it
+    # twice the required volume ratio is used here since we need to cut 2 parts
+    y_cut = vol.solve_cut_position(table, 2*req_volume_ratio)
+    y_fars = engine.get_grid_positions_after(y_cut, y_min, y_interval, run_config.tier_1_divs, run_config)
     cut_id = 1
-    for i in range(0,config.tier_1_divs):
-        accumulated_volume_ratio += volume_ratios[i]
-        y_far = y_min + (i+1)*y_interval
-        # twice the required volume ratio is used here since we need to cut 2 parts
-        if accumulated_volume_ratio > 2*req_volume_ratio or arith.percentage_discrepancy(accumulated_volume_ratio, 2*req_volume_ratio) <= config.allowed_pd_volume:
-            name = str.format("potential_cut_{}", cut_id)
-            tier_1_cut = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_far,y_min_box,z_max_box,z_min_box),name)
-            tier_1_cut["cut_box"] = {"x_max":x_max_box,"x_min":x_min_box\
-                                     ,"y_max":y_far,"y_min":y_min_box\
-                                     ,"z_max":z_max_box,"z_min":z_min_box}
-            bops.perform_boolean_intersection(obj,tier_1_cut,config.tier_1_subdivision_level)
-            tier_1_cut['pd'] = -1
-            sym_tier_2_matching(cut_id, tier_1_cut, req_volume_ratio/accumulated_volume_ratio, req_aspects)
+    for y_far in y_fars:
+        accumulated_volume_ratio = vol.get_cumulative_volume(table, y_far)
+        name = str.format("potential_cut_{}", cut_id)
+        tier_1_cut = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_far,y_min_box,z_max_box,z_min_box),name)
+        tier_1_cut["cut_box"] = {"x_max":x_max_box,"x_min":x_min_box\
+                                 ,"y_max":y_far,"y_min":y_min_box\
+                                 ,"z_max":z_max_box,"z_min":z_min_box}
+        bops.perform_boolean_intersection(obj,tier_1_cut,run_config.tier_1_subdivision_level)
+        tier_1_cut['pd'] = -1
+        registry.add_cut(str.format("{}", cut_id), [tier_1_cut], "potential", -1)
+        sym_tier_2_matching(cut_id, tier_1_cut, req_volume_ratio/accumulated_volume_ratio, req_aspects, run_config, registry)
         cut_id += 1
         
-    tier_end_cleanup()
+    registry.remove_tier_leftovers()
            
     if config.DEBUG_MATCHING:     
         logger.add_matching_log("Symmetric tier 1 matching ends")
         logger.add_matching_log("")
     
-def sym_tier_2_matching(tier_1_id, tier_1_cut, req_volume_ratio, req_aspects):
-    params = process_boundbox([tier_1_cut.bound_box],config.tier_2_divs)
-    x_min = params["x_min"]
-    x_max = params["x_max"]
-    x_interval = params["x_interval"]
-    x_max_box = params["x_max_box"]
-    x_min_box = params["x_min_box"]
-    y_max_box = params["y_max_box"]
-    y_min_box = params["y_min_box"]
-    z_max_box = params["z_max_box"]
-    z_min_box = params["z_min_box"]
+@tracer.traced
+def sym_tier_2_matching(tier_1_id, tier_1_cut, req_volume_ratio, req_aspects, run_config, registry):
+    params = bb.get_points_boundbox([tier_1_cut.bound_box],run_config.tier_2_divs)
+    x_min = params.x_min
+    x_max = params.x_max
+    x_interval = params.x_interval
+    x_max_box = params.x_max_box
+    x_min_box = params.x_min_box
+    y_max_box = params.y_max_box
+    y_min_box = params.y_min_box
+    z_max_box = params.z_max_box
+    z_min_box = params.z_min_box
 
-    this_x = x_min
     tier_1_cut.select = False
-    divisions = []
-    cutsurface_areas = []
-    for i in range(0,config.tier_2_divs):  
-        x_near = this_x
-        this_x = this_x + x_interval
-        x_far = this_x
-        name = str.format("division_{}", i+1)
-        cuboid = None
-        if i == 0:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_far,x_min_box,y_max_box,y_min_box,z_max_box,z_min_box),name)
-        elif i == config.tier_2_divs -1:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_near,y_max_box,y_min_box,z_max_box,z_min_box),name)
-        else:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_far,x_near,y_max_box,y_min_box,z_max_box,z_min_box),name)
-        
-        bops.perform_boolean_intersection(tier_1_cut,cuboid,config.tier_2_subdivision_level)
-        divisions.append(cuboid)
-        cutsurface_areas.append(get_cut_surfaces_area(cuboid.data.vertices,cuboid.data.polygons,"x",x_near,x_far,x_interval))
-    
-    volume_ratios = get_volume_ratios(tier_1_id,cutsurface_areas)
-    
-    analysis.analyse_volume_approximation(tier_1_cut, divisions, volume_ratios, logger)
-    
-    intermediate_cleanup()
+    table = get_cumulative_volume_table(tier_1_id, tier_1_cut, "x", params, run_config.tier_2_divs, run_config)
 
     if config.DEBUG_MATCHING:
         logger.add_matching_log("********** Tier 2 sym matching of div {}".format(tier_1_id))
         logger.add_matching_log("")
         
-    # Find a cut with volume just bigger than required volume (symmetric case)
-    accumulated_volume_ratio = 0
+    # Cut on the negative side holding the required volume, then the grid lines past it up to the center
+    x_cut = vol.solve_cut_position(table, req_volume_ratio)
+    x_nears = engine.get_grid_positions_after(x_cut, x_min, x_interval, math.floor((run_config.tier_2_divs)/2), run_config)
     cut_id = 1
-    for i in range(0,math.floor((config.tier_2_divs)/2)):  
-        accumulated_volume_ratio += volume_ratios[i]
+    for x_near in x_nears:
+        accumulated_volume_ratio = vol.get_cumulative_volume(table, x_near)
         div_id = str.format("{}_{}", tier_1_id, cut_id)
-        x_near = x_min + (i+1)*x_interval
-        x_far = x_max - (i+1)*x_interval
+        x_far = x_max - (x_near - x_min)
+        if x_far < x_near:
+            break
         
-        if accumulated_volume_ratio > req_volume_ratio or arith.percentage_discrepancy(accumulated_volume_ratio, req_volume_ratio) <= config.allowed_pd_volume:
-            name = str.format("temp_cut_{}", div_id)
-            pos_name = str.format("{}_pos",name)
-            neg_name = str.format("{}_neg",name)
-            tier_2_cut_pos = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_far,y_max_box,y_min_box,z_max_box,z_min_box),pos_name)
-            tier_2_cut_pos["cut_box"] = {"x_max":x_max_box,"x_min":x_far\
-                                         ,"y_max":tier_1_cut["cut_box"]["y_max"],"y_min":tier_1_cut["cut_box"]["y_min"]\
-                                         ,"z_max":z_max_box,"z_min":z_min_box}
-            tier_2_cut_neg = bops.create_cuboid(bops.generate_cuboid_verts(x_near,x_min_box,y_max_box,y_min_box,z_max_box,z_min_box),neg_name)
-            tier_2_cut_neg["cut_box"] = {"x_max":x_near,"x_min":x_min_box\
-                                         ,"y_max":tier_1_cut["cut_box"]["y_max"],"y_min":tier_1_cut["cut_box"]["y_min"]\
-                                         ,"z_max":z_max_box,"z_min":z_min_box}
-            bops.perform_boolean_intersection(tier_1_cut,tier_2_cut_pos,config.tier_2_subdivision_level)
-            bops.perform_boolean_intersection(tier_1_cut,tier_2_cut_neg,config.tier_2_subdivision_level)
-            is_accepted_cut = verify_cut(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,tier_2_cut_pos)
-            tier_2_cut_neg['pd'] =tier_2_cut_pos['pd']
-            if is_accepted_cut:
-                tier_2_cut_pos.name = str.format("accepted_cut_{}_pos", div_id)
-                tier_2_cut_pos.data.name = str.format("accepted_cut_{}_pos", div_id)
-                tier_2_cut_neg.name = str.format("accepted_cut_{}_neg", div_id)
-                tier_2_cut_neg.data.name = str.format("accepted_cut_{}_neg", div_id)
-            elif accumulated_volume_ratio > req_volume_ratio:
-                tier_2_cut_pos.name = str.format("potential_cut_{}_pos", div_id)
-                tier_2_cut_pos.data.name = str.format("potential_cut_{}_pos", div_id)
-                tier_2_cut_neg.name = str.format("potential_cut_{}_neg", div_id)
-                tier_2_cut_neg.data.name = str.format("potential_cut_{}_neg", div_id)
-                sym_tier_3_matching(tier_1_id, cut_id, [tier_2_cut_pos, tier_2_cut_neg], req_volume_ratio/accumulated_volume_ratio, req_aspects)
+        name = str.format("temp_cut_{}", div_id)
+        pos_name = str.format("{}_pos",name)
+        neg_name = str.format("{}_neg",name)
+        tier_2_cut_pos = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_far,y_max_box,y_min_box,z_max_box,z_min_box),pos_name)
+        tier_2_cut_pos["cut_box"] = {"x_max":x_max_box,"x_min":x_far\
+                                     ,"y_max":tier_1_cut["cut_box"]["y_max"],"y_min":tier_1_cut["cut_box"]["y_min"]\
+                                     ,"z_max":z_max_box,"z_min":z_min_box}
+        tier_2_cut_neg = bops.create_cuboid(bops.generate_cuboid_verts(x_near,x_min_box,y_max_box,y_min_box,z_max_box,z_min_box),neg_name)
+        tier_2_cut_neg["cut_box"] = {"x_max":x_near,"x_min":x_min_box\
+                                     ,"y_max":tier_1_cut["cut_box"]["y_max"],"y_min":tier_1_cut["cut_box"]["y_min"]\
+                                     ,"z_max":z_max_box,"z_min":z_min_box}
+        bops.perform_boolean_intersection(tier_1_cut,tier_2_cut_pos,run_config.tier_2_subdivision_level)
+        bops.perform_boolean_intersection(tier_1_cut,tier_2_cut_neg,run_config.tier_2_subdivision_level)
+        is_accepted_cut = verify_cut(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,tier_2_cut_pos,run_config)
+        tier_2_cut_neg['pd'] =tier_2_cut_pos['pd']
+        if is_accepted_cut:
+            tier_2_cut_pos.name = str.format("accepted_cut_{}_pos", div_id)
+            tier_2_cut_pos.data.name = str.format("accepted_cut_{}_pos", div_id)
+            tier_2_cut_neg.name = str.format("accepted_cut_{}_neg", div_id)
+            tier_2_cut_neg.data.name = str.format("accepted_cut_{}_neg", div_id)
+            registry.add_cut(div_id, [tier_2_cut_pos, tier_2_cut_neg], "accepted", tier_2_cut_pos['pd'])
+        elif accumulated_volume_ratio > req_volume_ratio + run_config.fp_tolerance:
+            tier_2_cut_pos.name = str.format("potential_cut_{}_pos", div_id)
+            tier_2_cut_pos.data.name = str.format("potential_cut_{}_pos", div_id)
+            tier_2_cut_neg.name = str.format("potential_cut_{}_neg", div_id)
+            tier_2_cut_neg.data.name = str.format("potential_cut_{}_neg", div_id)
+            registry.add_cut(div_id, [tier_2_cut_pos, tier_2_cut_neg], "potential", tier_2_cut_pos['pd'])
+            sym_tier_3_matching(tier_1_id, cut_id, [tier_2_cut_pos, tier_2_cut_neg], req_volume_ratio/accumulated_volume_ratio, req_aspects, run_config, registry)
+        else:
+            registry.add_cut(div_id, [tier_2_cut_pos, tier_2_cut_neg], "temp", tier_2_cut_pos['pd'])
         cut_id += 1
         
-    tier_end_cleanup()
+    registry.remove_tier_leftovers()
                 
     if config.DEBUG_MATCHING:     
         logger.add_matching_log("********** Tier 2 sym matching of div {} ends".format(tier_1_id))
@@ -655,104 +394,70 @@ def sym_tier_2_matching(tier_1_id, tier_1_cut, req_volume_ratio, req_aspects):
 """
 tier_2_cuts is a list containing [pos_cut, neg_cut] or one cut only
 """
-def sym_tier_3_matching(tier_1_id, tier_2_id, tier_2_cuts, req_volume_ratio, req_aspects):
+@tracer.traced
+def sym_tier_3_matching(tier_1_id, tier_2_id, tier_2_cuts, req_volume_ratio, req_aspects, run_config, registry):
     boundboxes = []
     for tier_2_cut in tier_2_cuts:
         boundboxes.append(tier_2_cut.bound_box)
-    params = process_boundbox(boundboxes,config.tier_3_divs)
-    z_min = params["z_min"]
-    z_interval = params["z_interval"]
-    x_interval = params["x_interval"]
-    x_max_box = params["x_max_box"]
-    x_min_box = params["x_min_box"]
-    y_max_box = params["y_max_box"]
-    y_min_box = params["y_min_box"]
-    z_max_box = params["z_max_box"]
-    z_min_box = params["z_min_box"]
+    params = bb.get_points_boundbox(boundboxes,run_config.tier_3_divs)
+    z_max = params.z_max
+    x_interval = params.x_interval
+    x_max_box = params.x_max_box
+    x_min_box = params.x_min_box
+    y_max_box = params.y_max_box
+    y_min_box = params.y_min_box
+    z_min_box = params.z_min_box
     
-    this_z = z_min
     for tier_2_cut in tier_2_cuts:
         tier_2_cut.select = False
     
     if len(tier_2_cuts) != 2:
         logger.add_error_log(str.format("Error at symmetric tier 3 cut, should pass in 2 cuts"))
         return
-    divisions = []
-    cutsurface_areas = []
-    for i in range(0,config.tier_3_divs):  
-        z_near = this_z
-        this_z = this_z + z_interval
-        z_far = this_z
-        name = str.format("division_{}", i+1)
-        cuboid = None
-        if i == 0:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_max_box,y_min_box,z_far,z_min_box),name)
-        elif i == config.tier_3_divs - 1:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_max_box,y_min_box,z_max_box,z_near),name)
-        else:
-            cuboid = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_min_box,y_max_box,y_min_box,z_far,z_near),name)
-        
-        bops.perform_boolean_intersection(tier_2_cuts[0],cuboid,config.tier_3_subdivision_level)
-       
-        divisions.append(cuboid)
-                    
-        cutsurface_areas.append(get_cut_surfaces_area(cuboid.data.vertices,cuboid.data.polygons,"z",z_near,z_far,z_interval))
-        
-    volume_ratios = get_volume_ratios(str.format("{}_{}",tier_1_id,tier_2_id),cutsurface_areas)
-    
-    analysis.analyse_volume_approximation(tier_2_cuts[0], divisions, volume_ratios, logger)
-    
-    intermediate_cleanup()
+    table = get_cumulative_volume_table(str.format("{}_{}",tier_1_id,tier_2_id), tier_2_cuts[0], "z", params, run_config.tier_3_divs, run_config)
     
     if config.DEBUG_MATCHING:
         logger.add_matching_log("******************** Tier 3 matching of div {}_{}".format(tier_1_id, tier_2_id))
         logger.add_matching_log("")
     
-    # Find acceptable cut
-    z_near = z_min
-    z_far = z_near
-    accumulated_volume_ratio = 0
+    # Find acceptable cut, the one holding the required volume is the only candidate
+    z_far = vol.solve_cut_position(table, req_volume_ratio)
+    accumulated_volume_ratio = vol.get_cumulative_volume(table, z_far)
     cut_id = 1
-    for i in range(0,config.tier_3_divs-1):  
-        accumulated_volume_ratio += volume_ratios[i]  
-        div_id = str.format("{}_{}_{}",tier_1_id,tier_2_id,cut_id) 
-        z_far = z_near + (i+1)*z_interval 
-        
-        if arith.percentage_discrepancy(accumulated_volume_ratio, req_volume_ratio) <= config.allowed_pd_volume:
-            name = str.format("temp_cut_{}", div_id)
-            pos_name = str.format("{}_pos",name)
-            neg_name = str.format("{}_neg",name)
-            x_center = (x_max_box + x_min_box)/2
-            x_pos = x_center - x_interval
-            x_neg = x_center + x_interval
-            tier_3_cut_pos = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_pos,y_max_box,y_min_box,z_far,z_min_box),pos_name)
-            tier_3_cut_pos["cut_box"] = {"x_max":tier_2_cuts[0]["cut_box"]["x_max"],"x_min":tier_2_cuts[0]["cut_box"]["x_min"]\
-                                         ,"y_max":tier_2_cuts[0]["cut_box"]["y_max"],"y_min":tier_2_cuts[0]["cut_box"]["y_min"]\
-                                         ,"z_max":z_far,"z_min":z_min_box}
-            tier_3_cut_neg = bops.create_cuboid(bops.generate_cuboid_verts(x_neg,x_min_box,y_max_box,y_min_box,z_far,z_min_box),neg_name)
-            tier_3_cut_neg["cut_box"] = {"x_max":tier_2_cuts[1]["cut_box"]["x_max"],"x_min":tier_2_cuts[1]["cut_box"]["x_min"]\
-                                         ,"y_max":tier_2_cuts[1]["cut_box"]["y_max"],"y_min":tier_2_cuts[1]["cut_box"]["y_min"]\
-                                         ,"z_max":z_far,"z_min":z_min_box}
-            bops.perform_boolean_intersection(tier_2_cuts[0],tier_3_cut_pos,config.tier_3_subdivision_level)
-            bops.perform_boolean_intersection(tier_2_cuts[1],tier_3_cut_neg,config.tier_3_subdivision_level)
-            is_accepted_cut = verify_cut(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,tier_3_cut_pos)
-            tier_3_cut_neg['pd'] =tier_3_cut_pos['pd']
-            if is_accepted_cut:
-                tier_3_cut_pos.name = str.format("accepted_cut_{}_pos", div_id)
-                tier_3_cut_pos.data.name = str.format("accepted_cut_{}_pos", div_id)
-                tier_3_cut_neg.name = str.format("accepted_cut_{}_neg", div_id)
-                tier_3_cut_neg.data.name = str.format("accepted_cut_{}_neg", div_id)
-            else:
-                tier_3_cut_pos.name = str.format("potential_cut_{}_pos", div_id)
-                tier_3_cut_pos.data.name = str.format("potential_cut_{}_pos", div_id)
-                tier_3_cut_neg.name = str.format("potential_cut_{}_neg", div_id)
-                tier_3_cut_neg.data.name = str.format("potential_cut_{}_neg", div_id)
-           
-        cut_id += 1
+    div_id = str.format("{}_{}_{}",tier_1_id,tier_2_id,cut_id) 
+    
+    if z_far < z_max - run_config.fp_tolerance:
+        name = str.format("temp_cut_{}", div_id)
+        pos_name = str.format("{}_pos",name)
+        neg_name = str.format("{}_neg",name)
+        x_center = (x_max_box + x_min_box)/2
+        x_pos = x_center - x_interval
+        x_neg = x_center + x_interval
+        tier_3_cut_pos = bops.create_cuboid(bops.generate_cuboid_verts(x_max_box,x_pos,y_max_box,y_min_box,z_far,z_min_box),pos_name)
+        tier_3_cut_pos["cut_box"] = {"x_max":tier_2_cuts[0]["cut_box"]["x_max"],"x_min":tier_2_cuts[0]["cut_box"]["x_min"]\
+                                     ,"y_max":tier_2_cuts[0]["cut_box"]["y_max"],"y_min":tier_2_cuts[0]["cut_box"]["y_min"]\
+                                     ,"z_max":z_far,"z_min":z_min_box}
+        tier_3_cut_neg = bops.create_cuboid(bops.generate_cuboid_verts(x_neg,x_min_box,y_max_box,y_min_box,z_far,z_min_box),neg_name)
+        tier_3_cut_neg["cut_box"] = {"x_max":tier_2_cuts[1]["cut_box"]["x_max"],"x_min":tier_2_cuts[1]["cut_box"]["x_min"]\
+                                     ,"y_max":tier_2_cuts[1]["cut_box"]["y_max"],"y_min":tier_2_cuts[1]["cut_box"]["y_min"]\
+                                     ,"z_max":z_far,"z_min":z_min_box}
+        bops.perform_boolean_intersection(tier_2_cuts[0],tier_3_cut_pos,run_config.tier_3_subdivision_level)
+        bops.perform_boolean_intersection(tier_2_cuts[1],tier_3_cut_neg,run_config.tier_3_subdivision_level)
+        is_accepted_cut = verify_cut(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,tier_3_cut_pos,run_config)
+        tier_3_cut_neg['pd'] =tier_3_cut_pos['pd']
+        if is_accepted_cut:
+            tier_3_cut_pos.name = str.format("accepted_cut_{}_pos", div_id)
+            tier_3_cut_pos.data.name = str.format("accepted_cut_{}_pos", div_id)
+            tier_3_cut_neg.name = str.format("accepted_cut_{}_neg", div_id)
+            tier_3_cut_neg.data.name = str.format("accepted_cut_{}_neg", div_id)
+            registry.add_cut(div_id, [tier_3_cut_pos, tier_3_cut_neg], "accepted", tier_3_cut_pos['pd'])
+        else:
+            tier_3_cut_pos.name = str.format("potential_cut_{}_pos", div_id)
+            tier_3_cut_pos.data.name = str.format("potential_cut_{}_pos", div_id)
+            tier_3_cut_neg.name = str.format("potential_cut_{}_neg", div_id)
+            tier_3_cut_neg.data.name = str.format("potential_cut_{}_neg", div_id)
+            registry.add_cut(div_id, [tier_3_cut_pos, tier_3_cut_neg], "potential", tier_3_cut_pos['pd'])
                 
     if config.DEBUG_MATCHING:     
         logger.add_matching_log("******************** Tier 3 matching of div {}_{} ends".format(tier_1_id, tier_2_id))
         logger.add_matching_log("")
-
-            
-            
\ No newline at end of file
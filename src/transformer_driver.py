@@ -10,8 +10,15 @@ import random
 import blender_ops_helper as bops
 import transformer_config as config
 import transformer_cutting as cutter
+import transformer_engine as engine
+import transformer_tracer as tracer
 import vector_helper as vec
+import volume_helper as vol
 
+from CutRegistry import CutRegistry
+from CuboidPool import CuboidPool
+from DatablockArena import DatablockArena
+from PieceArchive import get_plan_records, write_archive
 from TransformerLogger import TransformerLogger
 
 # Logger
@@ -21,6 +28,7 @@ logger = TransformerLogger()
 Remove all objects created
 and flush all associated meshes
 """
+@tracer.traced
 def cut_cleanup(): 
     objects = bpy.data.objects
     for obj in objects:
@@ -33,177 +41,168 @@ def cut_cleanup():
             bpy.data.meshes.remove(mesh)
             
 """
-Remove all intermediate objects created
-and flush all associated meshes
+Cut out the cut with the smallest pd
+Return its id, None if there is no cut
 """
-def intermediate_cleanup():
-    objects = bpy.data.objects
-    for obj in objects:
-        obj.select = False
-        if "division" in obj.name or "assist" in obj.name:
-            obj.select = True
-    bpy.ops.object.delete()
-    for mesh in bpy.data.meshes:
-        if "division" in mesh.name or "assist" in mesh.name:
-            bpy.data.meshes.remove(mesh)
-
-def perform_best_cut(obj):
-    objects = bpy.data.objects
-    
-    # Find the best cut
-    best_cut = None
-    best_pd = 0
-    for cut in objects:
-        cut.select = False
-        if "cut" in cut.name:
-            if best_cut == None:
-                best_cut = cut
-                best_pd = cut["pd"]
-            elif best_pd > cut["pd"]:
-                best_cut = cut
-                best_pd = cut["pd"]
-    
-    if best_cut == None:
+def perform_best_cut(obj,registry,run_config):
+    best_id = registry.get_best_id()
+    if best_id == None:
         logger.add_error_log("no best cut found, which is to say no cut found....")
-        return
-    perform_specific_cut(obj,best_cut.name)
+        return None
+    perform_specific_cut(obj,registry,best_id,run_config)
+    return best_id
     
-def perform_picky_cut(obj,pick_range):
-    objects = bpy.data.objects
-    
-    # Find the cuts in range
-    candidates = []
-    for cut in objects:
-        cut.select = False
-        if "cut" in cut.name:
-            if math.floor(cut["pd"]*100) in pick_range:
-                candidates.append(cut)
-    
-    chosen_cut = None
-    if len(candidates) >= 1:
-        pick_id = random.randint(0,len(candidates)-1)
-        chosen_cut =candidates[pick_id]
-    else:
-        perform_best_cut(obj)
-        return
+"""
+Cut out a random cut with pd in pick_range, the best one if there is none
+Return its id
+"""
+def perform_picky_cut(obj,registry,pick_range,run_config):
+    candidate_ids = registry.get_ids_in_range(pick_range)
+    if len(candidate_ids) == 0:
+        return perform_best_cut(obj,registry,run_config)
     
-    perform_specific_cut(obj,chosen_cut.name)
+    chosen_id = candidate_ids[random.randint(0,len(candidate_ids)-1)]
+    perform_specific_cut(obj,registry,chosen_id,run_config)
+    return chosen_id
     
 """
-Do specific cut with input name
+Do specific cut with input division id, every other cut is removed
 """
-def perform_specific_cut(obj,input_name):
-    objects = bpy.data.objects
-    chosen_name = input_name
-    if "neg" in chosen_name or "pos" in chosen_name:
-        chosen_name = chosen_name[0:-4]
-    
-    pending_cuts = []
-    mesh_to_remove = []
-    for cut in objects:
-        cut.select = False
-        if "cut" in cut.name:
-            if "neg" in cut.name or "pos" in cut.name:
-                if chosen_name == cut.name[0:-4]:
-                    pending_cuts.append(cut)
-                else:
-                    mesh_to_remove.append(cut.name)
-                    cut.select = True
-            else:
-                if chosen_name == cut.name:
-                    pending_cuts.append(cut)
-                else:
-                    mesh_to_remove.append(cut.name)
-                    cut.select = True
-            
-    bpy.ops.object.delete()
-    for mesh in bpy.data.meshes:
-        if mesh.name in mesh_to_remove:
-            bpy.data.meshes.remove(mesh)
-            
+def perform_specific_cut(obj,registry,div_id,run_config):
+    registry.remove_all_except(div_id)
+    pending_cuts = registry.get_cuts(div_id)
+    div_level = get_subdivision_level(div_id.count("_"),run_config)
+    subtract_cut_boxes(obj,[cut["cut_box"] for cut in pending_cuts],[div_level]*len(pending_cuts),run_config)
+
+"""
+Get subdivision level of the boolean taking out a cut made at tier_id_depth,
+the number of '_' in its division id
+"""
+def get_subdivision_level(tier_id_depth,run_config):
+    if tier_id_depth >= 2:
+        return run_config.tier_3_subdivision_level
+    elif tier_id_depth == 1:
+        return run_config.tier_2_subdivision_level
+    return run_config.tier_1_subdivision_level
+
+"""
+Take the cut boxes out of obj with boolean differences
+div_levels holds the subdivision level for every box
+"""
+def subtract_cut_boxes(obj,cut_boxes,div_levels,run_config):
     # Handle the case where 2 tier 2 cuts are joint and hence boolean operation will be bugged
-    if len(pending_cuts) == 2:
-        x_max_0 = pending_cuts[0]["cut_box"]["x_max"]
-        x_max_1 = pending_cuts[1]["cut_box"]["x_max"]
-        x_min_0 = pending_cuts[0]["cut_box"]["x_min"]
-        x_min_1 = pending_cuts[1]["cut_box"]["x_min"]
+    if len(cut_boxes) == 2:
+        x_max_0 = cut_boxes[0]["x_max"]
+        x_max_1 = cut_boxes[1]["x_max"]
+        x_min_0 = cut_boxes[0]["x_min"]
+        x_min_1 = cut_boxes[1]["x_min"]
         x_max = 0
         x_min = 0
         is_joint = False
-        if math.fabs(x_max_0 - x_min_1) <= config.fp_tolerance:
+        if math.fabs(x_max_0 - x_min_1) <= run_config.fp_tolerance:
             is_joint = True
             x_max = x_max_1
             x_min = x_min_0
-        elif math.fabs(x_max_1 - x_min_0) <= config.fp_tolerance:
+        elif math.fabs(x_max_1 - x_min_0) <= run_config.fp_tolerance:
             is_joint = True
             x_max = x_max_0
             x_min = x_min_1
         
         if is_joint:
-            y_max = pending_cuts[0]["cut_box"]["y_max"]
-            y_min = pending_cuts[0]["cut_box"]["y_min"]
-            z_max = pending_cuts[0]["cut_box"]["z_max"]
-            z_min = pending_cuts[0]["cut_box"]["z_min"]
+            y_max = cut_boxes[0]["y_max"]
+            y_min = cut_boxes[0]["y_min"]
+            z_max = cut_boxes[0]["z_max"]
+            z_min = cut_boxes[0]["z_min"]
             assist = bops.create_cuboid(bops.generate_cuboid_verts(x_max,x_min,y_max,y_min,z_max,z_min),"assist")
-            div_level = config.tier_1_subdivision_level
-            i = pending_cuts[0].name.count("_")
-            if i>= 4:
-                div_level = config.tier_3_subdivision_level
-            elif i == 3:
-                div_level = config.tier_2_subdivision_level
-            else:
-                div_level = config.tier_1_subdivision_level
-            div_level = div_level * 2
+            div_level = div_levels[0] * 2
             bops.perform_boolean_difference(assist,obj,div_level)
             
-            intermediate_cleanup()
+            bops.remove_objects([assist])
             return
     
     # Handle normal case
-    for cut in pending_cuts:
-        x_max = cut["cut_box"]["x_max"]
-        x_min = cut["cut_box"]["x_min"]
-        y_max = cut["cut_box"]["y_max"]
-        y_min = cut["cut_box"]["y_min"]
-        z_max = cut["cut_box"]["z_max"]
-        z_min = cut["cut_box"]["z_min"]
-        assist = bops.create_cuboid(bops.generate_cuboid_verts(x_max,x_min,y_max,y_min,z_max,z_min),"assist")
-        div_level = config.tier_1_subdivision_level
-        i = cut.name.count("_")
-        if i>= 4:
-            div_level = config.tier_3_subdivision_level
-        elif i == 3:
-            div_level = config.tier_2_subdivision_level
-        else:
-            div_level = config.tier_1_subdivision_level
-        bops.perform_boolean_difference(assist,obj,div_level)
+    assists = []
+    for i in range(0,len(cut_boxes)):
+        cut_box = cut_boxes[i]
+        assist = bops.create_cuboid(bops.generate_cuboid_verts(cut_box["x_max"],cut_box["x_min"],cut_box["y_max"],cut_box["y_min"],cut_box["z_max"],cut_box["z_min"]),"assist")
+        bops.perform_boolean_difference(assist,obj,div_levels[i])
+        assists.append(assist)
         
-    intermediate_cleanup()
+    bops.remove_objects(assists)
+
+"""
+Turn the candidate chosen by the engine into geometry, the only booleans of a deferred cut request
+Each cut box is intersected with obj into a piece named after name, then taken out of obj
+Return list of TransformerMesh of the pieces, in the coordinates of obj
+"""
+def perform_deferred_cut(obj,candidate,name,run_config):
+    cut_boxes = candidate["cut_boxes"]
+    names = [name]
+    if len(cut_boxes) == 2:
+        names = [str.format("{}_pos", name), str.format("{}_neg", name)]
+    div_level = get_subdivision_level(candidate["id"].count("_"),run_config)
+    
+    obj.select = False
+    pieces = []
+    for i in range(0,len(cut_boxes)):
+        cut_box = cut_boxes[i]
+        logger.add_choice_log(str.format("cut {} is taken as {}",candidate["id"],names[i]))
+        cut = bops.create_cuboid(bops.generate_cuboid_verts(cut_box["x_max"],cut_box["x_min"],cut_box["y_max"],cut_box["y_min"],cut_box["z_max"],cut_box["z_min"]),names[i])
+        cut["cut_box"] = cut_box
+        cut["pd"] = candidate["pd"]
+        bops.perform_boolean_intersection(obj,cut,div_level)
+        pieces.append(bops.get_transformer_mesh(cut))
+        bops.set_object_origin(cut)
+        bops.keep_objects([cut])
+    subtract_cut_boxes(obj,cut_boxes,[div_level]*len(cut_boxes),run_config)
+    logger.add_choice_log("")
+    return pieces
 
 """
 Rename cut obtained and set origin to center of mass
+The cut is released from the registry as it is no longer a candidate
+Return list of TransformerMesh of the cuts, in the coordinates they had before their origin was set
 """
-def process_cutting_results(name):
-    objects = bpy.data.objects
-    for cut in objects:
-        if "cut" in cut.name:
-            if "pos" in cut.name:
-                new_name = str.format("{}_pos", name)
-                logger.add_choice_log(str.format("{} is renamed as {}",cut.name,new_name))
-                cut.name = new_name
-                cut.data.name = new_name
-            elif "neg" in cut.name:
-                new_name = str.format("{}_neg", name)
-                logger.add_choice_log(str.format("{} is renamed as {}",cut.name,new_name))
-                cut.name = new_name
-                cut.data.name = new_name
-            else:
-                logger.add_choice_log(str.format("{} is renamed as {}",cut.name,name))
-                cut.name = name
-                cut.data.name = name
-            bops.set_object_origin(cut)
+def process_cutting_results(registry,div_id,name):
+    cuts = registry.get_cuts(div_id)
+    new_names = [name]
+    if len(cuts) == 2:
+        new_names = [str.format("{}_pos", name), str.format("{}_neg", name)]
+    registry.release_cut(div_id)
+    bops.keep_objects(cuts)
+    pieces = []
+    for i in range(0,len(cuts)):
+        cut = cuts[i]
+        logger.add_choice_log(str.format("{} is renamed as {}",cut.name,new_names[i]))
+        cut.name = new_names[i]
+        cut.data.name = new_names[i]
+        pieces.append(bops.get_transformer_mesh(cut))
+        bops.set_object_origin(cut)
     logger.add_choice_log("")
-    
+    return pieces
+
+"""
+Get the TransformerMesh of obj after pieces were cut out of it, mesh being the one it had before
+Volume profiles of mesh are handed down less the pieces like engine.perform_cut does, so matching
+the next cut request does not go over the whole object again.
+With config.DEBUG_MATCHING they are checked against the volume of obj, and built again from obj when
+the booleans left a volume further than fp_tolerance of the whole from the one they give
+"""
+def get_remaining_mesh(obj,mesh,pieces,total_volume,run_config):
+    remaining = bops.get_transformer_mesh(obj)
+    for axis, profile in mesh.get_volume_profiles().items():
+        for piece in pieces:
+            profile = profile.subtract(piece.get_triangle_verts())
+        remaining.set_volume_profile(axis, profile)
+    if not config.DEBUG_MATCHING:
+        return remaining
+    volume = vol.get_volume(remaining.get_triangle_verts())
+    if math.fabs(volume - remaining.get_volume()) > run_config.fp_tolerance*total_volume:
+        logger.add_matching_log(str.format("Volume profiles of {} are off the booleans by {}, rebuilt", obj.name, volume - remaining.get_volume()))
+        remaining = bops.get_transformer_mesh(obj)
+        remaining.get_volume_profile(1)
+    return remaining
+
 """
 Used to process the last object left over by cutting
 Not used in any of the debugging method, requires the last bone
@@ -392,10 +391,37 @@ def process_armature(armature):
     
     return sequence
 
+"""
+Write the objects of the armature's bones to one piece archive at path, see PieceArchive
+Meshes are written in object space, records hold the bone, the object's location, its world matrix as rows
+to place the mesh with, and the cut box and pd it was cut with
+"""
+def export_pieces(armature,bone_prefix,path):
+    # World matrices follow the rotations align_objects_to_bones set only once the scene is updated
+    bpy.context.scene.update()
+    pieces = []
+    records = []
+    for bone in armature.data.bones:
+        if "Link" in bone.name or "link" in bone.name:
+            continue
+        obj = bpy.data.objects.get(bone.name.replace(bone_prefix,''))
+        if obj == None:
+            logger.add_error_log(str.format("Cant find object of bone {} at export_pieces", bone.name))
+            continue
+        vertices, triangles = bops.get_mesh_arrays(obj)
+        pieces.append((obj.name, vertices, triangles))
+        cut_box = None
+        if "cut_box" in obj:
+            cut_box = {key:obj["cut_box"][key] for key in obj["cut_box"].keys()}
+        matrix_world = [tuple(row) for row in obj.matrix_world]
+        records.append({"bone":bone.name,"location":tuple(obj.location),"matrix_world":matrix_world,"cut_box":cut_box,"pd":obj.get("pd",-1)})
+    write_archive(path, pieces, records)
+
 """
 Default values are set for debugging purposes
+With export_path the resulting objects are written to a piece archive there
 """
-def cutting_main(picks = [0,0],armature_name = "Armature",object_name = "Cube",bone_prefix = "Bone_"):
+def cutting_main(picks = [0,0],armature_name = "Armature",object_name = "Cube",bone_prefix = "Bone_",headless = False,export_path = None):
     logger.log_start()
     
     armature = bpy.data.objects[armature_name]
@@ -419,60 +445,108 @@ def cutting_main(picks = [0,0],armature_name = "Armature",object_name = "Cube",b
             logger.add_error_log("Bones with no cutting reqs must be the last bone in the tree for testing")
             return
     
-    cutting_start(obj,cut_reqs,picks)
+    with tracer.tracing_run():
+        if headless:
+            cutting_start_headless(obj,cut_reqs,picks)
+        else:
+            cutting_start(obj,cut_reqs,picks)
     
-    # Process the last object
-    process_object(obj,sequence[len(sequence)-1].name.replace(bone_prefix,''))
+        # Process the last object
+        process_object(obj,sequence[len(sequence)-1].name.replace(bone_prefix,''))
     
-    # Put objects in right places
-    position_objects_to_bones(armature,bone_prefix)
-    align_objects_to_bones(armature,bone_prefix)
+        # Put objects in right places
+        position_objects_to_bones(armature,bone_prefix)
+        align_objects_to_bones(armature,bone_prefix)
+        if export_path != None:
+            export_pieces(armature,bone_prefix,export_path)
         
-def cutting_start(obj,cut_reqs,picks):
-    volume = 1.0
+"""
+run_config is the CuttingConfig of the first cut request, the module's values by default
+"""
+@tracer.traced
+def cutting_start(obj,cut_reqs,picks,run_config = None):
+    if run_config == None:
+        run_config = config.get_cutting_config()
+    # Read once, then kept up to date with the volume profile of what is left of obj
+    mesh = bops.get_transformer_mesh(obj)
+    mesh.get_volume_profile(1)
+    total_volume = mesh.get_volume()
     i = 0
     limit = len(picks)
     for cut_req in cut_reqs:
-        req_volume_ratio = cut_req["volume"]/volume
+        # Requested volumes are of the whole object, matching is against what is left of it
+        req_volume_ratio = cut_req["volume"]*total_volume/mesh.get_volume()
         req_aspect_ratio = cut_req["aspect"]
         req_is_sym = cut_req["is_sym"]
         req_aspects = []
         req_aspects.append(req_aspect_ratio[0]/req_aspect_ratio[1])
         req_aspects.append(req_aspect_ratio[2]/req_aspect_ratio[1])
-        logger.add_matching_log(str.format("Level of divisions are {},{},{}", config.tier_1_divs,config.tier_2_divs,config.tier_3_divs))
-        
-        cutter.cutting_start(obj, req_volume_ratio, req_aspects, req_is_sym)
-
-        if picks[i] == 0:
-            perform_best_cut(obj)
-        elif picks[i] == 1:
-            perform_picky_cut(obj,range(math.floor(config.allowed_pd_aspect*100),math.floor(config.mediocre_pd_cap*100)))
-        else:
-            perform_picky_cut(obj,range(math.floor(config.mediocre_pd_cap*100),math.floor(config.bad_pd_cap*100)))
+        logger.add_matching_log(str.format("Level of divisions are {},{},{}", run_config.tier_1_divs,run_config.tier_2_divs,run_config.tier_3_divs))
         
+        name = str.format("component_{}", i+1)
         if "name" in cut_req:
-            process_cutting_results(cut_req["name"])
-        else:
-            process_cutting_results(str.format("component_{}", i+1))
+            name = cut_req["name"]
+        
+        # Everything created for this cut request but the chosen cut is freed at once when it is done,
+        # division and cut boxes are reused within it
+        with DatablockArena(), CuboidPool():
+            if config.use_deferred_booleans:
+                # Candidates stay as boxes, only the chosen one is cut out of obj
+                candidates, chosen = engine.pick_candidate_mesh_cached(mesh, req_volume_ratio, req_aspects, req_is_sym, picks[i], run_config)
+                if chosen != None:
+                    pieces = perform_deferred_cut(obj, chosen, name, run_config)
+                    mesh = get_remaining_mesh(obj, mesh, pieces, total_volume, run_config)
+            else:
+                registry = CutRegistry()
+                cutter.cutting_start(obj, req_volume_ratio, req_aspects, req_is_sym, run_config, registry)
+            
+                if picks[i] == 0:
+                    chosen_id = perform_best_cut(obj,registry,run_config)
+                elif picks[i] == 1:
+                    chosen_id = perform_picky_cut(obj,registry,range(math.floor(run_config.allowed_pd_aspect*100),math.floor(run_config.mediocre_pd_cap*100)),run_config)
+                else:
+                    chosen_id = perform_picky_cut(obj,registry,range(math.floor(run_config.mediocre_pd_cap*100),math.floor(run_config.bad_pd_cap*100)),run_config)
+            
+                if chosen_id != None:
+                    pieces = process_cutting_results(registry,chosen_id,name)
+                    mesh = get_remaining_mesh(obj, mesh, pieces, total_volume, run_config)
         
-        # TODO: deal with sym and use actual volume instead of req
-        volume = volume-req_volume_ratio
         i += 1
-        config.next_subdivision_level()
+        run_config = run_config.next_subdivision_level()
         logger.add_matching_separation()
         
         if i >= limit:
             break
+    logger.flush()
         
+"""
+Same as cutting_start but cuts are matched and performed on arrays by the engine,
+only the resulting pieces are written back to blender
+"""
+@tracer.traced
+def cutting_start_headless(obj,cut_reqs,picks,run_config = None):
+    mesh = bops.get_transformer_mesh(obj)
+    mesh, pieces, plan = engine.cutting_run(mesh,cut_reqs,picks,run_config)
+    
+    for piece, record in zip(pieces, get_plan_records(pieces, plan)):
+        cut = bops.create_transformer_object(piece,piece.name,obj)
+        cut["cut_box"] = record["cut_box"]
+        cut["pd"] = record["pd"]
+        bops.set_object_origin(cut)
+    bops.set_transformer_mesh(obj,mesh)
+    
 def cutting_debug(cut_reqs,picks,obj = bpy.context.active_object):
     logger.log_start()
-    cutting_start(obj,cut_reqs,picks)
+    with tracer.tracing_run():
+        cutting_start(obj,cut_reqs,picks)
 
 """
 Debug certain cut of the tree, not really useful
 """
 def cutting_debug_tree(cut_reqs,cut_name,num,obj = bpy.context.active_object):
     logger.log_start()
+    run_config = config.get_cutting_config()
+    # Share of the whole object left for the cut request, the ones before it are taken to cut what they request
     volume = 1.0
     i = 0
     for cut_req in cut_reqs:
@@ -484,25 +558,34 @@ def cutting_debug_tree(cut_reqs,cut_name,num,obj = bpy.context.active_object):
         req_aspects.append(req_aspect_ratio[2]/req_aspect_ratio[1])
         
         if i == num:
-            logger.add_matching_log(str.format("Level of divisions are {},{},{}", config.tier_1_divs,config.tier_2_divs,config.tier_3_divs))
+            logger.add_matching_log(str.format("Level of divisions are {},{},{}", run_config.tier_1_divs,run_config.tier_2_divs,run_config.tier_3_divs))
             
-            cutter.cutting_start(obj, req_volume_ratio, req_aspects, req_is_sym)
-            perform_specific_cut(obj,cut_name)
+            with DatablockArena(), CuboidPool():
+                registry = CutRegistry()
+                cutter.cutting_start(obj, req_volume_ratio, req_aspects, req_is_sym, run_config, registry)
+                div_id = registry.get_id_by_name(cut_name)
+                if div_id == None:
+                    logger.add_error_log(str.format("No cut named {} found at cutting_debug_tree", cut_name))
+                    break
+                perform_specific_cut(obj,registry,div_id,run_config)
                 
-            process_cutting_results(str.format("component_{}", i+1))
+                process_cutting_results(registry,div_id,str.format("component_{}", i+1))
             break
-        # TODO: deal with sym and use actual volume
-        volume = volume-req_volume_ratio
+        if req_is_sym:
+            volume -= 2*cut_req["volume"]
+        else:
+            volume -= cut_req["volume"]
         i += 1
-        config.next_subdivision_level()
+        run_config = run_config.next_subdivision_level()
     
 """
 Perform only one cutting without separation for debugging purpose
 """
 def cutting_debug_1p(cut_req, num, obj = bpy.context.active_object):
     logger.log_start()
+    run_config = config.get_cutting_config()
     for i in range(0,num):
-        config.next_subdivision_level()
+        run_config = run_config.next_subdivision_level()
     
     req_volume_ratio = cut_req["volume"]
     req_aspect_ratio = cut_req["aspect"]
@@ -511,8 +594,9 @@ def cutting_debug_1p(cut_req, num, obj = bpy.context.active_object):
     req_aspects.append(req_aspect_ratio[0]/req_aspect_ratio[1])
     req_aspects.append(req_aspect_ratio[2]/req_aspect_ratio[1])
     
-    logger.add_matching_log(str.format("Level of divisions are {},{},{}", config.tier_1_divs,config.tier_2_divs,config.tier_3_divs))
+    logger.add_matching_log(str.format("Level of divisions are {},{},{}", run_config.tier_1_divs,run_config.tier_2_divs,run_config.tier_3_divs))
     
-    cutter.cutting_start(obj, req_volume_ratio, req_aspects, req_is_sym)
+    # Cuts are left in the scene for inspection
+    cutter.cutting_start(obj, req_volume_ratio, req_aspects, req_is_sym, run_config, CutRegistry())
             
             
\ No newline at end of file
@@ -0,0 +1,710 @@
+import concurrent.futures
+import importlib.util
+import itertools
+import math
+import multiprocessing
+import os
+import random
+
+import numpy as np
+
+import arithmetic_helper as arith
+import boundbox_helper as bb
+import box_optimizer as opt
+import clipping_helper as clip
+import transformer_config as config
+import transformer_tracer as tracer
+import volume_helper as vol
+
+from CuttingCache import CuttingCache
+from TransformerLogger import TransformerLogger, replay_logs, start_log_capture, stop_log_capture
+from TransformerMesh import TransformerMesh
+from VolumeRatioFunction import VolumeRatioFunction
+
+"""
+Core of the cutting pipeline that does not need blender
+transformer_cutting drives it with blender objects, cutting_run runs it on a TransformerMesh
+"""
+
+# Logger
+logger = TransformerLogger()
+
+"""
+Get volume ratios of divisions from their volumes or their cut surface areas
+"""
+def get_volume_ratios(cut_id, cut_surface_areas):
+    volume_ratios = []
+    area_sum = math.fsum(cut_surface_areas)
+    if area_sum == 0:
+        logger.add_error_log(str.format("Error at cut {} produced area sum 0",cut_id))
+    for area in cut_surface_areas:
+        volume_ratios.append(area/area_sum)
+    return volume_ratios
+
+"""
+Get the cut position holding the required volume followed by the grid lines past it
+Grid lines are dim_min + i*interval for i from 1 to num_divs
+"""
+def get_grid_positions_after(position, dim_min, interval, num_divs, run_config):
+    positions = [position]
+    for i in range(0,num_divs):
+        grid_position = dim_min + (i+1)*interval
+        if grid_position > position + run_config.fp_tolerance:
+            positions.append(grid_position)
+    return positions
+
+"""
+Get the capless regions of mesh below each of the ascending positions along axis, named after names
+Triangles are classified against all positions at once instead of clipping the mesh once per region
+Return list of TransformerMesh
+"""
+def get_regions_below(mesh, axis, positions, names):
+    vertices, parts = clip.clip_below_planes(mesh.vertices, mesh.triangles, axis, positions, False)
+    regions = []
+    for i in range(0,len(positions)):
+        region_vertices, region_triangles = clip.compact_mesh(vertices, parts[i])
+        regions.append(TransformerMesh(names[i], region_vertices, region_triangles, mesh.bvh_min_triangles))
+    return regions
+
+"""
+Pad the print message in verify cut with appropriate number of '*'
+"""
+def pad_msg(div_id):
+    if div_id.count('_') == 0:
+        return ""
+    elif div_id.count('_') == 1:
+        return "**********"
+    else:
+        return "********************"
+        
+"""
+Verify candidates based on their volume ratios and aspect ratios in one go
+estimated_volumes holds a volume ratio and dims a row of x, y and z dimensions per candidate
+A candidate's aspects are matched in all 6 orientations, pd is the smallest sum of the two aspect pds
+Return (accepted mask, pds), pd is -1 where the volume does not fit
+"""
+@tracer.traced
+def verify_candidates(req_volume_ratio, req_aspects, estimated_volumes, dims, run_config):
+    estimated_volumes = np.asarray(estimated_volumes, dtype=np.float64)
+    is_volume_fit = np.fabs(req_volume_ratio - estimated_volumes)/req_volume_ratio <= run_config.allowed_pd_volume
+    is_aspect_fit, pds = get_aspect_pds(req_aspects, dims, run_config)
+    return (is_volume_fit & is_aspect_fit, np.where(is_volume_fit, pds, -1))
+
+"""
+Get (aspect fit mask, aspect pds) of candidates whatever their volumes, see verify_candidates
+"""
+def get_aspect_pds(req_aspects, dims, run_config):
+    dims = np.asarray(dims, dtype=np.float64).reshape(-1,3)
+    req_aspects = np.asarray(req_aspects, dtype=np.float64)
+    dim_x = dims[:,0]
+    dim_y = dims[:,1]
+    dim_z = dims[:,2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # (6, 2, candidates), every configure of verify_candidate both ways round
+        aspects = np.array([(dim_x/dim_y, dim_z/dim_y), (dim_z/dim_y, dim_x/dim_y),\
+                            (dim_y/dim_x, dim_z/dim_x), (dim_z/dim_x, dim_y/dim_x),\
+                            (dim_x/dim_z, dim_y/dim_z), (dim_y/dim_z, dim_x/dim_z)]).reshape(6,2,-1)
+        aspect_pds = np.fabs(req_aspects[None,:,None] - aspects)/req_aspects[None,:,None]
+    pds = (aspect_pds[:,0] + aspect_pds[:,1]).min(axis=0)
+    is_aspect_fit = np.all(aspect_pds <= run_config.allowed_pd_aspect, axis=1).any(axis=0)
+    return (is_aspect_fit, pds)
+
+"""
+Log the verification of a candidate the way verify_candidate found it
+"""
+def log_verification(div_id, req_volume_ratio, req_aspects, estimated_volume, dims, is_accepted, pd):
+    logger.add_matching_log("{} matching {}".format(pad_msg(div_id), div_id))
+    logger.add_matching_log("{} volume req/act : {} / {}".format(pad_msg(div_id), req_volume_ratio, estimated_volume))
+    if pd != -1:
+        configure_1 = [dims[0]/dims[1], dims[2]/dims[1]]
+        configure_2 = [dims[1]/dims[0], dims[2]/dims[0]]
+        configure_3 = [dims[0]/dims[2], dims[1]/dims[2]]
+        logger.add_matching_log("{} aspect ratio req : {}".format(pad_msg(div_id), req_aspects))
+        logger.add_matching_log("{} aspect ratio 1/2/3 : {} / {} / {}".format(pad_msg(div_id), configure_1, configure_2, configure_3))
+    if is_accepted:
+        logger.add_matching_log("{} accepted".format(pad_msg(div_id)))
+    else:
+        logger.add_matching_log("{} rejected".format(pad_msg(div_id)))
+    logger.add_matching_log("")
+
+"""
+Verify if a candidate can be accepted based on its volume ratio and aspect ratio
+dims are the x, y and z dimensions of the candidate
+Return (BOOLEAN, pd), pd is -1 when the volume does not fit
+"""
+def verify_candidate(div_id, req_volume_ratio, req_aspects, estimated_volume, dims, run_config):
+    is_accepted, pds = verify_candidates(req_volume_ratio, req_aspects, [estimated_volume], [dims], run_config)
+    is_accepted = bool(is_accepted[0])
+    pd = float(pds[0])
+    if run_config.DEBUG_MATCHING:
+        log_verification(div_id, req_volume_ratio, req_aspects, estimated_volume, dims, is_accepted, pd)
+    return (is_accepted, pd)
+
+            
+
+"""
+Headless matching
+Works on vertex and triangle arrays only, tiers mirror the ones in transformer_cutting.
+A tier's region is the mesh clipped to the box of the tier above. Regions are left open where
+they are clipped, the volume profiles the next tier takes are along the other axes and stay exact.
+Candidates are records of their cut boxes rather than blender objects
+"""
+
+"""
+Get cumulative volume ratio table of a region along an axis, see volume_helper
+With run_config.use_root_search it is a VolumeRatioFunction off the region's volume profile instead
+"""
+def get_cumulative_volume_table(ratio_id, region, axis, dim_min, dim_max, num_divs, run_config):
+    if run_config.use_root_search:
+        table = VolumeRatioFunction(region.get_volume_profile(axis), dim_min, dim_max)
+        if table.volume == 0:
+            logger.add_error_log(str.format("Error at cut {} produced volume 0",ratio_id))
+        return table
+    num_divs = num_divs*run_config.volume_table_refinement
+    interval = (dim_max - dim_min)/num_divs
+    positions = [dim_min + i*interval for i in range(0,num_divs+1)]
+    volumes = region.get_volumes_below(axis, positions)
+    volume_ratios = get_volume_ratios(ratio_id, volumes[1:] - volumes[:-1])
+    return vol.build_cumulative_volume(dim_min, interval, volume_ratios)
+
+"""
+Record a candidate, candidates whose volume did not fit are dropped like the tier end cleanup of the blender path does
+cut_boxes holds one box, or the pos and neg boxes of a symmetric cut
+"""
+def add_candidate(candidates, div_id, cut_boxes, volume, pd, is_accepted):
+    if pd == -1:
+        return
+    candidates.append({"id":div_id,"cut_boxes":cut_boxes,"volume":volume,"pd":pd,"is_accepted":is_accepted})
+
+"""
+Worker processes exploring tier 2 subtrees, None when they are explored in this process
+Blender's own python cannot spawn workers, there is never a pool when bpy is around
+"""
+process_pool = None
+process_pool_size = 0
+
+def get_process_pool():
+    global process_pool
+    global process_pool_size
+    if importlib.util.find_spec("bpy") != None:
+        return None
+    num_processes = config.engine_processes
+    if num_processes == 0:
+        num_processes = os.cpu_count()
+    if num_processes <= 1:
+        return None
+    if process_pool == None or process_pool_size != num_processes:
+        if process_pool != None:
+            process_pool.shutdown()
+        # Spawned workers start from the modules' defaults rather than a copy of this process' state
+        process_pool = concurrent.futures.ProcessPoolExecutor(num_processes, multiprocessing.get_context("spawn"))
+        process_pool_size = num_processes
+    return process_pool
+
+"""
+Explore one tier 2 subtree in a worker process
+Everything it depends on comes with args, the run's config and the regions included, is_tracing tells
+whether the parent records spans
+Return (candidates, captured log entries, captured spans)
+"""
+def run_subtree(function, args, is_tracing):
+    start_log_capture()
+    if is_tracing:
+        tracer.start_span_capture()
+    candidates = []
+    function(*args, candidates)
+    spans = []
+    if is_tracing:
+        spans = tracer.stop_span_capture()
+    return (candidates, stop_log_capture(), spans)
+
+"""
+Explore a tier 2 subtree right away, or queue it for the process pool
+Queued subtrees remember where their candidates go so the order does not depend on the pool
+"""
+def add_subtree(subtrees, candidates, function, args):
+    pool = get_process_pool()
+    if pool == None:
+        function(*args, candidates)
+        return
+    subtrees.append((len(candidates), pool.submit(run_subtree, function, args, tracer.is_recording())))
+
+"""
+Wait for the queued subtrees and merge their candidates, logs and spans in tier 1 order
+"""
+def finish_subtrees(subtrees, candidates):
+    results = []
+    for position, future in subtrees:
+        subtree_candidates, log_entries, spans = future.result()
+        replay_logs(log_entries)
+        tracer.replay_spans(spans)
+        results.append((position, subtree_candidates))
+    for position, subtree_candidates in reversed(results):
+        candidates[position:position] = subtree_candidates
+
+"""
+Get the candidates of a cut request, run_config is the run's transformer_config.CuttingConfig
+"""
+def cutting_start(vertices, triangles, req_volume_ratio, req_aspects, is_sym, run_config):
+    return cutting_start_mesh(TransformerMesh("tier_1", vertices, triangles), req_volume_ratio, req_aspects, is_sym, run_config)
+
+"""
+Same as cutting_start on a TransformerMesh, whose volume profiles are used if it has any
+"""
+@tracer.traced
+def cutting_start_mesh(mesh, req_volume_ratio, req_aspects, is_sym, run_config):
+    candidates = []
+    if run_config.use_box_optimizer:
+        optimizer_matching(mesh, req_volume_ratio, req_aspects, is_sym, run_config, candidates)
+    elif is_sym:
+        sym_tier_1_matching(mesh, req_volume_ratio, req_aspects, run_config, candidates)
+    else:
+        asym_tier_1_matching(mesh, req_volume_ratio, req_aspects, run_config, candidates)
+    return candidates
+
+"""
+Cache of cutting results, None when it is turned off
+"""
+result_cache = None
+
+def get_result_cache():
+    global result_cache
+    if not config.use_result_cache:
+        return None
+    if result_cache == None or result_cache.directory != config.cache_directory:
+        result_cache = CuttingCache(config.cache_directory, config.cache_max_bytes)
+    result_cache.max_bytes = config.cache_max_bytes
+    return result_cache
+
+"""
+Match a cut request and pick a candidate, the candidates are replayed from the result cache when the
+request was matched before
+The pick is not part of the entry, random picks are drawn again from the replayed candidates
+Return (candidates, chosen candidate), chosen is None if there is no candidate
+"""
+def pick_candidate_mesh_cached(mesh, req_volume_ratio, req_aspects, is_sym, pick, run_config):
+    cache = get_result_cache()
+    if cache == None:
+        candidates = cutting_start_mesh(mesh, req_volume_ratio, req_aspects, is_sym, run_config)
+        return (candidates, pick_candidate(candidates, pick, run_config))
+    
+    request = {"volume":req_volume_ratio,"aspects":req_aspects,"is_sym":is_sym}
+    # The candidates depend on every value of the run's config but the optimizer's time budget and the logs
+    config_state = dict(run_config._asdict())
+    del config_state["optimizer_time_budget"]
+    del config_state["DEBUG_MATCHING"]
+    key = cache.get_key(mesh.vertices, mesh.triangles, request, config_state)
+    entry = cache.load(key)
+    if entry != None:
+        if run_config.DEBUG_MATCHING:
+            logger.add_matching_log(str.format("Cut request replayed from cache entry {}", key))
+        candidates = entry["candidates"]
+    else:
+        candidates = cutting_start_mesh(mesh, req_volume_ratio, req_aspects, is_sym, run_config)
+        cache.store(key, {"candidates":candidates})
+    return (candidates, pick_candidate(candidates, pick, run_config))
+
+"""
+Asym cuttings
+"""
+@tracer.traced
+def asym_tier_1_matching(mesh, req_volume_ratio, req_aspects, run_config, candidates):
+    params = mesh.get_boundbox(run_config.tier_1_divs)
+    y_min = params.y_min
+    y_interval = params.y_interval
+    table = get_cumulative_volume_table("tier_1", mesh, 1, y_min, params.y_max, run_config.tier_1_divs, run_config)
+    
+    if run_config.DEBUG_MATCHING:
+        logger.add_matching_log("Asym tier 1 matching starts")
+        logger.add_matching_log("")
+    y_cut = vol.solve_cut_position(table, req_volume_ratio, run_config.fp_tolerance)
+    subtrees = []
+    cut_id = 1
+    y_fars = get_grid_positions_after(y_cut, y_min, y_interval, run_config.tier_1_divs, run_config)
+    cut_boxes = []
+    for y_far in y_fars:
+        cut_boxes.append({"x_max":params.x_max_box,"x_min":params.x_min_box\
+                          ,"y_max":y_far,"y_min":params.y_min_box\
+                          ,"z_max":params.z_max_box,"z_min":params.z_min_box})
+    accumulated_volume_ratios = [vol.get_cumulative_volume(table, y_far) for y_far in y_fars]
+    dims = [mesh.get_clipped_dims(cut_box) for cut_box in cut_boxes]
+    is_accepted_cuts, pds = verify_candidates(req_volume_ratio, req_aspects, accumulated_volume_ratios, dims, run_config)
+    # Only the candidates explored further need their regions
+    descending = [i for i in range(0,len(y_fars)) if not is_accepted_cuts[i]\
+                  and accumulated_volume_ratios[i] > req_volume_ratio + run_config.fp_tolerance]
+    regions = get_regions_below(mesh, 1, [y_fars[i] for i in descending], [str.format("{}", i+1) for i in descending])
+    regions = dict(zip(descending, regions))
+    for i in range(0,len(y_fars)):
+        div_id = str.format("{}", cut_id)
+        accumulated_volume_ratio = accumulated_volume_ratios[i]
+        is_accepted_cut = bool(is_accepted_cuts[i])
+        pd = float(pds[i])
+        if run_config.DEBUG_MATCHING:
+            log_verification(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,dims[i],is_accepted_cut,pd)
+        add_candidate(candidates, div_id, [cut_boxes[i]], accumulated_volume_ratio, pd, is_accepted_cut)
+        if i in regions:
+            add_subtree(subtrees, candidates, asym_tier_2_matching, (cut_id, regions[i], cut_boxes[i], req_volume_ratio/accumulated_volume_ratio, req_aspects, run_config))
+        cut_id += 1
+    finish_subtrees(subtrees, candidates)
+    
+    if run_config.DEBUG_MATCHING:     
+        logger.add_matching_log("Asym tier 1 matching ends")
+        logger.add_matching_log("")
+
+@tracer.traced
+def asym_tier_2_matching(tier_1_id, region, tier_1_box, req_volume_ratio, req_aspects, run_config, candidates):
+    params = region.get_boundbox(run_config.tier_2_divs)
+    x_min = params.x_min
+    x_max = params.x_max
+    x_interval = params.x_interval
+    table = get_cumulative_volume_table(tier_1_id, region, 0, x_min, x_max, run_config.tier_2_divs, run_config)
+    
+    if run_config.DEBUG_MATCHING:
+        logger.add_matching_log("********** Asym Tier 2 matching of div {}".format(tier_1_id))
+        logger.add_matching_log("")
+    x_center = (x_min + x_max)/2
+    x_width = vol.solve_centered_cut_width(table, x_center, req_volume_ratio, run_config.fp_tolerance)
+    x_nears = [x_center - x_width]
+    for i in reversed(range(1,math.floor((run_config.tier_2_divs+1)/2))):
+        x_near = x_min + i*x_interval
+        if x_near < x_nears[0] - run_config.fp_tolerance:
+            x_nears.append(x_near)
+    cut_boxes = []
+    accumulated_volume_ratios = []
+    for x_near in x_nears:
+        x_far = x_max - (x_near - x_min)
+        accumulated_volume_ratios.append(vol.get_cumulative_volume(table, x_far) - vol.get_cumulative_volume(table, x_near))
+        cut_boxes.append({"x_max":x_far,"x_min":x_near\
+                          ,"y_max":tier_1_box["y_max"],"y_min":tier_1_box["y_min"]\
+                          ,"z_max":params.z_max_box,"z_min":params.z_min_box})
+    dims = [region.get_clipped_dims(cut_box, False) for cut_box in cut_boxes]
+    is_accepted_cuts, pds = verify_candidates(req_volume_ratio, req_aspects, accumulated_volume_ratios, dims, run_config)
+    
+    cut_id = 1
+    for i in range(0,len(x_nears)):
+        div_id = str.format("{}_{}", tier_1_id, cut_id)
+        accumulated_volume_ratio = accumulated_volume_ratios[i]
+        is_accepted_cut = bool(is_accepted_cuts[i])
+        pd = float(pds[i])
+        if run_config.DEBUG_MATCHING:
+            log_verification(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,dims[i],is_accepted_cut,pd)
+        add_candidate(candidates, div_id, [cut_boxes[i]], accumulated_volume_ratio, pd, is_accepted_cut)
+        if not is_accepted_cut and accumulated_volume_ratio > req_volume_ratio + run_config.fp_tolerance:
+            tier_2_region = region.intersect_box(cut_boxes[i], div_id, False)
+            asym_tier_3_matching(tier_1_id, cut_id, tier_2_region, cut_boxes[i], req_volume_ratio/accumulated_volume_ratio, req_aspects, run_config, candidates)
+        cut_id += 1
+    
+    if run_config.DEBUG_MATCHING:     
+        logger.add_matching_log("********** Asym tier 2 matching of div {} ends".format(tier_1_id))
+        logger.add_matching_log("")
+
+@tracer.traced
+def asym_tier_3_matching(tier_1_id, tier_2_id, region, tier_2_box, req_volume_ratio, req_aspects, run_config, candidates):
+    params = region.get_boundbox(run_config.tier_3_divs)
+    z_min = params.z_min
+    z_max = params.z_max
+    table = get_cumulative_volume_table(str.format("{}_{}",tier_1_id,tier_2_id), region, 2, z_min, z_max, run_config.tier_3_divs, run_config)
+    
+    if run_config.DEBUG_MATCHING:
+        logger.add_matching_log("******************** Asym tier 3 matching of div {}_{}".format(tier_1_id, tier_2_id))
+        logger.add_matching_log("")
+    z_far = vol.solve_cut_position(table, req_volume_ratio, run_config.fp_tolerance)
+    accumulated_volume_ratio = vol.get_cumulative_volume(table, z_far)
+    div_id = str.format("{}_{}_{}",tier_1_id,tier_2_id,1)
+    if z_far < z_max - run_config.fp_tolerance:
+        cut_box = {"x_max":tier_2_box["x_max"],"x_min":tier_2_box["x_min"]\
+                   ,"y_max":tier_2_box["y_max"],"y_min":tier_2_box["y_min"]\
+                   ,"z_max":z_far,"z_min":params.z_min_box}
+        is_accepted_cut, pd = verify_candidate(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,region.get_clipped_dims(cut_box, False),run_config)
+        add_candidate(candidates, div_id, [cut_box], accumulated_volume_ratio, pd, is_accepted_cut)
+    
+    if run_config.DEBUG_MATCHING:     
+        logger.add_matching_log("******************** Asym tier 3 matching of div {}_{} ends".format(tier_1_id, tier_2_id))
+        logger.add_matching_log("")
+
+"""
+Symmetric cuttings
+"""
+@tracer.traced
+def sym_tier_1_matching(mesh, req_volume_ratio, req_aspects, run_config, candidates):
+    params = mesh.get_boundbox(run_config.tier_1_divs)
+    y_min = params.y_min
+    y_interval = params.y_interval
+    table = get_cumulative_volume_table("tier_1", mesh, 1, y_min, params.y_max, run_config.tier_1_divs, run_config)
+    
+    if run_config.DEBUG_MATCHING:
+        logger.add_matching_log("Symmetric tier 1 matching starts")
+        logger.add_matching_log("")
+    # twice the required volume ratio is used here since we need to cut 2 parts
+    y_cut = vol.solve_cut_position(table, 2*req_volume_ratio, run_config.fp_tolerance)
+    subtrees = []
+    cut_id = 1
+    y_fars = get_grid_positions_after(y_cut, y_min, y_interval, run_config.tier_1_divs, run_config)
+    regions = get_regions_below(mesh, 1, y_fars, [str.format("{}", i+1) for i in range(0,len(y_fars))])
+    for y_far, region in zip(y_fars, regions):
+        accumulated_volume_ratio = vol.get_cumulative_volume(table, y_far)
+        cut_box = {"x_max":params.x_max_box,"x_min":params.x_min_box\
+                   ,"y_max":y_far,"y_min":params.y_min_box\
+                   ,"z_max":params.z_max_box,"z_min":params.z_min_box}
+        add_subtree(subtrees, candidates, sym_tier_2_matching, (cut_id, region, cut_box, req_volume_ratio/accumulated_volume_ratio, req_aspects, run_config))
+        cut_id += 1
+    finish_subtrees(subtrees, candidates)
+    
+    if run_config.DEBUG_MATCHING:     
+        logger.add_matching_log("Symmetric tier 1 matching ends")
+        logger.add_matching_log("")
+
+@tracer.traced
+def sym_tier_2_matching(tier_1_id, region, tier_1_box, req_volume_ratio, req_aspects, run_config, candidates):
+    params = region.get_boundbox(run_config.tier_2_divs)
+    x_min = params.x_min
+    x_max = params.x_max
+    x_interval = params.x_interval
+    table = get_cumulative_volume_table(tier_1_id, region, 0, x_min, x_max, run_config.tier_2_divs, run_config)
+    
+    if run_config.DEBUG_MATCHING:
+        logger.add_matching_log("********** Tier 2 sym matching of div {}".format(tier_1_id))
+        logger.add_matching_log("")
+    x_cut = vol.solve_cut_position(table, req_volume_ratio, run_config.fp_tolerance)
+    cut_boxes = []
+    accumulated_volume_ratios = []
+    for x_near in get_grid_positions_after(x_cut, x_min, x_interval, math.floor((run_config.tier_2_divs)/2), run_config):
+        x_far = x_max - (x_near - x_min)
+        if x_far < x_near:
+            break
+        accumulated_volume_ratios.append(vol.get_cumulative_volume(table, x_near))
+        pos_box = {"x_max":params.x_max_box,"x_min":x_far\
+                   ,"y_max":tier_1_box["y_max"],"y_min":tier_1_box["y_min"]\
+                   ,"z_max":params.z_max_box,"z_min":params.z_min_box}
+        neg_box = {"x_max":x_near,"x_min":params.x_min_box\
+                   ,"y_max":tier_1_box["y_max"],"y_min":tier_1_box["y_min"]\
+                   ,"z_max":params.z_max_box,"z_min":params.z_min_box}
+        cut_boxes.append([pos_box, neg_box])
+    dims = [region.get_clipped_dims(pos_box, False) for pos_box, neg_box in cut_boxes]
+    is_accepted_cuts, pds = verify_candidates(req_volume_ratio, req_aspects, accumulated_volume_ratios, dims, run_config)
+    
+    cut_id = 1
+    for i in range(0,len(cut_boxes)):
+        div_id = str.format("{}_{}", tier_1_id, cut_id)
+        accumulated_volume_ratio = accumulated_volume_ratios[i]
+        is_accepted_cut = bool(is_accepted_cuts[i])
+        pd = float(pds[i])
+        if run_config.DEBUG_MATCHING:
+            log_verification(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,dims[i],is_accepted_cut,pd)
+        add_candidate(candidates, div_id, cut_boxes[i], accumulated_volume_ratio, pd, is_accepted_cut)
+        if not is_accepted_cut and accumulated_volume_ratio > req_volume_ratio + run_config.fp_tolerance:
+            tier_2_regions = [region.intersect_box(cut_box, div_id, False) for cut_box in cut_boxes[i]]
+            sym_tier_3_matching(tier_1_id, cut_id, tier_2_regions, cut_boxes[i], req_volume_ratio/accumulated_volume_ratio, req_aspects, run_config, candidates)
+        cut_id += 1
+    
+    if run_config.DEBUG_MATCHING:     
+        logger.add_matching_log("********** Tier 2 sym matching of div {} ends".format(tier_1_id))
+        logger.add_matching_log("")
+
+"""
+regions and tier_2_boxes are [pos, neg] pairs
+"""
+@tracer.traced
+def sym_tier_3_matching(tier_1_id, tier_2_id, regions, tier_2_boxes, req_volume_ratio, req_aspects, run_config, candidates):
+    region = regions[0]
+    params = bb.get_points_boundbox([regions[0].get_extents(), regions[1].get_extents()],run_config.tier_3_divs)
+    z_min = params.z_min
+    z_max = params.z_max
+    table = get_cumulative_volume_table(str.format("{}_{}",tier_1_id,tier_2_id), region, 2, z_min, z_max, run_config.tier_3_divs, run_config)
+    
+    if run_config.DEBUG_MATCHING:
+        logger.add_matching_log("******************** Tier 3 matching of div {}_{}".format(tier_1_id, tier_2_id))
+        logger.add_matching_log("")
+    z_far = vol.solve_cut_position(table, req_volume_ratio, run_config.fp_tolerance)
+    accumulated_volume_ratio = vol.get_cumulative_volume(table, z_far)
+    div_id = str.format("{}_{}_{}",tier_1_id,tier_2_id,1)
+    if z_far < z_max - run_config.fp_tolerance:
+        cut_boxes = []
+        for tier_2_box in tier_2_boxes:
+            cut_boxes.append({"x_max":tier_2_box["x_max"],"x_min":tier_2_box["x_min"]\
+                              ,"y_max":tier_2_box["y_max"],"y_min":tier_2_box["y_min"]\
+                              ,"z_max":z_far,"z_min":params.z_min_box})
+        is_accepted_cut, pd = verify_candidate(div_id,req_volume_ratio,req_aspects,accumulated_volume_ratio,region.get_clipped_dims(cut_boxes[0], False),run_config)
+        add_candidate(candidates, div_id, cut_boxes, accumulated_volume_ratio, pd, is_accepted_cut)
+    
+    if run_config.DEBUG_MATCHING:     
+        logger.add_matching_log("******************** Tier 3 matching of div {}_{} ends".format(tier_1_id, tier_2_id))
+        logger.add_matching_log("")
+
+"""
+Box optimizer matching
+Candidates come from box_optimizer's search over the box bounds, one per start
+A box is scored by its volume pd plus its aspect pd, the pd verify_candidates gives it if the volume fits
+With run_config.optimizer_seeds the tiers are matched first and their best candidates are searched from
+before the start boxes, at the cost of the whole tier search
+"""
+@tracer.traced
+def optimizer_matching(mesh, req_volume_ratio, req_aspects, is_sym, run_config, candidates):
+    params = mesh.get_boundbox(run_config.tier_1_divs)
+    
+    if run_config.DEBUG_MATCHING:
+        logger.add_matching_log("Box optimizer matching starts")
+        logger.add_matching_log("")
+    def get_scores(volume_ratios, dims):
+        volume_pds = np.fabs(req_volume_ratio - np.asarray(volume_ratios))/req_volume_ratio
+        return volume_pds + get_aspect_pds(req_aspects, dims, run_config)[1]
+    num_candidates = len(candidates)
+    tier_candidates = []
+    if run_config.optimizer_seeds > 0:
+        if is_sym:
+            sym_tier_1_matching(mesh, req_volume_ratio, req_aspects, run_config, tier_candidates)
+        else:
+            asym_tier_1_matching(mesh, req_volume_ratio, req_aspects, run_config, tier_candidates)
+    # The neg box of a symmetric cut is the one searched
+    seed_bounds = []
+    for candidate in sorted(tier_candidates, key=lambda candidate: candidate["pd"])[:run_config.optimizer_seeds]:
+        cut_box = candidate["cut_boxes"][-1]
+        seed_bounds.append(np.array([[cut_box["x_min"],cut_box["y_min"],cut_box["z_min"]],[cut_box["x_max"],cut_box["y_max"],cut_box["z_max"]]]))
+    # Starts are boxes of the required aspects in each of their orientations, sized to the volume at each start position
+    volume = mesh.get_volume()
+    start_widths = []
+    for widths in itertools.permutations((req_aspects[0], 1.0, req_aspects[1])):
+        if widths not in start_widths:
+            start_widths.append(widths)
+    results, num_evaluations = opt.search_boxes(mesh.vertices, mesh.triangles, volume, req_volume_ratio, get_scores, is_sym, seed_bounds, start_widths,\
+                                                run_config.optimizer_start_positions, run_config.fp_tolerance, run_config.optimizer_max_cycles, run_config.optimizer_scans, run_config.optimizer_time_budget)
+    if len(results) == 0:
+        logger.add_error_log("box optimizer ran out of time before its first box")
+    is_accepted_cuts, pds = verify_candidates(req_volume_ratio, req_aspects, [result[1] for result in results], [result[2] for result in results], run_config)
+    
+    cut_id = 1
+    for i in range(0,len(results)):
+        div_id = str.format("{}", cut_id)
+        bounds, volume_ratio, dims, score = results[i]
+        # Bounds on the mesh's extents go out to the padded box so booleans do not run along faces
+        cut_box = opt.get_cut_box(bounds)
+        for dim_string in ("x","y","z"):
+            if cut_box[dim_string+"_min"] <= params.get(dim_string,"min") + run_config.fp_tolerance:
+                cut_box[dim_string+"_min"] = params.get(dim_string,"min_box")
+            if cut_box[dim_string+"_max"] >= params.get(dim_string,"max") - run_config.fp_tolerance:
+                cut_box[dim_string+"_max"] = params.get(dim_string,"max_box")
+        cut_boxes = [cut_box]
+        if is_sym:
+            # Mirrored about the x center
+            pos_box = dict(cut_box)
+            pos_box["x_min"] = params.x_max - (bounds[1,0] - params.x_min)
+            pos_box["x_max"] = params.x_max - (bounds[0,0] - params.x_min)
+            if bounds[0,0] <= params.x_min + run_config.fp_tolerance:
+                pos_box["x_max"] = params.x_max_box
+            cut_boxes = [pos_box, cut_box]
+        is_accepted_cut = bool(is_accepted_cuts[i])
+        pd = float(pds[i])
+        if run_config.DEBUG_MATCHING:
+            log_verification(div_id,req_volume_ratio,req_aspects,volume_ratio,dims,is_accepted_cut,pd)
+        add_candidate(candidates, div_id, cut_boxes, volume_ratio, pd, is_accepted_cut)
+        cut_id += 1
+    if len(candidates) == num_candidates:
+        logger.add_error_log("no box of the box optimizer fits the volume")
+    
+    if run_config.DEBUG_MATCHING:
+        logger.add_matching_log(str.format("Box optimizer matching ends after {} geometry evaluations of the box search", num_evaluations))
+        if run_config.optimizer_seeds > 0:
+            logger.add_matching_log(str.format("The tier search for its {} seeds found {} candidates, see transformer_benchmark for its geometry evaluations",\
+                                               len(seed_bounds), len(tier_candidates)))
+        logger.add_matching_log("")
+
+"""
+Pick the candidate with the smallest pd
+Return None if there is none
+"""
+def pick_best_candidate(candidates):
+    if len(candidates) == 0:
+        logger.add_error_log("no best cut found, which is to say no cut found....")
+        return None
+    return candidates[arith.rank_candidates([candidate["pd"] for candidate in candidates])[0]]
+
+"""
+Pick a random candidate with pd in pick_range, the best one if there is none
+"""
+def pick_picky_candidate(candidates, pick_range):
+    in_range = []
+    for candidate in candidates:
+        if math.floor(candidate["pd"]*100) in pick_range:
+            in_range.append(candidate)
+    if len(in_range) == 0:
+        return pick_best_candidate(candidates)
+    return in_range[random.randint(0,len(in_range)-1)]
+
+"""
+Pick a candidate the way the driver does for pick 0 (best), 1 (mediocre) or else (bad)
+"""
+def pick_candidate(candidates, pick, run_config):
+    if pick == 0:
+        return pick_best_candidate(candidates)
+    elif pick == 1:
+        return pick_picky_candidate(candidates, range(math.floor(run_config.allowed_pd_aspect*100),math.floor(run_config.mediocre_pd_cap*100)))
+    return pick_picky_candidate(candidates, range(math.floor(run_config.mediocre_pd_cap*100),math.floor(run_config.bad_pd_cap*100)))
+
+"""
+Cut the chosen candidate out of mesh
+Return (remaining mesh, list of pieces named after name, with _pos/_neg for symmetric cuts)
+"""
+@tracer.traced
+def perform_cut(mesh, candidate, name):
+    cut_boxes = candidate["cut_boxes"]
+    names = [name]
+    if len(cut_boxes) == 2:
+        names = [str.format("{}_pos", name), str.format("{}_neg", name)]
+    pieces = []
+    for i in range(0,len(cut_boxes)):
+        logger.add_choice_log(str.format("cut {} is taken as {}",candidate["id"],names[i]))
+        pieces.append(mesh.intersect_box(cut_boxes[i], names[i]))
+    remaining = mesh
+    for cut_box in cut_boxes:
+        remaining = remaining.subtract_box(cut_box)
+    # Profiles of the remaining mesh are the ones of mesh less its pieces
+    for axis, profile in mesh.get_volume_profiles().items():
+        for piece in pieces:
+            profile = profile.subtract(piece.get_triangle_verts())
+        remaining.set_volume_profile(axis, profile)
+    logger.add_choice_log("")
+    return (remaining, pieces)
+
+"""
+Headless counterpart of transformer_driver.cutting_start
+The tier 1 volume profile is built once and updated by every cut, it also gives the actual remaining volume
+run_config is the CuttingConfig of the first cut request, the module's values by default
+Return (remaining mesh, list of pieces, plan), plan holds the chosen candidate of every cut request
+"""
+def cutting_run(mesh, cut_reqs, picks, run_config = None):
+    if run_config == None:
+        run_config = config.get_cutting_config()
+    with tracer.tracing_run():
+        mesh.get_volume_profile(1)
+        total_volume = mesh.get_volume()
+        i = 0
+        limit = len(picks)
+        pieces = []
+        plan = []
+        for cut_req in cut_reqs:
+            # Requested volumes are of the whole object, matching is against what is left of it
+            req_volume_ratio = cut_req["volume"]*total_volume/mesh.get_volume()
+            req_aspect_ratio = cut_req["aspect"]
+            req_is_sym = cut_req["is_sym"]
+            req_aspects = []
+            req_aspects.append(req_aspect_ratio[0]/req_aspect_ratio[1])
+            req_aspects.append(req_aspect_ratio[2]/req_aspect_ratio[1])
+            logger.add_matching_log(str.format("Level of divisions are {},{},{}", run_config.tier_1_divs,run_config.tier_2_divs,run_config.tier_3_divs))
+        
+            candidates, chosen = pick_candidate_mesh_cached(mesh, req_volume_ratio, req_aspects, req_is_sym, picks[i], run_config)
+            if chosen != None:
+                name = str.format("component_{}", i+1)
+                if "name" in cut_req:
+                    name = cut_req["name"]
+                mesh, cut_pieces = perform_cut(mesh, chosen, name)
+                pieces.extend(cut_pieces)
+                plan.append({"name":name,"candidate":chosen})
+        
+            i += 1
+            run_config = run_config.next_subdivision_level()
+            logger.add_matching_separation()
+        
+            if i >= limit:
+                break
+        logger.flush()
+    return (mesh, pieces, plan)
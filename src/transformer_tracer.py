@@ -0,0 +1,216 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+import transformer_config as config
+
+"""
+Opt-in tracing of the cutting pipeline, turned on with config.DEBUG_TRACING
+Functions marked @traced record a span per call: wall time, poly counts of their mesh and object
+arguments before and after, and the blender objects created meanwhile, counted where they are created
+with count_object_created.
+A run's spans are written to config.log_directory as a Chrome trace, to be opened in chrome://tracing
+or Perfetto, and as a summary table per function.
+Runs are kept per thread, spans go to the run of the thread they are recorded on and spans outside a run are dropped.
+With tracing off a traced call costs a flag check. Worker processes exploring subtrees capture their spans,
+which the parent adds to its run, see start_span_capture
+"""
+
+# depth, the runs entered and not finished yet of which only the outermost one writes the trace out,
+# start and events, the spans of the current run as Chrome trace events,
+# objects_created, the blender objects created on the thread so far
+run_state = threading.local()
+# Set while a worker process captures the spans of a subtree for its parent, whatever config.DEBUG_TRACING is
+is_capturing = False
+
+trace_file = "trace.json"
+summary_file = "trace_summary.txt"
+
+"""
+Get the number of polygons of the meshes, TransformerMeshes and blender objects among values, lists included
+Objects removed in the meantime count as 0
+"""
+def get_poly_count(values):
+    count = 0
+    for value in values:
+        if isinstance(value, (list, tuple)):
+            count += get_poly_count(value)
+            continue
+        try:
+            if hasattr(value, "triangles"):
+                count += len(value.triangles)
+            elif hasattr(value, "data") and hasattr(value.data, "polygons"):
+                count += len(value.data.polygons)
+        except ReferenceError:
+            continue
+    return count
+
+"""
+Get the run state of this thread
+"""
+def get_run_state():
+    if not hasattr(run_state, "depth"):
+        run_state.depth = 0
+        run_state.start = 0.0
+        run_state.events = []
+        run_state.objects_created = 0
+    return run_state
+
+"""
+Count a blender object created for the spans of this thread around it, called wherever objects are created
+"""
+def count_object_created():
+    if not config.DEBUG_TRACING:
+        return
+    get_run_state().objects_created += 1
+
+def add_span(name, category, start, end, args):
+    state = get_run_state()
+    if state.depth == 0:
+        return
+    event = {"name":name,"cat":category,"ph":"X","pid":os.getpid(),"tid":threading.get_ident(),\
+             "ts":(start - state.start)*1e6,"dur":(end - start)*1e6,"args":args}
+    state.events.append(event)
+
+"""
+Decorator recording a span around every call of function while tracing is on and its thread is in a run
+"""
+def traced(function):
+    category = function.__module__
+    name = function.__name__
+    @functools.wraps(function)
+    def traced_function(*args, **kwargs):
+        if not (config.DEBUG_TRACING or is_capturing) or get_run_state().depth == 0:
+            return function(*args, **kwargs)
+        polys_before = get_poly_count(args)
+        objects_before = get_run_state().objects_created
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            add_span(name, category, start, end, {"polys_before":polys_before,"polys_after":get_poly_count(args),\
+                                                  "objects_created":get_run_state().objects_created - objects_before})
+    return traced_function
+
+"""
+Context of a run, the spans recorded within it make up its trace, written out when the outermost run
+of the thread is left, also when it is left by an exception
+Runs entered within a run are part of it
+"""
+@contextlib.contextmanager
+def tracing_run():
+    is_started = start_run()
+    try:
+        yield
+    finally:
+        if is_started:
+            finish_run()
+
+"""
+Start a run of this thread, see tracing_run
+Return True if a run was started, which has to be finished
+"""
+def start_run():
+    if not config.DEBUG_TRACING:
+        return False
+    state = get_run_state()
+    if state.depth == 0:
+        state.events = []
+        state.start = time.perf_counter()
+    state.depth += 1
+    return True
+
+"""
+Check if the spans of this thread are recorded
+"""
+def is_recording():
+    return (config.DEBUG_TRACING or is_capturing) and get_run_state().depth > 0
+
+"""
+Capture the spans of a worker process in a run of its own, handed to the parent by stop_span_capture
+"""
+def start_span_capture():
+    global is_capturing
+    is_capturing = True
+    state = get_run_state()
+    state.events = []
+    state.start = time.perf_counter()
+    state.depth = 1
+
+"""
+Stop capturing, return the spans captured with their start times on the perf_counter clock, which
+processes of a machine share
+"""
+def stop_span_capture():
+    global is_capturing
+    is_capturing = False
+    state = get_run_state()
+    events = state.events
+    state.events = []
+    state.depth = 0
+    for event in events:
+        event["ts"] += state.start*1e6
+    return events
+
+"""
+Add the spans a worker captured to the run of this thread, dropped outside a run like the ones recorded here
+"""
+def replay_spans(events):
+    state = get_run_state()
+    if state.depth == 0:
+        return
+    for event in events:
+        event["ts"] -= state.start*1e6
+        state.events.append(event)
+
+"""
+Finish a run of this thread, the outermost one writes its trace and summary out
+Return the summary table, None if nothing was written
+"""
+def finish_run():
+    state = get_run_state()
+    if state.depth == 0:
+        return None
+    state.depth -= 1
+    if state.depth > 0:
+        return None
+    run_events = state.events
+    state.events = []
+    directory = config.log_directory
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(os.path.join(directory, trace_file), 'w') as trace:
+        json.dump({"traceEvents":run_events,"displayTimeUnit":"ms"}, trace)
+    summary = get_summary(run_events)
+    with open(os.path.join(directory, summary_file), 'w') as table:
+        table.write(summary)
+    return summary
+
+"""
+Get a table of calls, wall time, poly counts and objects created per traced function, slowest first
+Times include the time spent in traced functions called within
+"""
+def get_summary(run_events):
+    rows = {}
+    for event in run_events:
+        key = str.format("{}.{}", event["cat"], event["name"])
+        if key not in rows:
+            rows[key] = {"calls":0,"total":0.0,"max":0.0,"polys_before":0,"polys_after":0,"objects_created":0}
+        row = rows[key]
+        row["calls"] += 1
+        row["total"] += event["dur"]/1000
+        row["max"] = max(row["max"], event["dur"]/1000)
+        for count in ("polys_before","polys_after","objects_created"):
+            row[count] += event["args"][count]
+    lines = [str.format("{:<50} {:>7} {:>12} {:>10} {:>10} {:>12} {:>12} {:>8}",\
+                        "function","calls","total ms","mean ms","max ms","polys in","polys out","objects")]
+    for key in sorted(rows, key=lambda key: -rows[key]["total"]):
+        row = rows[key]
+        lines.append(str.format("{:<50} {:>7} {:>12.2f} {:>10.2f} {:>10.2f} {:>12} {:>12} {:>8}",\
+                                key, row["calls"], row["total"], row["total"]/row["calls"], row["max"],\
+                                row["polys_before"], row["polys_after"], row["objects_created"]))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,316 @@
+import numpy as np
+
+"""
+Volume computations on raw mesh arrays
+vertices is a (N,3) float array, triangles is a (M,3) int array of vertex indices
+Meshes are expected to be closed with outward facing normals, like the ones blender booleans need
+"""
+
+# Upper bound on triangle x plane entries evaluated at once, keeps memory flat on big meshes
+chunk_size = 4000000
+
+"""
+Map dimension string to axis index
+"""
+def get_axis(dim_string):
+    if dim_string == "x":
+        return 0
+    elif dim_string == "y":
+        return 1
+    elif dim_string == "z":
+        return 2
+    return -1
+
+"""
+Fan triangulate polygons given in blender's flattened loop layout
+loop_starts and loop_totals are per polygon, loop_vertices is per loop
+Return (M,3) array of vertex indices
+"""
+def triangulate_polygons(loop_starts, loop_totals, loop_vertices):
+    loop_starts = np.asarray(loop_starts, dtype=np.int64)
+    loop_totals = np.asarray(loop_totals, dtype=np.int64)
+    loop_vertices = np.asarray(loop_vertices, dtype=np.int64)
+
+    num_tris = np.maximum(loop_totals-2, 0)
+    total_tris = int(num_tris.sum())
+    if total_tris == 0:
+        return np.zeros((0,3), dtype=np.int64)
+
+    # k runs from 1 to n-2 within each polygon
+    starts = np.repeat(loop_starts, num_tris)
+    offsets = np.repeat(np.cumsum(num_tris)-num_tris, num_tris)
+    k = np.arange(total_tris) - offsets + 1
+
+    triangles = np.empty((total_tris,3), dtype=np.int64)
+    triangles[:,0] = loop_vertices[starts]
+    triangles[:,1] = loop_vertices[starts+k]
+    triangles[:,2] = loop_vertices[starts+k+1]
+    return triangles
+
+"""
+Get (M,3,3) array of triangle corner coordinates
+"""
+def get_triangle_verts(vertices, triangles):
+    return np.asarray(vertices, dtype=np.float64)[np.asarray(triangles, dtype=np.int64)]
+
+"""
+Get volume of the part of the mesh lying below each plane perpendicular to axis
+By divergence theorem with F = (p[axis] - t) along axis, the cap on the plane has no flux
+so the volume is the flux through the part of the surface below the plane only.
+Each triangle is clipped analytically, faces parallel to axis contribute nothing.
+Return array of volumes, one per plane
+"""
+def get_volumes_below(tri_verts, axis, planes):
+    planes = np.atleast_1d(np.asarray(planes, dtype=np.float64))
+    volumes = np.zeros(len(planes))
+    if len(tri_verts) == 0 or len(planes) == 0:
+        return volumes
+
+    edge_1 = tri_verts[:,1] - tri_verts[:,0]
+    edge_2 = tri_verts[:,2] - tri_verts[:,0]
+    # Signed area of the triangle projected on the plane perpendicular to axis
+    area = 0.5*np.cross(edge_1, edge_2)[:,axis]
+
+    # Only the ordering of the corners along axis matters for the clipped area ratios
+    coords = np.sort(tri_verts[:,:,axis], axis=1)
+    lo = coords[:,0:1]
+    mid = coords[:,1:2]
+    hi = coords[:,2:3]
+    area = area[:,None]
+    mean = (lo+mid+hi)/3
+
+    step = max(1, chunk_size//len(tri_verts))
+    for start in range(0, len(planes), step):
+        t = planes[None,start:start+step]
+        whole = area*(mean-t)
+        # Only lowest corner below the plane
+        s = (t-lo)/np.where(mid > lo, mid-lo, 1)*(t-lo)/np.where(hi > lo, hi-lo, 1)
+        one_below = area*s*(lo-t)/3
+        # Only highest corner above the plane
+        u = (hi-t)/np.where(hi > mid, hi-mid, 1)*(hi-t)/np.where(hi > lo, hi-lo, 1)
+        two_below = whole - area*u*(hi-t)/3
+
+        flux = np.where(t >= hi, whole, np.where(t <= lo, 0.0, np.where(t <= mid, one_below, two_below)))
+        volumes[start:start+step] = flux.sum(axis=0)
+    return volumes
+
+"""
+Get signed volume of the tetrahedron each triangle spans with the origin
+"""
+def get_signed_tetra_volumes(tri_verts):
+    return np.einsum('ij,ij->i', tri_verts[:,0], np.cross(tri_verts[:,1], tri_verts[:,2]))/6
+
+"""
+Get volume enclosed by the triangles
+"""
+def get_volume(tri_verts):
+    if len(tri_verts) == 0:
+        return 0.0
+    # Tetrahedra are spanned from a corner of the mesh to keep far away meshes accurate
+    return float(get_signed_tetra_volumes(tri_verts - tri_verts[0,0]).sum())
+
+"""
+Get the winding number of the triangles around each point, 1 inside a closed mesh and 0 outside
+It is the sum of the solid angles the triangles span seen from the point, over 4 pi
+Return array of winding numbers, one per point
+"""
+def get_winding_numbers(tri_verts, points):
+    points = np.asarray(points, dtype=np.float64).reshape(-1,3)
+    numbers = np.zeros(len(points))
+    for i in range(0,len(points)):
+        a = tri_verts[:,0] - points[i]
+        b = tri_verts[:,1] - points[i]
+        c = tri_verts[:,2] - points[i]
+        length_a = np.linalg.norm(a, axis=1)
+        length_b = np.linalg.norm(b, axis=1)
+        length_c = np.linalg.norm(c, axis=1)
+        det = np.einsum('ij,ij->i', a, np.cross(b, c))
+        div = length_a*length_b*length_c + np.einsum('ij,ij->i', a, b)*length_c\
+              + np.einsum('ij,ij->i', a, c)*length_b + np.einsum('ij,ij->i', b, c)*length_a
+        numbers[i] = np.arctan2(det, div).sum()/(2*np.pi)
+    return numbers
+
+"""
+Get the positions along axis where the line through point parallel to the axis crosses the triangles
+Lines running exactly through triangle edges are nudged by a tiny fixed offset so no crossing counts twice
+A point on the line is inside a closed mesh if an odd number of crossings lie past it
+Return sorted array of positions
+"""
+def get_line_crossings(tri_verts, axis, point):
+    b, c = [i for i in range(0,3) if i != axis]
+    if len(tri_verts) == 0:
+        return np.zeros(0)
+    span = float(np.max(tri_verts.max(axis=(0,1)) - tri_verts.min(axis=(0,1))))
+    p = point[b] + 1e-9*span*0.6180339887
+    q = point[c] + 1e-9*span*0.4142135624
+    edge_1 = tri_verts[:,1] - tri_verts[:,0]
+    edge_2 = tri_verts[:,2] - tri_verts[:,0]
+    dets = edge_1[:,b]*edge_2[:,c] - edge_1[:,c]*edge_2[:,b]
+    safe_dets = np.where(dets != 0, dets, 1)
+    to_b = p - tri_verts[:,0,b]
+    to_c = q - tri_verts[:,0,c]
+    u = (to_b*edge_2[:,c] - to_c*edge_2[:,b])/safe_dets
+    v = (edge_1[:,b]*to_c - edge_1[:,c]*to_b)/safe_dets
+    is_crossing = (dets != 0) & (u >= 0) & (v >= 0) & (u + v <= 1)
+    positions = tri_verts[:,0,axis] + u*edge_1[:,axis] + v*edge_2[:,axis]
+    return np.sort(positions[is_crossing])
+
+"""
+Get exact volumes of many meshes in one batched call
+meshes is a list of (vertices, triangles) pairs
+Return array of volumes, one per mesh
+"""
+def get_mesh_volumes(meshes):
+    volumes = np.zeros(len(meshes))
+    tri_counts = [len(triangles) for vertices, triangles in meshes]
+    if sum(tri_counts) == 0:
+        return volumes
+    
+    tri_verts = np.concatenate([get_triangle_verts(vertices, triangles) for vertices, triangles in meshes])
+    owners = np.repeat(np.arange(len(meshes)), tri_counts)
+    
+    # Tetrahedra of each mesh are spanned from its own first vertex
+    origins = np.zeros((len(meshes),3))
+    for i in range(0,len(meshes)):
+        if len(meshes[i][0]) > 0:
+            origins[i] = meshes[i][0][0]
+    tetra_volumes = get_signed_tetra_volumes(tri_verts - origins[owners][:,None,:])
+    volumes += np.bincount(owners, weights=tetra_volumes, minlength=len(meshes))
+    return volumes
+
+"""
+Get volume of every slab along axis in one pass
+planes are the inner boundaries between slabs, sorted ascending,
+the first and the last slab extend to infinity like the division boxes in the tiers do
+Return array of len(planes)+1 volumes
+"""
+def get_slab_volumes(tri_verts, axis, planes):
+    below = get_volumes_below(tri_verts, axis, planes)
+    total = get_volume(tri_verts)
+    return np.diff(np.concatenate(([0.0], below, [total])))
+
+"""
+Build a cumulative volume table from slab volumes, a prefix sum over the slabs
+Slabs start at start and are interval wide
+Return (positions, cumulative volumes) at the slab boundaries
+"""
+def build_cumulative_volume(start, interval, slab_volumes):
+    positions = start + interval*np.arange(len(slab_volumes)+1)
+    # Numerical noise must not break the binary search
+    cumulative = np.maximum.accumulate(np.concatenate(([0.0], np.cumsum(slab_volumes))))
+    return (positions, cumulative)
+
+"""
+Get volume below a plane from a cumulative volume table, interpolated between boundaries
+A table can also be a VolumeRatioFunction, which is evaluated exactly
+"""
+def get_cumulative_volume(table, position):
+    if callable(table):
+        return float(table([position])[0])
+    positions, cumulative = table
+    return float(np.interp(position, positions, cumulative))
+
+"""
+Find x between lo and hi where the ascending function get_value reaches value, to tolerance
+Brent's method, inverse quadratic and secant steps fall back to bisection whenever they would not
+shrink the bracket fast enough, so it takes O(log 1/tolerance) evaluations at worst
+Return lo or hi if value is out of their range
+"""
+def solve_ascending(get_value, value, lo, hi, tolerance):
+    a = lo
+    b = hi
+    fa = get_value(a) - value
+    fb = get_value(b) - value
+    if fa >= 0:
+        return lo
+    if fb <= 0:
+        return hi
+    c = b
+    fc = fb
+    d = b - a
+    e = d
+    while True:
+        # Keep the root between b and c
+        if (fb > 0) == (fc > 0):
+            c = a
+            fc = fa
+            d = b - a
+            e = d
+        # b is the best guess so far
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+        half_tolerance = tolerance/2
+        m = (c - b)/2
+        if abs(m) <= half_tolerance or fb == 0:
+            return b
+        if abs(e) >= half_tolerance and abs(fa) > abs(fb):
+            s = fb/fa
+            if a == c:
+                # Secant step
+                p = 2*m*s
+                q = 1 - s
+            else:
+                # Inverse quadratic step
+                q = fa/fc
+                r = fb/fc
+                p = s*(2*m*q*(q - r) - (b - a)*(r - 1))
+                q = (q - 1)*(r - 1)*(s - 1)
+            if p > 0:
+                q = -q
+            else:
+                p = -p
+            if 2*p < min(3*m*q - abs(half_tolerance*q), abs(e*q)):
+                e = d
+                d = p/q
+            else:
+                d = m
+                e = d
+        else:
+            d = m
+            e = d
+        a = b
+        fa = fb
+        if abs(d) > half_tolerance:
+            b += d
+        elif m > 0:
+            b += half_tolerance
+        else:
+            b -= half_tolerance
+        fb = get_value(b) - value
+
+"""
+Find where the cut plane must be to hold volume below it
+Binary search over the cumulative volume table, interpolated between boundaries
+A VolumeRatioFunction is solved by Brent's method to within tolerance instead
+"""
+def solve_cut_position(table, volume, tolerance=0.0001):
+    if callable(table):
+        return solve_ascending(lambda position: get_cumulative_volume(table, position), volume, table.lo, table.hi, tolerance)
+    positions, cumulative = table
+    i = int(np.searchsorted(cumulative, volume, side='left'))
+    if i <= 0:
+        return float(positions[0])
+    if i >= len(positions):
+        return float(positions[-1])
+    ratio = (volume - cumulative[i-1])/(cumulative[i] - cumulative[i-1])
+    return float(positions[i-1] + ratio*(positions[i] - positions[i-1]))
+
+"""
+Find the half width of a cut centered at center that holds volume
+Volume between center-width and center+width grows with width, so it is bisected
+"""
+def solve_centered_cut_width(table, center, volume, tolerance):
+    if callable(table):
+        return solve_ascending(lambda width: get_cumulative_volume(table, center+width) - get_cumulative_volume(table, center-width),\
+                               volume, 0.0, max(center - table.lo, table.hi - center), tolerance)
+    positions, cumulative = table
+    lo = 0.0
+    hi = max(center - positions[0], positions[-1] - center)
+    while hi - lo > tolerance:
+        width = (lo + hi)/2
+        if get_cumulative_volume(table, center+width) - get_cumulative_volume(table, center-width) < volume:
+            lo = width
+        else:
+            hi = width
+    return hi
@@ -0,0 +1,107 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+import shape_helper as shapes
+import transformer_config as config
+import transformer_engine as engine
+
+from CuttingCache import CuttingCache
+
+def get_entry_names(directory):
+    return sorted(file_name for file_name in os.listdir(directory))
+
+"""
+Keys only depend on the values of the mesh arrays, the request and the config state
+"""
+def test_key_is_stable(tmp_path):
+    cache = CuttingCache(str(tmp_path), 1024)
+    mesh = shapes.get_box_mesh("cube", (-1,-1,-1), (1,1,1))
+    request = {"volume":0.1,"aspects":[1.0,2.0],"is_sym":False}
+    config_state = {"tier_1_divs":20,"fp_tolerance":0.0001}
+    key = cache.get_key(mesh.vertices, mesh.triangles, request, config_state)
+
+    # Same values in other dtypes, layouts and dict orders
+    same_request = {"is_sym":False,"aspects":[1.0,2.0],"volume":0.1}
+    same_config_state = {"fp_tolerance":0.0001,"tier_1_divs":20}
+    assert cache.get_key(np.asfortranarray(mesh.vertices.astype(np.float32)), mesh.triangles.astype(np.int32).tolist(), same_request, same_config_state) == key
+    assert CuttingCache(str(tmp_path / "other"), 0).get_key(mesh.vertices, mesh.triangles, request, config_state) == key
+
+    moved = mesh.vertices.copy()
+    moved[0,0] += 1e-3
+    assert cache.get_key(moved, mesh.triangles, request, config_state) != key
+    assert cache.get_key(mesh.vertices, mesh.triangles[::-1], request, config_state) != key
+    assert cache.get_key(mesh.vertices, mesh.triangles, dict(request, volume=0.2), config_state) != key
+    assert cache.get_key(mesh.vertices, mesh.triangles, request, dict(config_state, tier_1_divs=10)) != key
+
+"""
+A store either replaces the whole entry or leaves the old one, and never leaves its temp file behind
+"""
+def test_store_is_atomic(tmp_path):
+    cache = CuttingCache(str(tmp_path / "cache"), 1024*1024)
+    assert cache.load("missing") == None
+    cache.store("entry", {"candidates":[{"id":"1","pd":0.5}]})
+    assert get_entry_names(cache.directory) == ["entry.json"]
+    assert cache.load("entry") == {"candidates":[{"id":"1","pd":0.5}]}
+
+    # Not serializable, the write fails half way
+    cache.store("entry", {"candidates":[{"id":"2","pd":object()}]})
+    assert get_entry_names(cache.directory) == ["entry.json"]
+    assert cache.load("entry") == {"candidates":[{"id":"1","pd":0.5}]}
+
+    cache.store("entry", {"candidates":[]})
+    assert get_entry_names(cache.directory) == ["entry.json"]
+    assert cache.load("entry") == {"candidates":[]}
+
+"""
+Once the entries take more than max_bytes the least recently stored or loaded ones go first
+"""
+def test_eviction_is_least_recently_used(tmp_path):
+    cache = CuttingCache(str(tmp_path), 1024*1024)
+    entry = {"candidates":[{"id":str(i),"pd":0.1*i} for i in range(0,10)]}
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.store(key, entry)
+        os.utime(cache.get_path(key), (1000.0 + i, 1000.0 + i))
+    entry_bytes = os.path.getsize(cache.get_path("a"))
+
+    # Loading a marks it as used after b and c
+    assert cache.load("a") == entry
+    cache.max_bytes = 2*entry_bytes
+    cache.evict()
+    assert get_entry_names(cache.directory) == ["a.json", "c.json"]
+
+    # Storing d evicts c, the least recently used one left
+    cache.store("d", entry)
+    assert get_entry_names(cache.directory) == ["a.json", "d.json"]
+
+    cache.max_bytes = 0
+    cache.evict()
+    assert get_entry_names(cache.directory) == []
+
+"""
+The pick is not part of the entry, a replayed request draws its random pick again from the cached candidates
+"""
+def test_picks_share_the_cached_candidates(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "use_result_cache", True)
+    monkeypatch.setattr(config, "cache_directory", str(tmp_path / "cache"))
+    monkeypatch.setattr(config, "log_directory", str(tmp_path))
+    monkeypatch.setattr(config, "DEBUG_MATCHING", False)
+    monkeypatch.setattr(config, "engine_processes", 1)
+    mesh = shapes.get_box_mesh("cube", (-1,-1,-1), (1,1,1))
+    run_config = config.get_cutting_config()
+
+    candidates, chosen = engine.pick_candidate_mesh_cached(mesh, 0.1, [1.0,1.0], False, 0, run_config)
+    assert chosen == engine.pick_best_candidate(candidates)
+    assert len(os.listdir(config.cache_directory)) == 1
+
+    picks = []
+    monkeypatch.setattr(engine, "cutting_start_mesh", None)
+    monkeypatch.setattr(engine, "pick_candidate", lambda candidates, pick, run_config: picks.append(pick) or candidates[-1])
+    replayed, chosen = engine.pick_candidate_mesh_cached(mesh, 0.1, [1.0,1.0], False, 1, run_config)
+    assert len(replayed) == len(candidates)
+    assert chosen == replayed[-1]
+    assert picks == [1]
+    assert len(os.listdir(config.cache_directory)) == 1
@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+import shape_helper as shapes
+import transformer_benchmark as benchmark
+import transformer_config as config
+import transformer_engine as engine
+
+"""
+Benchmark runs search every cut request even when the result cache holds the case
+"""
+def test_run_case_is_not_a_cache_replay(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "use_result_cache", True)
+    monkeypatch.setattr(config, "cache_directory", str(tmp_path / "cache"))
+    monkeypatch.setattr(config, "log_directory", str(tmp_path))
+    monkeypatch.setattr(config, "DEBUG_MATCHING", False)
+    monkeypatch.setattr(config, "engine_processes", 1)
+    example_name, picks, cut_reqs = benchmark.examples[0]
+    mesh = shapes.get_box_mesh("cube", (-1,-1,-1), (1,1,1))
+
+    # Fill the cache with the case, a replay of it only runs the booleans of the chosen cuts
+    engine.cutting_run(mesh, cut_reqs, picks)
+    assert len(os.listdir(config.cache_directory)) > 0
+    replay = benchmark.BenchmarkStats()
+    intersect_box = mesh.__class__.intersect_box
+    monkeypatch.setattr(mesh.__class__, "intersect_box", replay.count_calls(intersect_box, "booleans"))
+    engine.cutting_run(mesh, cut_reqs, picks)
+    monkeypatch.setattr(mesh.__class__, "intersect_box", intersect_box)
+
+    first = benchmark.run_case(mesh, cut_reqs, picks, False)[0]
+    second = benchmark.run_case(mesh, cut_reqs, picks, False)[0]
+    for stats in (first, second):
+        assert stats.tier_times[1] > 0.0
+        assert stats.booleans > replay.booleans
+    assert first.booleans == second.booleans
+    assert first.meshes_created == second.meshes_created
+    assert config.use_result_cache
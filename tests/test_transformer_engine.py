@@ -0,0 +1,102 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+import clipping_helper as clip
+import shape_helper as shapes
+import transformer_benchmark as benchmark
+import transformer_config as config
+import transformer_engine as engine
+
+from TransformerMesh import TransformerMesh
+
+"""
+Match a cut request with the passes over the mesh's triangles counted, see transformer_benchmark
+Return (candidates, BenchmarkStats)
+"""
+def count_matching(monkeypatch, mesh, req_volume_ratio, req_aspects, is_sym, run_config):
+    stats = benchmark.BenchmarkStats()
+    with monkeypatch.context() as patch:
+        for name in benchmark.geometry_functions:
+            patch.setattr(clip, name, stats.count_calls(getattr(clip, name), "geometry_evaluations"))
+        candidates = engine.cutting_start_mesh(mesh, req_volume_ratio, req_aspects, is_sym, run_config)
+    return (candidates, stats)
+
+"""
+On a hollow box, whose volume is nowhere near where a box of the required shape starts, the box optimizer
+finds a better cut than the tiers on its own with fewer geometry evaluations
+"""
+def test_optimizer_matching_beats_the_tiers_on_its_own(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "use_result_cache", False)
+    monkeypatch.setattr(config, "log_directory", str(tmp_path))
+    monkeypatch.setattr(config, "DEBUG_MATCHING", False)
+    monkeypatch.setattr(config, "engine_processes", 1)
+    mesh = shapes.get_hollow_box_mesh("hollow", (-1,-2,-1), (1,2,1), 0.2)
+    run_config = config.get_cutting_config()
+    assert run_config.optimizer_seeds == 0
+
+    tier_candidates, tier_stats = count_matching(monkeypatch, mesh, 0.15, [2.0,1.0], False, run_config._replace(use_box_optimizer=False))
+    candidates, stats = count_matching(monkeypatch, mesh, 0.15, [2.0,1.0], False, run_config._replace(use_box_optimizer=True))
+    assert len(tier_candidates) > 0
+    assert len(candidates) > 0
+    assert engine.pick_best_candidate(candidates)["pd"] <= engine.pick_best_candidate(tier_candidates)["pd"]
+    assert 0 < stats.geometry_evaluations < tier_stats.geometry_evaluations
+
+    # Seeds from the tiers cost the whole tier search on top
+    seeded, seeded_stats = count_matching(monkeypatch, mesh, 0.15, [2.0,1.0], False, run_config._replace(use_box_optimizer=True, optimizer_seeds=3))
+    assert len(seeded) > 0
+    assert seeded_stats.geometry_evaluations > tier_stats.geometry_evaluations
+
+"""
+Subtrees explored by worker processes give the candidates and the log entries of the ones explored in this
+process, the workers are spawned and only know the config the run hands them
+"""
+def test_worker_processes_match_this_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "use_result_cache", False)
+    monkeypatch.setattr(config, "DEBUG_MATCHING", True)
+    monkeypatch.setattr(config, "tier_1_divs", 7)
+    mesh = shapes.get_car_mesh("car")
+    results = []
+    for num_processes in (1, 2):
+        log_directory = tmp_path / str.format("processes_{}", num_processes)
+        monkeypatch.setattr(config, "log_directory", str(log_directory))
+        monkeypatch.setattr(config, "engine_processes", num_processes)
+        run_config = config.get_cutting_config()
+        candidates = engine.cutting_start_mesh(mesh, 0.15, [2.0,1.0], False, run_config)
+        candidates += engine.cutting_start_mesh(mesh, 0.1, [1.0,1.0], True, run_config)
+        engine.logger.flush()
+        with open(str(log_directory / "matching_log.txt"), "r") as matching_log:
+            results.append((candidates, matching_log.read()))
+    engine.process_pool.shutdown()
+    engine.process_pool = None
+    assert len(results[0][0]) > 0
+    assert results[1][0] == results[0][0]
+    # Logs of queued subtrees come after their tier 1
+    assert sorted(results[1][1].splitlines()) == sorted(results[0][1].splitlines())
+
+"""
+Profiles handed down by a cut, the ones of the mesh less its pieces, are the ones built from the remaining mesh
+"""
+def test_cut_profiles_match_rebuilt_profiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "log_directory", str(tmp_path))
+    mesh = shapes.get_car_mesh("car")
+    for axis in range(0,3):
+        mesh.get_volume_profile(axis)
+    mins, maxs = mesh.get_extents()
+    pos_box = {"x_min":0.5,"x_max":maxs[0]+1.0,"y_min":-0.3,"y_max":0.4,"z_min":mins[2]-1.0,"z_max":0.5}
+    neg_box = {"x_min":mins[0]-1.0,"x_max":-0.5,"y_min":-0.3,"y_max":0.4,"z_min":mins[2]-1.0,"z_max":0.5}
+    candidate = {"id":"1","cut_boxes":[pos_box, neg_box],"volume":0.0,"pd":0.0,"is_accepted":True}
+
+    remaining, pieces = engine.perform_cut(mesh, candidate, "wheels")
+    assert len(pieces) == 2
+    assert min(piece.get_volume() for piece in pieces) > 0.0
+    rebuilt = TransformerMesh("rebuilt", remaining.vertices, remaining.triangles)
+    tolerance = 1e-9*mesh.get_volume()
+    assert abs(remaining.get_volume() - rebuilt.get_volume()) <= tolerance
+    for axis in range(0,3):
+        planes = np.linspace(mins[axis], maxs[axis], 25)
+        handed_down = remaining.get_volume_profiles()[axis].get_volumes_below(planes)
+        assert np.allclose(handed_down, rebuilt.get_volume_profile(axis).get_volumes_below(planes), rtol=0.0, atol=tolerance)
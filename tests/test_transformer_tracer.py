@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
+
+import shape_helper as shapes
+import transformer_benchmark as benchmark
+import transformer_config as config
+import transformer_engine as engine
+import transformer_tracer as tracer
+
+def load_trace(directory):
+    with open(os.path.join(directory, tracer.trace_file), "r") as trace:
+        return json.load(trace)["traceEvents"]
+
+@tracer.traced
+def create_objects(count):
+    for i in range(0,count):
+        tracer.count_object_created()
+
+@tracer.traced
+def create_and_free_objects(count):
+    create_objects(count)
+
+"""
+Spans count the objects created within them, objects freed meanwhile do not take any off
+"""
+def test_spans_count_created_objects(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DEBUG_TRACING", True)
+    monkeypatch.setattr(config, "log_directory", str(tmp_path))
+    with tracer.tracing_run():
+        create_and_free_objects(3)
+        create_objects(2)
+    created = {}
+    for event in load_trace(str(tmp_path)):
+        created.setdefault(event["name"], []).append(event["args"]["objects_created"])
+    assert created == {"create_objects":[3,2],"create_and_free_objects":[3]}
+
+"""
+Spans of subtrees explored by worker processes are part of the parent's trace, within their cut request's span
+"""
+def test_worker_spans_are_merged(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DEBUG_TRACING", True)
+    monkeypatch.setattr(config, "DEBUG_MATCHING", False)
+    monkeypatch.setattr(config, "use_result_cache", False)
+    monkeypatch.setattr(config, "log_directory", str(tmp_path))
+    monkeypatch.setattr(config, "tier_1_divs", 7)
+    monkeypatch.setattr(config, "engine_processes", 2)
+    example_name, picks, cut_reqs = benchmark.examples[2]
+    try:
+        engine.cutting_run(shapes.get_car_mesh("car"), cut_reqs, picks)
+    finally:
+        engine.process_pool.shutdown()
+        engine.process_pool = None
+    events = load_trace(str(tmp_path))
+    requests = [event for event in events if event["name"] == "cutting_start_mesh"]
+    workers = [event for event in events if event["pid"] != os.getpid()]
+    assert len(requests) == len(cut_reqs)
+    assert set(event["name"] for event in workers) >= {"sym_tier_2_matching", "asym_tier_2_matching"}
+    for event in workers:
+        assert any(request["ts"] <= event["ts"] and event["ts"] + event["dur"] <= request["ts"] + request["dur"] for request in requests)